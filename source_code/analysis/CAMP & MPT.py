@@ -1,5 +1,3 @@
-import os
-import sqlite3
 import pandas as pd
 import numpy as np
 import statsmodels.api as sm
@@ -7,48 +5,39 @@ import matplotlib.pyplot as plt
 from pypfopt.efficient_frontier import EfficientFrontier
 from pypfopt import risk_models, expected_returns
 from pypfopt.plotting import plot_efficient_frontier, plot_weights
-from config import DATABASE_PATH
+from materialize import read_market_returns, read_returns_matrix
+from panel_store import PanelStore, panel_exists
 
-def retrieve_data(table="full_stock_data"):
-    """Retrieve stock data from SQLite database"""
-    db_file_path = os.path.join(DATABASE_PATH, "stocks_database.db")
-    try:
-        conn = sqlite3.connect(db_file_path)
-        print(f"Connected to database at: {db_file_path}")
-    except sqlite3.OperationalError as e:
-        print(f"Error: {e}")
-        return None
-
-    query = f"SELECT * FROM {table}"
-    try:
-        data_df = pd.read_sql(query, conn)
-        print("Data retrieved successfully.")
-    except Exception as e:
-        print(f"Error executing query: {e}")
-        return None
-    finally:
-        conn.close()
-        print("Database connection closed.")
 
-    return data_df
+def load_returns():
+    """
+    Returns the daily returns as a wide DataFrame (dates x symbols) and the equal-weighted market return.
+    Both are read from the statistics materialized in the database (see materialize.py), or derived from
+    the memory-mapped panel store when they have not been materialized.
+    """
+    returns = read_returns_matrix()
+    if returns is not None and not returns.empty:
+        return returns, read_market_returns()
+    print("No materialized statistics in the database (run materialize.py after loading prices).")
 
+    if panel_exists():
+        panel = PanelStore()
+        print(f"Loaded returns from {panel}")
+        if 'Close_pct_change' in panel.fields:
+            returns = panel.field_frame('Close_pct_change')
+        else:
+            returns = panel.field_frame('Close').pct_change(fill_method=None)
+        return returns, returns.mean(axis=1)
 
-df = retrieve_data()
+    return None, None
 
-if df is not None:
-    df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values(by='Date')
 
-    if 'Close_pct_change' not in df.columns:
-        df['Close_pct_change'] = df.groupby('Symbol')['Close'].pct_change()
+# Prepare data for CAPM calculations
+capm_data, market_return = load_returns()
 
+if capm_data is not None:
     risk_free_rate = 0.02 / 252
 
-    market_return = df.groupby('Date')['Close_pct_change'].mean()
-
-    # Prepare data for CAPM calculations
-    capm_data = df.pivot(index='Date', columns='Symbol', values='Close_pct_change')
-
     capm_data.replace([np.inf, -np.inf], np.nan, inplace=True)
     capm_data.dropna(axis=1, thresh=int(0.90 * len(capm_data)), inplace=True) 
     capm_data.fillna(0, inplace=True) 
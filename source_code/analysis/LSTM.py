@@ -1,5 +1,3 @@
-import os
-import sqlite3
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,23 +6,11 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
-from config import DATABASE_PATH 
+from data_access import read_stock_data
+from panel_store import PanelStore, panel_exists
 
-# Retrieve Data from SQLite
-def retrieve_data(table="full_stock_data"):
-    """Retrieve stock data from SQLite database"""
-    db_file_path = os.path.join(DATABASE_PATH, "stocks_database.db")
-    try:
-        conn = sqlite3.connect(db_file_path)
-        print(f"Connected to database at: {db_file_path}")
-        data_df = pd.read_sql(f"SELECT * FROM {table}", conn)
-    except sqlite3.OperationalError as e:
-        print(f"Error: {e}")
-        return None
-    finally:
-        conn.close()
-
-    return data_df
+# Features used for training (Close, Volume, RSI, MACD)
+FEATURES = ['Close', 'Volume', 'RSI_14', 'MACD_12_26_9']
 
 # Preprocess Data
 def preprocess_data(df, stock_symbol="AAPL", seq_length=90):
@@ -33,7 +19,7 @@ def preprocess_data(df, stock_symbol="AAPL", seq_length=90):
     df = df[df['Symbol'] == stock_symbol].sort_values(by='Date')
 
     # Selecting features for training (Close, Volume, RSI, MACD)
-    features = ['Close', 'Volume', 'RSI_14', 'MACD_12_26_9']
+    features = FEATURES
     df = df[['Date'] + features].set_index('Date')
 
     # Normalize data
@@ -109,7 +95,11 @@ def train_lstm(X_train, y_train, X_test, y_test, scaler, date_index, features):
 
 # Main execution
 if __name__ == "__main__":
-    df = retrieve_data()
+    # Only the selected symbol and features are read, from the panel store when it is built and up to date
+    if panel_exists():
+        df = PanelStore().to_long(symbols=["AAPL"], fields=FEATURES)
+    else:
+        df = read_stock_data(FEATURES, symbols=["AAPL"])
     if df is not None:
         X_train, y_train, X_test, y_test, scaler, date_index, features = preprocess_data(df, stock_symbol="AAPL", seq_length=90)
         model = train_lstm(X_train, y_train, X_test, y_test, scaler, date_index, features)
@@ -1,7 +1,15 @@
 import os
+import sys
 import pandas as pd
-import pandas_ta as ta
-from config import PREPROCESSED_DATA_PATH,CLEANED_DATA_PATH
+from config import PREPROCESSED_DATA_PATH,CLEANED_DATA_PATH,STORAGE_FORMAT,INDICATOR_STATE_PATH
+
+# The Parquet storage helpers live with the preprocessing scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'preprocessing'))
+from storage import append_dataset, dataset_exists, read_dataset, write_dataset
+from indicators import compute_indicators
+from indicator_cache import IndicatorCache, compute_indicators_cached
+from incremental_indicators import (load_indicator_state, save_indicator_state, unchanged_prefix_symbols,
+                                    update_indicators)
 
 clean_file_name = "cleaned_collected_data.csv"
 
@@ -30,37 +38,24 @@ def read_csv_to_df(clean_file_name):
 
     return df
 
-def add_technical_indicators(data):
+def add_technical_indicators(data, cache=None):
     """
     Adds technical indicators to the DataFrame as new columns.
 
     Parameters:
         data (pd.DataFrame): The DataFrame containing stock data (must include 'Open', 'High', 'Low', 'Close', 'Volume').
+        cache (IndicatorCache): Optional per-symbol cache; symbols whose rows are unchanged are not recomputed.
 
     Returns:
         pd.DataFrame: The DataFrame with added technical indicators.
     """
-    # Group by 'Symbol' to calculate indicators for each ticker
-    grouped = data.groupby('Symbol')
-
-    # Initialize an empty DataFrame to store results
-    result_df = pd.DataFrame()
-
-    for ticker, group in grouped:
-        # Add technical indicators to each group
-        group.ta.sma(length=7, append=True)       # 7-day Simple Moving Average
-        group.ta.ema(length=30, append=True)      # 30-day Exponential Moving Average
-        group.ta.macd(append=True)                # MACD (12,26,9)
-        group.ta.rsi(length=14, append=True)      # 14-day RSI
-        group.ta.bbands(length=20, append=True)   # Bollinger Bands (20,2)
-        group.ta.atr(length=14, append=True)      # Average True Range (14-day)
-
-        # Append the processed group to the result DataFrame
-        result_df = pd.concat([result_df, group], ignore_index=True)
+    # All symbols are computed together on (bar position x symbol) arrays, for the indicators
+    # listed in INDICATOR_SPEC (SMA 7, EMA 30, MACD (12,26,9), RSI 14, Bollinger Bands (20,2), ATR 14)
+    if cache is not None:
+        return compute_indicators_cached(data, cache)
+    return compute_indicators(data)
 
-    return result_df
-
-def save_processed_data(data, save_dir=PREPROCESSED_DATA_PATH, output_file_name="processed_data.csv"):
+def save_processed_data(data, save_dir=PREPROCESSED_DATA_PATH, output_file_name="processed_data.csv", append=False):
     """
     Saves the processed DataFrame to a CSV file.
 
@@ -68,6 +63,7 @@ def save_processed_data(data, save_dir=PREPROCESSED_DATA_PATH, output_file_name=
         data (pd.DataFrame): The DataFrame to save.
         save_dir (str): The directory where the processed CSV file will be saved.
         output_file_name (str): The name of the output CSV file.
+        append (bool): Add the rows to the existing processed data instead of replacing it.
     """
     # Ensure the save directory exists
     os.makedirs(save_dir, exist_ok=True)
@@ -80,17 +76,132 @@ def save_processed_data(data, save_dir=PREPROCESSED_DATA_PATH, output_file_name=
     output_path = os.path.join(save_dir, output_file_name)
 
     # Save the DataFrame to CSV
-    data.to_csv(output_path, index=False)
-    print(f"Processed data saved to: {output_path}")
+    if append and os.path.exists(output_path):
+        data.to_csv(output_path, mode='a', header=False, index=False)
+        print(f"Appended {len(data)} rows to: {output_path}")
+    else:
+        data.to_csv(output_path, index=False)
+        print(f"Processed data saved to: {output_path}")
+
+    if STORAGE_FORMAT == 'parquet':
+        if append:
+            append_dataset(data, 'processed')
+        else:
+            write_dataset(data, 'processed')
+
+def load_cleaned_data(start=None, symbols=None):
+    """
+    Loads the cleaned data, from the partitioned 'cleaned' dataset when it exists and from the CSV file otherwise.
+
+    Parameters:
+        start (str): Only load rows dated on or after this day.
+        symbols (list): Only load these symbols.
+    """
+    if STORAGE_FORMAT == 'parquet' and dataset_exists('cleaned'):
+        df = read_dataset('cleaned', symbols=symbols, start=start)
+        print(f"Loaded {len(df)} rows from the 'cleaned' dataset")
+        return df.astype({'Symbol': str})
+
+    df = read_csv_to_df(clean_file_name)
+    if df is not None and start is not None:
+        df = df[pd.to_datetime(df['Date']) >= pd.Timestamp(start)]
+    if df is not None and symbols is not None:
+        df = df[df['Symbol'].isin(symbols)]
+    return df
+
+def process_all_data(state_path=INDICATOR_STATE_PATH, data=None):
+    """
+    Recomputes the indicators over the full history, serving symbols whose cleaned rows are unchanged
+    from the indicator cache, and brings the per-symbol indicator state up to date for later incremental updates.
+
+    Parameters:
+        state_path (str): The saved per-symbol indicator state.
+        data (pd.DataFrame): The cleaned data when it is already loaded.
+    """
+    df = load_cleaned_data() if data is None else data
+    if df is None:
+        return
+
+    # Add technical indicators to the DataFrame, reusing cached results of unchanged symbols
+    cache = IndicatorCache()
+    df_with_indicators = add_technical_indicators(df, cache)
+    cache.print_stats()
+    cache.close()
+
+    # Save the processed DataFrame to a single file
+    save_processed_data(df_with_indicators)
+
+    # Continue the saved state of the symbols that only had bars appended and replay the history of the
+    # others (revised or new) once, so that update_processed_data only has to process new bars
+    states = load_indicator_state(state_path)
+    unchanged = set(unchanged_prefix_symbols(df, states))
+    states = {symbol: state for symbol, state in states.items() if symbol in unchanged}
+    update_indicators(df, states)
+    save_indicator_state(states, state_path)
+    print(f"Indicator state saved for {len(states)} symbols at {state_path} "
+          f"({len(unchanged)} continued, {len(states) - len(unchanged)} replayed)")
+
+def update_processed_data(states=None, state_path=INDICATOR_STATE_PATH, data=None):
+    """
+    Adds the indicators of the bars that arrived since the last run, updating the saved per-symbol state
+    one bar at a time instead of recomputing the full history.
+
+    Parameters:
+        states (dict): Symbol -> SymbolIndicators (loaded from state_path when None).
+        state_path (str): The saved per-symbol indicator state.
+        data (pd.DataFrame): The cleaned rows to process when they are already loaded (the new bars, plus
+                             the whole history of symbols without state).
+    """
+    if states is None:
+        states = load_indicator_state(state_path)
+    if data is None:
+        last_dates = [state.last_date for state in states.values() if state.last_date is not None]
+        df = load_cleaned_data(start=min(last_dates) if last_dates else None)
+        if df is None:
+            return
+
+        # Symbols seen for the first time need their whole history
+        new_symbols = sorted(set(df['Symbol']) - set(states))
+        if new_symbols and last_dates:
+            df = pd.concat([df, load_cleaned_data(symbols=new_symbols)], ignore_index=True)
+            df = df.drop_duplicates(subset=['Symbol', 'Date'])
+    else:
+        df = data
+
+    new_rows = update_indicators(df, states)
+    save_indicator_state(states, state_path)
+    if new_rows.empty:
+        print("Indicators are already up to date.")
+        return
+    print(f"Computed indicators for {len(new_rows)} new bars")
+    save_processed_data(new_rows, append=True)
+
+def refresh_processed_data(state_path=INDICATOR_STATE_PATH):
+    """
+    Brings the processed data up to date after a collection run. When every symbol with saved state only
+    had bars appended, the new bars go through update_processed_data; when older bars of some symbol were
+    revised (or a symbol disappeared), the processed data is rebuilt by process_all_data, which replays
+    only those symbols.
+    """
+    df = load_cleaned_data()
+    if df is None:
+        return
+
+    states = load_indicator_state(state_path)
+    unchanged = set(unchanged_prefix_symbols(df, states))
+    revised = sorted(set(states) - unchanged)
+    if not states or revised:
+        if revised:
+            print(f"Older bars changed for {len(revised)} symbols; rebuilding the processed data.")
+        process_all_data(state_path, data=df)
+        return
+
+    # Only the bars after each symbol's last processed date (and the history of new symbols)
+    last_dates = df['Symbol'].astype(str).map({symbol: state.last_date for symbol, state in states.items()}).fillna('')
+    update_processed_data(states, state_path, data=df[pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d') > last_dates])
 
 # Example usage
 if __name__ == "__main__":
-    # Load the cleaned data
-    df = read_csv_to_df(clean_file_name)
-    
-    if df is not None:
-        # Add technical indicators to the DataFrame
-        df_with_indicators = add_technical_indicators(df)
-        
-        # Save the processed DataFrame to a single file
-        save_processed_data(df_with_indicators)
\ No newline at end of file
+    # Symbols that only had bars appended are updated from their saved indicator state; the full history
+    # is recomputed (through the indicator cache) only when older bars were revised.
+    refresh_processed_data()
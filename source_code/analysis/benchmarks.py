@@ -0,0 +1,233 @@
+import os
+import glob
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from config import INDICATOR_BASELINE_PATH, INDICATOR_TOLERANCE
+from indicators import INDICATOR_COLUMNS, compute_indicators
+from indicator_cache import IndicatorCache, compute_indicators_cached
+from pattern_scanner import MULTI_BAR_PATTERNS, scan_multi_bar_patterns, scan_patterns
+from pattern_backtest import backtest_patterns
+
+def make_synthetic_prices(n_symbols, n_days=252, seed=0):
+    """
+    Generates random-walk OHLCV rows for `n_symbols` symbols over `n_days` business days,
+    in the long (Date, Open, High, Low, Close, Volume, Symbol) layout of the cleaned data.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-02", periods=n_days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_symbols, n_days)), axis=1))
+    spread = np.abs(rng.normal(0, 0.01, size=close.shape)) * close
+
+    return pd.DataFrame({
+        'Date': np.tile(dates.strftime('%Y-%m-%d'), n_symbols),
+        'Open': (close + rng.normal(0, 0.005, size=close.shape) * close).ravel(),
+        'High': (close + spread).ravel(),
+        'Low': (close - spread).ravel(),
+        'Close': close.ravel(),
+        'Volume': rng.integers(1_000_000, 50_000_000, size=close.shape).ravel().astype(float),
+        'Symbol': np.repeat([f"S{i:05d}" for i in range(n_symbols)], n_days),
+    })
+
+def time_call(func, *args, repeat=3):
+    """Returns the best wall-clock time of `repeat` calls, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def pandas_ta_loop(data):
+    """The per-symbol pandas_ta loop that compute_indicators replaced, kept for comparison."""
+    import pandas_ta as ta  # noqa: F401 (registers the DataFrame.ta accessor)
+
+    result_df = pd.DataFrame()
+    for ticker, group in data.groupby('Symbol'):
+        group = group.copy()
+        group.ta.sma(length=7, append=True)
+        group.ta.ema(length=30, append=True)
+        group.ta.macd(append=True)
+        group.ta.rsi(length=14, append=True)
+        group.ta.bbands(length=20, append=True)
+        group.ta.atr(length=14, append=True)
+        result_df = pd.concat([result_df, group], ignore_index=True)
+    return result_df
+
+def check_indicator_accuracy(baseline_path=INDICATOR_BASELINE_PATH, tolerance=INDICATOR_TOLERANCE, n_symbols=89,
+                             n_days=252):
+    """
+    Compares compute_indicators with pandas_ta: with the pandas_ta loop on synthetic prices when pandas_ta
+    is installed, otherwise with the pandas_ta output saved in `baseline_path`. A column passes when its
+    NaN positions match and its largest error, relative to max(|reference|, 1), is within `tolerance`.
+
+    Returns:
+        pd.DataFrame: One row per indicator column with its error and whether it passes.
+                      Returns None when there is no reference to compare with.
+    """
+    try:
+        import pandas_ta  # noqa: F401
+        reference = pandas_ta_loop(make_synthetic_prices(n_symbols, n_days))
+        source = "pandas_ta"
+    except ImportError:
+        files = sorted(glob.glob(os.path.join(baseline_path, "*_processed.csv")))
+        if not files:
+            print(f"pandas_ta is not installed and there is no saved baseline in {baseline_path}.")
+            return None
+        reference = pd.concat([pd.read_csv(f) for f in files], ignore_index=True)
+        source = f"the baseline in {baseline_path}"
+
+    prices = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Symbol']
+    # compute_indicators returns the rows grouped by symbol, so the two are aligned on (Symbol, Date)
+    merged = reference.merge(compute_indicators(reference[prices]), on=['Symbol', 'Date'], suffixes=('', ' (vectorized)'))
+
+    results = []
+    for col in INDICATOR_COLUMNS:
+        if col not in reference:
+            results.append({'Column': col, 'Max error': np.nan, 'NaN mismatches': np.nan, 'Passes': False})
+            continue
+        expected = merged[col].to_numpy(dtype='float64')
+        actual = merged[f"{col} (vectorized)"].to_numpy(dtype='float64')
+        both = ~np.isnan(expected) & ~np.isnan(actual)
+        error = np.abs(actual[both] - expected[both]) / np.maximum(np.abs(expected[both]), 1)
+        max_error = float(error.max()) if error.size else 0.0
+        nan_mismatches = int((np.isnan(expected) != np.isnan(actual)).sum())
+        results.append({'Column': col, 'Max error': max_error, 'NaN mismatches': nan_mismatches,
+                        'Passes': nan_mismatches == 0 and max_error <= tolerance})
+
+    results = pd.DataFrame(results)
+    failed = results.loc[~results['Passes'], 'Column'].tolist()
+    if failed:
+        print(f"Error: indicators differ from {source} beyond {tolerance}: {', '.join(failed)}")
+    else:
+        print(f"All {len(results)} indicator columns match {source} within {tolerance} ({len(merged)} rows).")
+    return results
+
+def benchmark_indicators(symbol_counts=(89, 500, 1000, 2500, 5000), n_days=252):
+    """
+    Times compute_indicators for growing numbers of symbols, and the old pandas_ta loop when
+    pandas_ta is installed.
+
+    Returns:
+        pd.DataFrame: One row per symbol count with the timings in seconds.
+    """
+    try:
+        import pandas_ta  # noqa: F401
+        has_pandas_ta = True
+    except ImportError:
+        print("pandas_ta is not installed; only the vectorized engine is timed.")
+        has_pandas_ta = False
+
+    results = []
+    for n_symbols in symbol_counts:
+        data = make_synthetic_prices(n_symbols, n_days)
+        row = {'Symbols': n_symbols, 'Rows': len(data), 'Vectorized (s)': time_call(compute_indicators, data)}
+        if has_pandas_ta:
+            row['pandas_ta loop (s)'] = time_call(pandas_ta_loop, data, repeat=1)
+            row['Speed-up'] = row['pandas_ta loop (s)'] / row['Vectorized (s)']
+        results.append(row)
+        print(row)
+
+    return pd.DataFrame(results)
+
+def benchmark_patterns(symbol_counts=(89, 500, 1000, 2500, 5000), n_days=252):
+    """
+    Times scan_patterns (Doji, Engulfing, Hammer over all symbols in one pass) for growing numbers of symbols.
+
+    Returns:
+        pd.DataFrame: One row per symbol count with the timings in seconds.
+    """
+    results = []
+    for n_symbols in symbol_counts:
+        data = make_synthetic_prices(n_symbols, n_days)
+        row = {'Symbols': n_symbols, 'Rows': len(data), 'Pattern scan (s)': time_call(scan_patterns, data)}
+        results.append(row)
+        print(row)
+
+    return pd.DataFrame(results)
+
+def benchmark_multi_bar_patterns(symbol_counts=(89, 500, 1000, 2500, 5000), n_days=252):
+    """
+    Times scan_multi_bar_patterns with all patterns over the whole universe, for growing numbers of symbols.
+    The cost per bar x pattern should stay flat as the universe grows.
+
+    Returns:
+        pd.DataFrame: One row per symbol count with the timings in seconds.
+    """
+    n_patterns = len(MULTI_BAR_PATTERNS)
+    results = []
+    for n_symbols in symbol_counts:
+        data = make_synthetic_prices(n_symbols, n_days)
+        seconds = time_call(scan_multi_bar_patterns, data)
+        row = {'Symbols': n_symbols, 'Rows': len(data), 'Patterns': n_patterns, 'Multi-bar scan (s)': seconds,
+               'ns per bar x pattern': 1e9 * seconds / (len(data) * n_patterns)}
+        results.append(row)
+        print(row)
+
+    return pd.DataFrame(results)
+
+def benchmark_backtest(symbol_counts=(89, 500, 1000, 2500, 5000), n_days=756):
+    """
+    Times backtest_patterns (every pattern x horizon x symbol, scans included) for growing numbers of
+    symbols over three years of bars.
+
+    Returns:
+        pd.DataFrame: One row per symbol count with the timings in seconds.
+    """
+    results = []
+    for n_symbols in symbol_counts:
+        data = make_synthetic_prices(n_symbols, n_days)
+        row = {'Symbols': n_symbols, 'Rows': len(data), 'Backtest (s)': time_call(backtest_patterns, data, repeat=1)}
+        results.append(row)
+        print(row)
+
+    return pd.DataFrame(results)
+
+def benchmark_indicator_cache(n_symbols=500, n_days=252):
+    """
+    Runs compute_indicators_cached three times on one cache, as three runs of Preprocessing EDA.py would:
+    cold, unchanged data, and after one symbol's rows were revised. The last run must compute exactly
+    that symbol (1 miss, n_symbols - 1 hits) and every run must match compute_indicators.
+
+    Returns:
+        pd.DataFrame: One row per run with its hits, misses and time in seconds.
+    """
+    data = make_synthetic_prices(n_symbols, n_days)
+    revised = data.copy()
+    revised.loc[revised['Symbol'] == revised['Symbol'].iloc[0], 'Close'] *= 1.01
+    expected = {'cold': compute_indicators(data), 'unchanged': compute_indicators(data),
+                'one symbol revised': compute_indicators(revised)}
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        cache_path = os.path.join(folder, "indicator_cache.db")
+        for run, run_data in [('cold', data), ('unchanged', data), ('one symbol revised', revised)]:
+            cache = IndicatorCache(cache_path)  # A fresh process: counters start at zero
+            start = time.perf_counter()
+            result = compute_indicators_cached(run_data, cache)
+            elapsed = time.perf_counter() - start
+            stats = cache.stats()
+            cache.close()
+
+            matches = np.allclose(result[INDICATOR_COLUMNS].to_numpy(dtype='float64'),
+                                  expected[run][INDICATOR_COLUMNS].to_numpy(dtype='float64'), equal_nan=True)
+            row = {'Run': run, 'Hits': stats['hits'], 'Misses': stats['misses'], 'Time (s)': elapsed, 'Matches': matches}
+            results.append(row)
+            print(row)
+
+    last = results[-1]
+    if (last['Hits'], last['Misses']) != (n_symbols - 1, 1) or not all(row['Matches'] for row in results):
+        print(f"Error: expected 1 miss and {n_symbols - 1} hits after revising one symbol, "
+              f"got {last['Misses']} misses and {last['Hits']} hits.")
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    accuracy = check_indicator_accuracy()
+    if accuracy is not None:
+        print(accuracy.to_string(index=False))
+    print(benchmark_indicators().to_string(index=False))
+    print(benchmark_patterns().to_string(index=False))
+    print(benchmark_multi_bar_patterns().to_string(index=False))
+    print(benchmark_backtest().to_string(index=False))
+    print(benchmark_indicator_cache().to_string(index=False))
@@ -29,4 +29,85 @@ PREPROCESSED_DATA_PATH = 'data/processed_data/merged'
 
 DATABASE_PATH = 'data/database'
 
-VISUALIZED_ACF= 'visualizations/ACF-PACF'
\ No newline at end of file
+VISUALIZED_ACF= 'visualizations/ACF-PACF'
+
+# Company metadata cache written by preprocessing/metadata_cache.py
+METADATA_CACHE_PATH = 'data/metadata/company_metadata.json'
+METADATA_TTL_DAYS = 30
+METADATA_FIELDS = ['longName', 'shortName', 'sector', 'industry', 'country', 'exchange', 'currency']
+
+# Columnar storage written by preprocessing/storage.py
+STORAGE_FORMAT = 'parquet'
+PARQUET_DATA_PATH = 'data/parquet'
+
+# Memory-mapped panel (symbols x trading days x fields) written by panel_store.py
+PANEL_STORE_PATH = 'data/panel'
+PANEL_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Close_pct_change', 'Volume_pct_change',
+                'SMA_7', 'EMA_30', 'MACD_12_26_9', 'MACDh_12_26_9', 'MACDs_12_26_9', 'RSI_14',
+                'BBL_20_2.0', 'BBM_20_2.0', 'BBU_20_2.0', 'BBB_20_2.0', 'BBP_20_2.0', 'ATRr_14']
+PANEL_DTYPE = 'float64'
+
+# Per-symbol state of the incremental indicators (incremental_indicators.py)
+INDICATOR_STATE_PATH = 'data/indicator_state/indicator_state.json'
+
+# Indicators computed by indicators.py. Each entry names an indicator, its parameters and optionally
+# its output column(s); intermediates shared between entries (SMAs, EMAs, true range) are computed once.
+INDICATOR_SPEC = [
+    {'name': 'sma', 'params': {'length': 7}},
+    {'name': 'ema', 'params': {'length': 30}},
+    {'name': 'macd', 'params': {'fast': 12, 'slow': 26, 'signal': 9}},
+    {'name': 'rsi', 'params': {'length': 14}},
+    {'name': 'bbands', 'params': {'length': 20, 'std': 2.0}},
+    {'name': 'atr', 'params': {'length': 14}},
+]
+
+# Reference output of the pandas_ta pipeline that indicators.py replaced (one <Symbol>_processed.csv per symbol),
+# and the largest error benchmarks.check_indicator_accuracy accepts, relative to max(|reference|, 1)
+INDICATOR_BASELINE_PATH = 'data/processed_data'
+INDICATOR_TOLERANCE = 1e-9
+
+# Moving averages drawn by the Dash report
+DASH_INDICATOR_SPEC = [
+    {'name': 'sma', 'params': {'length': 50}},
+    {'name': 'ema', 'params': {'length': 20, 'presma': False}},
+]
+
+# Rolling statistics materialized by materialize.py (its moving averages are those of DASH_INDICATOR_SPEC)
+VOLATILITY_WINDOW = 30         # Bars of daily returns in the rolling volatility (sample std)
+MATERIALIZE_WARMUP_BARS = 250  # Bars recomputed before a symbol's first new bar: covers the rolling windows and
+                               # lets the EMAs converge (the remaining error scales with (1 - 2 / (length + 1)) ** bars)
+
+# Per-symbol cache of computed indicator columns (indicator_cache.py)
+INDICATOR_CACHE_PATH = 'data/indicator_cache/indicator_cache.db'
+INDICATOR_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Candlestick pattern thresholds (pattern_scanner.py), as fractions of the candle's high-low range
+PATTERN_THRESHOLDS = {
+    'doji_body_ratio': 0.01,          # Doji: body <= 1% of the range
+    'hammer_body_ratio': 0.1,         # Hammer: body <= 10% of the range...
+    'hammer_lower_wick_ratio': 0.6,   # ...and lower wick >= 60% of the range
+    # Multi-bar patterns
+    'long_body_ratio': 0.6,           # A long candle's body covers >= 60% of its range
+    'small_body_ratio': 0.3,          # Inner candles of three methods: body <= 30% of the first body
+    'star_body_ratio': 0.3,           # Star candle: body <= 30% of the first body
+    'tweezer_tolerance': 0.05,        # Tweezer extremes within 5% of the average range
+}
+
+# Candlestick charts written by technical_analysis.render_charts
+CHART_OUTPUT_PATH = 'visualizations'
+CHART_MANIFEST_FILE = 'chart_manifest.json'   # Symbol -> hash of the data behind its last render
+CHART_MAX_POINTS = None                       # Downsample longer histories to this many candles (None: every bar)
+CHART_WORKERS = None                          # Rendering processes (None: one per CPU)
+
+# Holding periods (in bars) evaluated by pattern_backtest.py
+BACKTEST_HORIZONS = [1, 5, 10, 20]
+
+# dtype of the float columns returned by data_access.py
+DATA_FLOAT_DTYPE = 'float32'
+
+# SQLite connection settings applied by preprocessing/db_connection.py
+SQLITE_JOURNAL_MODE = 'WAL'          # Readers keep working while a loader writes
+SQLITE_SYNCHRONOUS = 'NORMAL'        # No fsync per transaction (safe with WAL)
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024 # Bytes of the database file read through a memory map
+SQLITE_CACHE_SIZE_KB = 64 * 1024     # Page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = 30000       # Wait this long for a competing writer before "database is locked"
@@ -0,0 +1,123 @@
+import os
+import sys
+import sqlite3
+import pandas as pd
+from config import DATABASE_PATH, DATA_FLOAT_DTYPE
+
+# Shared preprocessing modules (connection manager) live next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'preprocessing'))
+from db_connection import get_connection
+from schema import columns_of, object_type
+
+# Columns kept as text (categoricals) rather than numbers
+TEXT_COLUMNS = ['Symbol', 'Company']
+
+def connect(db_path=DATABASE_PATH):
+    """Returns this thread's shared, tuned connection to the stocks database (do not close it)."""
+    return get_connection(db_path)
+
+def table_columns(table="full_stock_data", db_path=DATABASE_PATH):
+    """Returns the column names of a table ([] when it does not exist)."""
+    return columns_of(connect(db_path), table)
+
+def ensure_symbol_date_index(conn, table):
+    """
+    Creates the (Symbol, Date) index the symbol and date filters below run against. Views of the
+    normalized schema (full_stock_data, stationary_data_all) need none: their fact tables are keyed
+    by (symbol_id, date_id).
+    """
+    if object_type(conn, table) == "table":
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_symbol_date" ON "{table}" (Symbol, Date)')
+        conn.commit()
+
+def compact_dtypes(df, float_dtype=DATA_FLOAT_DTYPE):
+    """
+    Converts a query result to compact dtypes: datetime dates, categorical text columns,
+    `float_dtype` floats and the smallest integer type that fits.
+    """
+    for col in df.columns:
+        if col == 'Date':
+            df[col] = pd.to_datetime(df[col])
+        elif col in TEXT_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype(float_dtype)
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+def read_stock_data(columns=None, symbols=None, start=None, end=None, table="full_stock_data",
+                    db_path=DATABASE_PATH, float_dtype=DATA_FLOAT_DTYPE):
+    """
+    Reads stock rows with the column, symbol and date filters applied in SQL.
+
+    Parameters:
+        columns (list): Columns to read (None reads all). Date and Symbol are always included.
+        symbols (list): Symbols to read (None reads all).
+        start (str): First date to read, 'YYYY-MM-DD' (inclusive).
+        end (str): Last date to read, 'YYYY-MM-DD' (inclusive).
+        table (str): The table to read.
+        db_path (str): The path to the SQLite database.
+        float_dtype (str): dtype of the float columns ('float64' keeps full precision).
+
+    Returns:
+        pd.DataFrame: The rows ordered by Symbol and Date, with compact dtypes.
+                      Returns None if an error occurs.
+    """
+    conn = connect(db_path)
+    try:
+        available = columns_of(conn, table)
+        if not available:
+            print(f"Error: table '{table}' does not exist.")
+            return None
+
+        # Column names cannot be bound as parameters, so only names of the table are accepted
+        if columns is None:
+            columns = available
+        else:
+            unknown = [col for col in columns if col not in available]
+            if unknown:
+                print(f"Error: unknown columns {unknown} in table '{table}'.")
+                return None
+            columns = ['Date', 'Symbol'] + [col for col in columns if col not in ('Date', 'Symbol')]
+
+        conditions, params = [], []
+        if symbols is not None:
+            symbols = list(symbols)
+            conditions.append(f"Symbol IN ({', '.join('?' * len(symbols))})")
+            params += symbols
+        if start is not None:
+            conditions.append("Date >= ?")
+            params.append(str(pd.Timestamp(start).date()))
+        if end is not None:
+            conditions.append("Date <= ?")
+            params.append(str(pd.Timestamp(end).date()))
+
+        ensure_symbol_date_index(conn, table)
+        select = ", ".join(f'"{col}"' for col in columns)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        df = pd.read_sql(f'SELECT {select} FROM "{table}" {where} ORDER BY Symbol, Date', conn, params=params)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return None
+
+    return compact_dtypes(df, float_dtype)
+
+def read_symbols(table="full_stock_data", db_path=DATABASE_PATH):
+    """Returns the sorted list of symbols in a table."""
+    conn = connect(db_path)
+    ensure_symbol_date_index(conn, table)
+    return [row[0] for row in conn.execute(f'SELECT DISTINCT Symbol FROM "{table}" ORDER BY Symbol')]
+
+def read_field_frame(field, symbols=None, start=None, end=None, table="full_stock_data",
+                     db_path=DATABASE_PATH, float_dtype=DATA_FLOAT_DTYPE):
+    """
+    Reads one column as a wide DataFrame (dates x symbols).
+
+    Returns:
+        pd.DataFrame: Returns None if an error occurs.
+    """
+    df = read_stock_data([field], symbols, start, end, table, db_path, float_dtype)
+    if df is None:
+        return None
+    return df.astype({'Symbol': str}).pivot(index='Date', columns='Symbol', values=field)
@@ -0,0 +1,363 @@
+import os
+import json
+import math
+from collections import deque
+import pandas as pd
+from config import INDICATOR_STATE_PATH, INDICATOR_SPEC
+from indicators import indicator_columns
+
+NAN = float('nan')
+
+def is_nan(value):
+    return value != value
+
+def divide(numerator, denominator):
+    """Division with the float semantics of pandas: x / 0 is +-inf and 0 / 0 is NaN."""
+    if denominator == 0:
+        return NAN if numerator == 0 or is_nan(numerator) else math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+class EWM:
+    """
+    One-bar-at-a-time exponentially weighted mean, step for step the recursion pandas uses for
+    Series.ewm(alpha=..., adjust=..., min_periods=...).mean() (with ignore_na=False).
+    """
+    def __init__(self, alpha, adjust=True, min_periods=0):
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, value):
+        is_observation = not is_nan(value)
+        self.nobs += is_observation
+        if not is_nan(self.weighted):
+            self.old_wt *= 1.0 - self.alpha
+            if is_observation:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + new_wt * value) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.0
+        elif is_observation:
+            self.weighted = value
+        return self.weighted if self.nobs >= max(self.min_periods, 1) else NAN
+
+    def to_dict(self):
+        return {'weighted': self.weighted, 'old_wt': self.old_wt, 'nobs': self.nobs}
+
+    def load(self, state):
+        self.weighted, self.old_wt, self.nobs = state['weighted'], state['old_wt'], state['nobs']
+        return self
+
+class SMA:
+    """Simple moving average over the last `length` bars. NaN until the window is full."""
+    def __init__(self, length):
+        self.length = length
+        self.window = deque(maxlen=length)
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) < self.length:
+            return NAN
+        return math.fsum(self.window) / self.length
+
+    def step(self, high, low, close):
+        return (self.update(close),)
+
+    def to_dict(self):
+        return {'window': list(self.window)}
+
+    def load(self, state):
+        self.window.extend(state['window'])
+        return self
+
+class EMA:
+    """
+    ewm(span=length, adjust=False), seeded with the SMA of the first `length` bars when presma is set,
+    as in indicators.ema and pandas_ta.
+    """
+    def __init__(self, length, presma=True):
+        self.length = length
+        self.presma = presma
+        self.seed = []
+        self.ewm = EWM(2.0 / (length + 1), adjust=False)
+
+    def update(self, value):
+        if self.presma and len(self.seed) < self.length:
+            self.seed.append(value)
+            if len(self.seed) < self.length:
+                return NAN
+            observed = [x for x in self.seed if not is_nan(x)]
+            value = math.fsum(observed) / len(observed) if observed else NAN
+        return self.ewm.update(value)
+
+    def step(self, high, low, close):
+        return (self.update(close),)
+
+    def to_dict(self):
+        return {'seed': self.seed, 'ewm': self.ewm.to_dict()}
+
+    def load(self, state):
+        self.seed = list(state['seed'])
+        self.ewm.load(state['ewm'])
+        return self
+
+class MACD:
+    """MACD line, histogram and signal line. The signal EMA starts at the first MACD value."""
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+        self.started = False
+
+    def update(self, close):
+        macd_line = self.fast.update(close) - self.slow.update(close)
+        self.started = self.started or not is_nan(macd_line)
+        signal_line = self.signal.update(macd_line) if self.started else NAN
+        return macd_line, macd_line - signal_line, signal_line
+
+    def step(self, high, low, close):
+        return self.update(close)
+
+    def to_dict(self):
+        return {'fast': self.fast.to_dict(), 'slow': self.slow.to_dict(), 'signal': self.signal.to_dict(),
+                'started': self.started}
+
+    def load(self, state):
+        self.fast.load(state['fast'])
+        self.slow.load(state['slow'])
+        self.signal.load(state['signal'])
+        self.started = state['started']
+        return self
+
+class RSI:
+    """Wilder RSI: average gains and losses smoothed with ewm(alpha=1/length, min_periods=length)."""
+    def __init__(self, length=14):
+        self.prev_close = NAN
+        self.gains = EWM(1.0 / length, adjust=True, min_periods=length)
+        self.losses = EWM(1.0 / length, adjust=True, min_periods=length)
+
+    def update(self, close):
+        change = close - self.prev_close
+        self.prev_close = close
+        average_gain = self.gains.update(change if is_nan(change) else max(change, 0.0))
+        average_loss = self.losses.update(change if is_nan(change) else min(change, 0.0))
+        return 100 * divide(average_gain, average_gain + abs(average_loss))
+
+    def step(self, high, low, close):
+        return (self.update(close),)
+
+    def to_dict(self):
+        return {'prev_close': self.prev_close, 'gains': self.gains.to_dict(), 'losses': self.losses.to_dict()}
+
+    def load(self, state):
+        self.prev_close = state['prev_close']
+        self.gains.load(state['gains'])
+        self.losses.load(state['losses'])
+        return self
+
+def non_zero_range(high, low):
+    diff = high - low
+    return diff if diff != 0 else 2.220446049250313e-16
+
+class BBands:
+    """Bollinger Bands over the last `length` closes with a population standard deviation."""
+    def __init__(self, length=20, std=2.0):
+        self.length = length
+        self.std = std
+        self.window = deque(maxlen=length)
+
+    def update(self, close):
+        self.window.append(close)
+        if len(self.window) < self.length:
+            return NAN, NAN, NAN, NAN, NAN
+        mid = math.fsum(self.window) / self.length
+        variance = math.fsum((x - mid) ** 2 for x in self.window) / self.length
+        deviations = self.std * math.sqrt(variance) if not is_nan(variance) else NAN
+        lower, upper = mid - deviations, mid + deviations
+        band_range = non_zero_range(upper, lower)
+        return lower, mid, upper, 100 * divide(band_range, mid), divide(non_zero_range(close, lower), band_range)
+
+    def step(self, high, low, close):
+        return self.update(close)
+
+    def to_dict(self):
+        return {'window': list(self.window)}
+
+    def load(self, state):
+        self.window.extend(state['window'])
+        return self
+
+class ATR:
+    """Average True Range smoothed with Wilder's moving average. The first bar has no true range."""
+    def __init__(self, length=14):
+        self.prev_close = None
+        self.rma = EWM(1.0 / length, adjust=True, min_periods=length)
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            true_range = NAN
+        else:
+            ranges = [abs(non_zero_range(high, low)), abs(high - self.prev_close), abs(self.prev_close - low)]
+            observed = [x for x in ranges if not is_nan(x)]
+            true_range = max(observed) if observed else NAN
+        self.prev_close = close
+        return self.rma.update(true_range)
+
+    def step(self, high, low, close):
+        return (self.update(high, low, close),)
+
+    def to_dict(self):
+        return {'prev_close': self.prev_close, 'rma': self.rma.to_dict()}
+
+    def load(self, state):
+        self.prev_close = state['prev_close']
+        self.rma.load(state['rma'])
+        return self
+
+# Incremental counterpart of each indicator in indicators.INDICATORS
+INCREMENTAL_INDICATORS = {
+    'sma': SMA,
+    'ema': EMA,
+    'macd': MACD,
+    'rsi': RSI,
+    'bbands': BBands,
+    'atr': ATR,
+}
+
+class SymbolIndicators:
+    """
+    The indicators of a specification for one symbol. update() consumes one bar and returns the output
+    columns in constant time, whatever the length of the history before it. The number of bars consumed
+    and the total of their High + Low + Close identify that history (see unchanged_prefix_symbols).
+    """
+    def __init__(self, spec=INDICATOR_SPEC, columns=None):
+        self.columns = indicator_columns(spec) if columns is None else columns
+        self.last_date = None
+        self.bars = 0
+        self.checksum = 0.0
+        self.indicators = [INCREMENTAL_INDICATORS[entry['name']](**entry.get('params', {})) for entry in spec]
+
+    def update(self, date, high, low, close):
+        self.last_date = date
+        if self.bars is not None:
+            self.bars += 1
+            self.checksum += high + low + close
+        values = []
+        for indicator in self.indicators:
+            values.extend(indicator.step(high, low, close))
+        return dict(zip(self.columns, values))
+
+    def to_dict(self):
+        return {'last_date': self.last_date, 'bars': self.bars, 'checksum': self.checksum,
+                'indicators': [indicator.to_dict() for indicator in self.indicators]}
+
+    @classmethod
+    def from_dict(cls, state, spec=INDICATOR_SPEC, columns=None):
+        symbol_state = cls(spec, columns)
+        symbol_state.last_date = state['last_date']
+        # States saved before the checksum existed cannot be matched against their history
+        symbol_state.bars = state.get('bars')
+        symbol_state.checksum = state.get('checksum')
+        for indicator, saved in zip(symbol_state.indicators, state['indicators']):
+            indicator.load(saved)
+        return symbol_state
+
+def load_indicator_state(state_path=INDICATOR_STATE_PATH, spec=INDICATOR_SPEC):
+    """
+    Loads the saved indicator state.
+
+    Returns:
+        dict: Symbol -> SymbolIndicators. Empty if no state has been saved yet, or if it was saved
+              for a different indicator specification.
+    """
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading indicator state {state_path}: {e}. Starting from scratch.")
+        return {}
+    if saved.get('spec') != json.loads(json.dumps(spec)):
+        print(f"Indicator state {state_path} was saved for a different indicator specification. Starting from scratch.")
+        return {}
+
+    columns = indicator_columns(spec)
+    return {symbol: SymbolIndicators.from_dict(state, spec, columns) for symbol, state in saved['symbols'].items()}
+
+def save_indicator_state(states, state_path=INDICATOR_STATE_PATH, spec=INDICATOR_SPEC):
+    """Writes the indicator state of every symbol together with its specification. The file is replaced atomically."""
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'spec': spec, 'symbols': {symbol: state.to_dict() for symbol, state in states.items()}}, f)
+    os.replace(temp_path, state_path)
+
+def unchanged_prefix_symbols(data, states, group_col='Symbol'):
+    """
+    Returns the symbols whose saved state was built from exactly the bars `data` holds up to the state's
+    last date (same number of bars, same High + Low + Close total): they only had bars appended since, so
+    feeding their new bars continues the state. The other symbols with state had older bars revised.
+
+    Parameters:
+        data (pd.DataFrame): The full history with 'Date', 'High', 'Low', 'Close' and the group column.
+        states (dict): Symbol -> SymbolIndicators.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        list: The symbols whose state can be continued.
+    """
+    symbols = data[group_col].astype(str)
+    dates = pd.to_datetime(data['Date']).dt.strftime('%Y-%m-%d')
+    last_dates = symbols.map({symbol: state.last_date for symbol, state in states.items()}).fillna('')
+    prefix = dates <= last_dates
+    totals = ((data['High'].astype(float) + data['Low'].astype(float) + data['Close'].astype(float))[prefix]
+              .groupby(symbols[prefix]).agg(['size', 'sum']))
+
+    unchanged = []
+    for symbol, state in states.items():
+        if state.bars is None or symbol not in totals.index:
+            continue
+        bars, checksum = totals.loc[symbol]
+        if bars == state.bars and math.isclose(checksum, state.checksum, rel_tol=1e-9):
+            unchanged.append(symbol)
+    return unchanged
+
+def update_indicators(new_data, states, spec=INDICATOR_SPEC, group_col='Symbol'):
+    """
+    Feeds new bars through the per-symbol indicator state.
+
+    Bars dated on or before a symbol's last processed date are skipped, so overlapping input is harmless.
+    Symbols without state start from scratch.
+
+    Parameters:
+        new_data (pd.DataFrame): New rows with 'Date', 'High', 'Low', 'Close' and the group column.
+        states (dict): Symbol -> SymbolIndicators, updated in place.
+        spec (list): Indicator specification of the states.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        pd.DataFrame: The new rows (ordered by symbol and date) with the indicator columns appended.
+    """
+    columns = indicator_columns(spec)
+    new_data = new_data.assign(Date=pd.to_datetime(new_data['Date']).dt.strftime('%Y-%m-%d'))
+    new_data = new_data.sort_values([group_col, 'Date'], kind='stable').reset_index(drop=True)
+
+    keep, rows = [], []
+    for i, (symbol, date, high, low, close) in enumerate(zip(new_data[group_col].astype(str), new_data['Date'],
+                                                             new_data['High'].astype(float),
+                                                             new_data['Low'].astype(float),
+                                                             new_data['Close'].astype(float))):
+        if symbol not in states:
+            states[symbol] = SymbolIndicators(spec, columns)
+        state = states[symbol]
+        if state.last_date is not None and date <= state.last_date:
+            continue
+        keep.append(i)
+        rows.append(state.update(date, high, low, close))
+
+    indicators = pd.DataFrame(rows, columns=columns)
+    return pd.concat([new_data.iloc[keep].reset_index(drop=True), indicators], axis=1)
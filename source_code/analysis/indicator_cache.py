@@ -0,0 +1,204 @@
+import os
+import io
+import json
+import time
+import hashlib
+import sqlite3
+import numpy as np
+import pandas as pd
+from config import INDICATOR_CACHE_PATH, INDICATOR_CACHE_MAX_BYTES, INDICATOR_SPEC
+from indicators import INPUT_COLUMNS, compute_indicators, indicator_columns
+
+class IndicatorCache:
+    """
+    On-disk cache of computed indicator columns, one entry per symbol.
+
+    Entries are keyed by the symbol, the indicator specification and a hash of the symbol's input rows,
+    so any change to either produces a new key and stale results are never served. When the stored
+    entries exceed `max_bytes`, the least recently used ones are evicted.
+    """
+    def __init__(self, cache_path=INDICATOR_CACHE_PATH, max_bytes=INDICATOR_CACHE_MAX_BYTES):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                symbol TEXT,
+                body BLOB,
+                size INTEGER,
+                last_used REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+        self.conn.commit()
+        self.evict()
+
+    def get_many(self, keys):
+        """
+        Returns the cached arrays for the keys that are present, and marks them as recently used.
+
+        Returns:
+            dict: Key -> 2D array (rows x indicator columns).
+        """
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self.conn.execute(f"SELECT key, body FROM entries WHERE key IN ({placeholders})", batch).fetchall()
+            for key, body in rows:
+                found[key] = np.load(io.BytesIO(body), allow_pickle=False)
+                self.bytes_read += len(body)
+
+        now = time.time()
+        self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+        self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries):
+        """
+        Stores computed arrays, then evicts the least recently used entries if the cache is over its size limit.
+
+        Parameters:
+            entries (list): (key, symbol, 2D array) tuples.
+        """
+        now = time.time()
+        rows = []
+        for key, symbol, values in entries:
+            buffer = io.BytesIO()
+            np.save(buffer, values, allow_pickle=False)
+            body = buffer.getvalue()
+            rows.append((key, symbol, body, len(body), now))
+            self.bytes_written += len(body)
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (key, symbol, body, size, last_used) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        self.conn.commit()
+        self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """Deletes least recently used entries until the stored size is within max_bytes."""
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        to_delete = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if excess <= 0:
+                break
+            to_delete.append((key,))
+            excess -= size
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+        self.conn.commit()
+        self.evictions += len(to_delete)
+
+    def stats(self):
+        """Returns the hit / miss counters, the bytes read and written, evictions and the stored size."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'evictions': self.evictions,
+            'stored_bytes': self.total_bytes(),
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Indicator cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+              f"{stats['bytes_read'] / 1e6:.1f} MB read, {stats['bytes_written'] / 1e6:.1f} MB written, "
+              f"{stats['evictions']} evicted, {stats['stored_bytes'] / 1e6:.1f} MB stored")
+
+    def close(self):
+        self.conn.close()
+
+def symbol_blocks(data, group_col='Symbol'):
+    """
+    Returns the (start, end) row range of every symbol in data ordered by symbol.
+
+    Returns:
+        dict: Symbol -> (start, end).
+    """
+    symbols = data[group_col].astype(str).to_numpy()
+    boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+    starts, ends = np.r_[0, boundaries], np.r_[boundaries, len(symbols)]
+    return {symbols[start]: (start, end) for start, end in zip(starts, ends) if start < end}
+
+def symbol_cache_keys(data, blocks, spec=INDICATOR_SPEC):
+    """
+    Builds one cache key per symbol from the symbol, the specification and a hash of the symbol's
+    Date and price rows (in row order).
+
+    Parameters:
+        data (pd.DataFrame): Rows ordered by symbol.
+        blocks (dict): Symbol -> (start, end) from symbol_blocks.
+        spec (list): Indicator specification.
+
+    Returns:
+        dict: Symbol -> key.
+    """
+    spec_hash = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    columns = ['Date'] + [col for col in INPUT_COLUMNS if col in data.columns]
+    row_hashes = pd.util.hash_pandas_object(data[columns].astype({'Date': str}), index=False).to_numpy()
+    return {symbol: f"{symbol}:{spec_hash}:{hashlib.sha256(row_hashes[start:end].tobytes()).hexdigest()}"
+            for symbol, (start, end) in blocks.items()}
+
+def compute_indicators_cached(data, cache, spec=INDICATOR_SPEC, group_col='Symbol'):
+    """
+    compute_indicators with a per-symbol cache: symbols whose input rows are unchanged since a previous
+    run are read from the cache, and only the others are computed (in one vectorized pass).
+
+    Parameters:
+        data (pd.DataFrame): Stock data, each symbol's rows in date order.
+        cache (IndicatorCache): The cache to read and update.
+        spec (list): Indicator specification.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        pd.DataFrame: Same result as compute_indicators(data, spec). attrs['computed_symbols'] lists the
+                      symbols that were not served from the cache.
+    """
+    columns = indicator_columns(spec)
+    data = data.sort_values(group_col, kind='stable').reset_index(drop=True)
+    blocks = symbol_blocks(data, group_col)
+    keys = symbol_cache_keys(data, blocks, spec)
+    cached = cache.get_many(keys.values())
+
+    values = np.full((len(data), len(columns)), np.nan)
+    stale = []
+    for symbol, (start, end) in blocks.items():
+        if keys[symbol] in cached:
+            values[start:end] = cached[keys[symbol]]
+        else:
+            stale.append(symbol)
+
+    if stale:
+        print(f"Computing indicators for {len(stale)} of {len(blocks)} symbols")
+        mask = np.zeros(len(data), dtype=bool)
+        for symbol in stale:
+            mask[slice(*blocks[symbol])] = True
+        computed = compute_indicators(data[mask], spec, group_col)
+        computed_values = computed[columns].to_numpy(dtype='float64')
+        values[mask] = computed_values
+
+        computed_blocks = symbol_blocks(computed, group_col)
+        cache.put_many([(keys[symbol], symbol, computed_values[slice(*computed_blocks[symbol])]) for symbol in stale])
+
+    result = pd.concat([data, pd.DataFrame(values, columns=columns, index=data.index)], axis=1)
+    result.attrs['computed_symbols'] = stale
+    return result
@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+from config import INDICATOR_SPEC
+
+# Price columns an indicator graph can read
+INPUT_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def to_panel(data, columns, group_col='Symbol'):
+    """
+    Lays out long-format rows as 2D arrays of shape (bar position, symbol).
+
+    Row i of a symbol's column is that symbol's i-th bar, so rolling windows never cross symbols and
+    calendar gaps behave exactly as in a per-symbol calculation. Shorter symbols are padded with NaN.
+
+    Parameters:
+        data (pd.DataFrame): Rows of all symbols, each symbol in date order.
+        columns (list): Numeric columns to lay out.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        tuple: (dict of column -> 2D DataFrame, positions, symbol codes) where positions and codes
+               map every input row to its cell in the 2D arrays.
+    """
+    codes, symbols = pd.factorize(data[group_col], sort=True)
+    positions = data.groupby(codes, sort=False).cumcount().to_numpy()
+    shape = (positions.max() + 1 if len(positions) else 0, len(symbols))
+
+    frames = {}
+    for col in columns:
+        values = np.full(shape, np.nan)
+        values[positions, codes] = data[col].to_numpy(dtype='float64', na_value=np.nan)
+        frames[col] = pd.DataFrame(values)
+    return frames, positions, codes
+
+def non_zero_range(high, low):
+    """high - low, with zero ranges replaced by machine epsilon to avoid dividing by zero."""
+    diff = high - low
+    return diff.mask(diff == 0, np.finfo(float).eps)
+
+def align_first_valid(frame):
+    """
+    Shifts every column up so that it starts at its first non-NaN value.
+
+    Returns:
+        tuple: (shifted DataFrame, per-column offsets) for restore_first_valid.
+    """
+    values = frame.to_numpy()
+    valid = ~np.isnan(values)
+    offsets = np.where(valid.any(axis=0), valid.argmax(axis=0), len(values))
+    rows = np.arange(len(values))[:, None] + offsets
+    shifted = np.take_along_axis(values, np.minimum(rows, len(values) - 1), axis=0)
+    shifted[rows >= len(values)] = np.nan
+    return pd.DataFrame(shifted), offsets
+
+def restore_first_valid(frame, offsets):
+    """Inverse of align_first_valid."""
+    values = frame.to_numpy()
+    rows = np.arange(len(values))[:, None] - offsets
+    restored = np.take_along_axis(values, np.clip(rows, 0, len(values) - 1), axis=0)
+    restored[rows < 0] = np.nan
+    return pd.DataFrame(restored)
+
+# --- Intermediate operations. Every node of an indicator graph is one of these. ---
+
+def sma(close, length):
+    return close.rolling(length, min_periods=length).mean()
+
+def ema(close, length, presma=True):
+    """
+    Exponential moving average, ewm(span=length, adjust=False). With presma (the pandas_ta default)
+    it is seeded with the SMA of the first `length` bars.
+    """
+    if not presma:
+        return close.ewm(span=length, adjust=False).mean()
+    seeded = close.copy()
+    seeded.iloc[length - 1] = close.iloc[:length].mean()
+    seeded.iloc[:length - 1] = np.nan
+    return seeded.ewm(span=length, adjust=False).mean()
+
+def ema_from_first_valid(values, length):
+    """SMA-seeded EMA that starts at each symbol's first non-NaN value (used for the MACD signal line)."""
+    aligned, offsets = align_first_valid(values)
+    return restore_first_valid(ema(aligned, length), offsets)
+
+def rma(close, length):
+    """Wilder's moving average."""
+    return close.ewm(alpha=1.0 / length, min_periods=length).mean()
+
+def rolling_std(close, length, ddof=0):
+    return close.rolling(length, min_periods=length).std(ddof=ddof)
+
+def true_range(high, low, close):
+    """Largest of high - low, |high - previous close| and |previous close - low|. The first bar is NaN."""
+    prev_close = close.shift(1)
+    ranges = np.stack([non_zero_range(high, low).to_numpy(), (high - prev_close).to_numpy(),
+                       (prev_close - low).to_numpy()])
+    result = pd.DataFrame(np.fmax.reduce(np.abs(ranges), axis=0))
+    result.iloc[:1] = np.nan
+    return result
+
+OPERATIONS = {
+    'sma': sma,
+    'ema': ema,
+    'ema_from_first_valid': ema_from_first_valid,
+    'rma': rma,
+    'rolling_std': rolling_std,
+    'true_range': true_range,
+    'diff': lambda values: values.diff(),
+    'gains': lambda change: change.clip(lower=0),
+    'losses': lambda change: change.clip(upper=0),
+    'subtract': lambda left, right: left - right,
+    'band': lambda mid, deviation, multiplier: mid + multiplier * deviation,
+    'rsi_ratio': lambda average_gain, average_loss: 100 * average_gain / (average_gain + average_loss.abs()),
+    'bandwidth': lambda lower, mid, upper: 100 * non_zero_range(upper, lower) / mid,
+    'band_percent': lambda close, lower, upper: non_zero_range(close, lower) / non_zero_range(upper, lower),
+}
+
+class IndicatorGraph:
+    """
+    Dependency graph of intermediate series.
+
+    Nodes are identified by their operation, inputs and parameters, so asking twice for the same
+    intermediate (e.g. the 20-bar SMA of Close for SMA_20 and for the Bollinger middle band) returns the
+    same node, and evaluate() computes it only once.
+    """
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, operation, *inputs, **params):
+        """Registers a node (once) and returns its key. Inputs are price column names or other node keys."""
+        key = (operation, inputs, tuple(sorted(params.items())))
+        self.nodes.setdefault(key, (operation, inputs, params))
+        return key
+
+    def evaluate(self, keys, frames):
+        """
+        Computes the requested nodes and everything they depend on.
+
+        Parameters:
+            keys (list): Node keys to compute.
+            frames (dict): Price column -> 2D DataFrame from to_panel.
+
+        Returns:
+            dict: Node key (or price column) -> computed 2D DataFrame, including every intermediate.
+        """
+        results = dict(frames)
+
+        def compute(key):
+            if key not in results:
+                operation, inputs, params = self.nodes[key]
+                results[key] = OPERATIONS[operation](*[compute(node) for node in inputs], **params)
+            return results[key]
+
+        for key in keys:
+            compute(key)
+        return results
+
+# --- Indicator definitions: each adds its nodes to the graph and returns {output column: node}. ---
+
+def build_sma(graph, length):
+    return {f'SMA_{length}': graph.add('sma', 'Close', length=length)}
+
+def build_ema(graph, length, presma=True):
+    return {f'EMA_{length}': graph.add('ema', 'Close', length=length, presma=presma)}
+
+def build_macd(graph, fast=12, slow=26, signal=9):
+    line = graph.add('subtract', graph.add('ema', 'Close', length=fast, presma=True),
+                     graph.add('ema', 'Close', length=slow, presma=True))
+    signal_line = graph.add('ema_from_first_valid', line, length=signal)
+    suffix = f'{fast}_{slow}_{signal}'
+    return {f'MACD_{suffix}': line, f'MACDh_{suffix}': graph.add('subtract', line, signal_line),
+            f'MACDs_{suffix}': signal_line}
+
+def build_rsi(graph, length=14):
+    change = graph.add('diff', 'Close')
+    average_gain = graph.add('rma', graph.add('gains', change), length=length)
+    average_loss = graph.add('rma', graph.add('losses', change), length=length)
+    return {f'RSI_{length}': graph.add('rsi_ratio', average_gain, average_loss)}
+
+def build_bbands(graph, length=20, std=2.0):
+    mid = graph.add('sma', 'Close', length=length)
+    deviation = graph.add('rolling_std', 'Close', length=length, ddof=0)
+    lower = graph.add('band', mid, deviation, multiplier=-float(std))
+    upper = graph.add('band', mid, deviation, multiplier=float(std))
+    suffix = f'{length}_{float(std)}'
+    return {f'BBL_{suffix}': lower, f'BBM_{suffix}': mid, f'BBU_{suffix}': upper,
+            f'BBB_{suffix}': graph.add('bandwidth', lower, mid, upper),
+            f'BBP_{suffix}': graph.add('band_percent', 'Close', lower, upper)}
+
+def build_atr(graph, length=14):
+    return {f'ATRr_{length}': graph.add('rma', graph.add('true_range', 'High', 'Low', 'Close'), length=length)}
+
+INDICATORS = {
+    'sma': build_sma,
+    'ema': build_ema,
+    'macd': build_macd,
+    'rsi': build_rsi,
+    'bbands': build_bbands,
+    'atr': build_atr,
+}
+
+def compile_spec(spec=INDICATOR_SPEC):
+    """
+    Compiles a declarative indicator specification into a graph.
+
+    Each entry is a dict with 'name' (a key of INDICATORS), optional 'params' and an optional 'output'
+    naming the output column(s) instead of the pandas_ta style defaults (one name or a list).
+
+    Returns:
+        tuple: (IndicatorGraph, dict of output column -> node key, in specification order).
+    """
+    graph = IndicatorGraph()
+    outputs = {}
+    for entry in spec:
+        if entry['name'] not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{entry['name']}'. Available: {', '.join(INDICATORS)}")
+        columns = INDICATORS[entry['name']](graph, **entry.get('params', {}))
+        names = entry.get('output')
+        if names is not None:
+            names = [names] if isinstance(names, str) else list(names)
+            if len(names) != len(columns):
+                raise ValueError(f"Indicator '{entry['name']}' has {len(columns)} outputs, got names {names}")
+            columns = dict(zip(names, columns.values()))
+        outputs.update(columns)
+    return graph, outputs
+
+def indicator_columns(spec=INDICATOR_SPEC):
+    """Returns the output column names of a specification, in order."""
+    return list(compile_spec(spec)[1])
+
+# Indicator columns of the configured specification
+INDICATOR_COLUMNS = indicator_columns()
+
+def compute_indicators(data, spec=INDICATOR_SPEC, group_col='Symbol'):
+    """
+    Computes the indicators of a specification for every symbol at once.
+
+    Each intermediate runs once over a (bar position x symbol) array instead of once per symbol and
+    indicator. The formulas follow pandas_ta 0.3.14b and produce the same column names.
+
+    Parameters:
+        data (pd.DataFrame): Stock data (must include the price columns the indicators use and the group column),
+                             each symbol's rows in date order.
+        spec (list): Indicator specification (see compile_spec). Defaults to INDICATOR_SPEC.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        pd.DataFrame: The input rows ordered by symbol (row order within a symbol is kept),
+                      with the indicator columns appended.
+    """
+    graph, outputs = compile_spec(spec)
+    data = data.sort_values(group_col, kind='stable').reset_index(drop=True)
+    frames, positions, codes = to_panel(data, [col for col in INPUT_COLUMNS if col in data.columns], group_col)
+    results = graph.evaluate(list(outputs.values()), frames)
+
+    # Gather every row's value back out of the 2D arrays
+    indicators = pd.DataFrame({col: results[key].to_numpy()[positions, codes] for col, key in outputs.items()},
+                              index=data.index)
+    return pd.concat([data, indicators], axis=1)
@@ -0,0 +1,148 @@
+import sqlite3
+import pandas as pd
+from config import (DATABASE_PATH, DASH_INDICATOR_SPEC, DATA_FLOAT_DTYPE, MATERIALIZE_WARMUP_BARS,
+                    VOLATILITY_WINDOW)
+from data_access import connect, read_field_frame
+from db_connection import transaction
+from indicators import compute_indicators, indicator_columns, to_panel
+from schema import ensure_schema, object_type
+
+# Materialized statistics (see preprocessing/schema.py):
+#   daily_stats     Daily_Return, Volatility and the moving averages of every (symbol_id, date_id) in price_fact
+#   market_returns  the equal-weighted average of the daily returns of each date
+# Read them through the stock_stats and market_return_series views, or the helpers below.
+
+def stat_columns(spec=DASH_INDICATOR_SPEC):
+    """Returns the rolling statistics columns stored next to Daily_Return."""
+    return ['Volatility'] + indicator_columns(spec)
+
+def compute_stats(data, window=VOLATILITY_WINDOW, spec=DASH_INDICATOR_SPEC):
+    """
+    Computes the daily return, its rolling volatility and the moving averages of every row.
+
+    Parameters:
+        data (pd.DataFrame): symbol_id, date_id and Close rows ordered by symbol_id and date_id.
+        window (int): Bars of returns in the rolling volatility.
+        spec (list): Indicator specification of the moving averages.
+
+    Returns:
+        pd.DataFrame: data with Daily_Return, Volatility and the indicator columns appended.
+    """
+    frames, positions, codes = to_panel(data, ['Close'], 'symbol_id')
+    returns = frames['Close'].pct_change(fill_method=None)
+    volatility = returns.rolling(window).std()
+    data = data.assign(Daily_Return=returns.to_numpy()[positions, codes],
+                       Volatility=volatility.to_numpy()[positions, codes])
+    return compute_indicators(data, spec, group_col='symbol_id')
+
+def refresh_materialized(db_path=DATABASE_PATH, full=False, window=VOLATILITY_WINDOW, spec=DASH_INDICATOR_SPEC,
+                         warmup=MATERIALIZE_WARMUP_BARS):
+    """
+    Brings the materialized statistics up to date with price_fact.
+
+    A symbol is refreshed from its first bar that has no statistics yet or whose Close changed since
+    they were computed; only those bars are rewritten, computed from the `warmup` bars before them.
+    The market return is recomputed in SQL for the dates from the earliest refreshed bar on. When
+    nothing changed this costs one query.
+
+    Parameters:
+        db_path (str): The path to the SQLite database.
+        full (bool): Drop the materialized rows and rebuild them from every bar.
+        window (int): Bars of returns in the rolling volatility.
+        spec (list): Indicator specification of the moving averages.
+        warmup (int): Bars of history recomputed before each symbol's first refreshed bar.
+
+    Returns:
+        dict: Numbers of 'symbols' and 'rows' refreshed. Returns None if an error occurs.
+    """
+    conn = connect(db_path)
+    if object_type(conn, "price_fact") != "table":
+        print("Error: no price data in the database, load it with preprocessing/databases.py first.")
+        return None
+
+    columns = ['Close', 'Daily_Return'] + stat_columns(spec)
+    try:
+        with transaction(conn):
+            ensure_schema(conn, stat_columns={col: "REAL" for col in stat_columns(spec)})
+            if full:
+                conn.execute("DELETE FROM daily_stats")
+                conn.execute("DELETE FROM market_returns")
+
+            # First bar of each symbol that is new or whose Close was revised
+            stale = dict(conn.execute("""
+                SELECT p.symbol_id, MIN(p.date_id) FROM price_fact p
+                LEFT JOIN daily_stats t ON t.symbol_id = p.symbol_id AND t.date_id = p.date_id
+                WHERE t.symbol_id IS NULL OR p."Close" IS NOT t."Close"
+                GROUP BY p.symbol_id
+            """).fetchall())
+            if not stale:
+                return {'symbols': 0, 'rows': 0}
+
+            # Read each refreshed symbol from the start of its warm-up
+            refresh = []
+            for symbol_id, first_id in stale.items():
+                row = conn.execute("SELECT date_id FROM price_fact WHERE symbol_id = ? AND date_id < ? "
+                                   "ORDER BY date_id DESC LIMIT 1 OFFSET ?", (symbol_id, first_id, warmup - 1)).fetchone()
+                refresh.append((symbol_id, row[0] if row else 0, first_id))
+            conn.execute("DROP TABLE IF EXISTS temp.refresh")
+            conn.execute("CREATE TEMP TABLE refresh (symbol_id INTEGER PRIMARY KEY, start_id INTEGER, first_id INTEGER)")
+            conn.executemany("INSERT INTO temp.refresh VALUES (?, ?, ?)", refresh)
+            data = pd.read_sql('SELECT p.symbol_id, p.date_id, p."Close", f.first_id FROM temp.refresh f '
+                               'JOIN price_fact p ON p.symbol_id = f.symbol_id AND p.date_id >= f.start_id '
+                               'ORDER BY p.symbol_id, p.date_id', conn)
+            conn.execute("DROP TABLE temp.refresh")
+
+            stats = compute_stats(data[['symbol_id', 'date_id', 'Close']], window, spec)
+            stats = stats[(data['date_id'] >= data['first_id']).to_numpy()]
+            column_list = ", ".join(["symbol_id", "date_id"] + [f'"{col}"' for col in columns])
+            conn.executemany(f'INSERT OR REPLACE INTO daily_stats ({column_list}) '
+                             f'VALUES ({", ".join("?" * (len(columns) + 2))})',
+                             zip(*(stats[col].tolist() for col in ['symbol_id', 'date_id'] + columns)))
+
+            first_date = min(stale.values())
+            conn.execute("DELETE FROM market_returns WHERE date_id >= ?", (first_date,))
+            conn.execute('INSERT INTO market_returns (date_id, "Market_Return", "Symbols") '
+                         'SELECT date_id, AVG("Daily_Return"), COUNT("Daily_Return") FROM daily_stats '
+                         'WHERE date_id >= ? GROUP BY date_id', (first_date,))
+    except sqlite3.Error as e:
+        print(f"Error refreshing the materialized statistics: {e}")
+        return None
+
+    print(f"Refreshed the statistics of {len(stale)} symbols ({len(stats)} rows).")
+    return {'symbols': len(stale), 'rows': len(stats)}
+
+def read_returns_matrix(symbols=None, start=None, end=None, db_path=DATABASE_PATH, float_dtype=DATA_FLOAT_DTYPE):
+    """
+    Reads the materialized daily returns as a wide DataFrame (dates x symbols).
+
+    Returns:
+        pd.DataFrame: Returns None if an error occurs.
+    """
+    return read_field_frame('Daily_Return', symbols, start, end, table="stock_stats", db_path=db_path,
+                            float_dtype=float_dtype)
+
+def read_market_returns(start=None, end=None, db_path=DATABASE_PATH):
+    """
+    Reads the materialized equal-weighted market return.
+
+    Returns:
+        pd.Series: Market_Return indexed by datetime Date. Returns None if an error occurs.
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("Date >= ?")
+        params.append(str(pd.Timestamp(start).date()))
+    if end is not None:
+        conditions.append("Date <= ?")
+        params.append(str(pd.Timestamp(end).date()))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        df = pd.read_sql(f'SELECT Date, "Market_Return" FROM market_return_series {where} ORDER BY Date',
+                         connect(db_path), params=params)
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Error: {e}")
+        return None
+    return df.set_index(pd.to_datetime(df['Date']))['Market_Return'].rename_axis('Date')
+
+if __name__ == "__main__":
+    refresh_materialized()
@@ -0,0 +1,237 @@
+import os
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from config import DATABASE_PATH, PANEL_STORE_PATH, PANEL_FIELDS, PANEL_DTYPE
+from data_access import connect
+from db_connection import transaction
+from schema import load_version
+
+# The panel is stored as <path>/panel.npy (symbols x dates x fields) and <path>/index.json
+PANEL_FILE_NAME = "panel.npy"
+INDEX_FILE_NAME = "index.json"
+
+def db_watermark(table="full_stock_data", db_path=DATABASE_PATH):
+    """
+    Identifies the contents of a stock table by the load counter that every load changing it bumps
+    (see schema.load_version), which is a single-row lookup. A table loaded without the counter (an
+    older database) is summarized by its last date, its number of rows and the sum of its closes.
+
+    Returns:
+        dict: 'version' and 'loaded_at' (or 'max_date', 'rows' and 'close_total'), or None when the
+        table does not exist or is empty.
+    """
+    conn = connect(db_path)
+    try:
+        version = load_version(conn, table)
+        if version is not None:
+            return version
+        max_date, rows, close_total = conn.execute(
+            f'SELECT MAX(Date), COUNT(*), TOTAL("Close") FROM "{table}"').fetchone()
+    except sqlite3.Error:
+        return None
+    if not rows:
+        return None
+    return {'max_date': str(max_date)[:10], 'rows': rows, 'close_total': close_total}
+
+def panel_exists(path=PANEL_STORE_PATH, table="full_stock_data", db_path=DATABASE_PATH):
+    """
+    Returns True when both the panel array and its index have been built and the panel is current:
+    when the database holds stock data, the watermark saved with the panel must match it.
+    A stale panel is reported so that callers fall back to the database.
+    """
+    index_path = os.path.join(path, INDEX_FILE_NAME)
+    if not (os.path.exists(os.path.join(path, PANEL_FILE_NAME)) and os.path.exists(index_path)):
+        return False
+
+    current = db_watermark(table, db_path)
+    if current is None:
+        return True
+    with open(index_path, 'r', encoding='utf-8') as f:
+        saved = json.load(f).get('watermark')
+    if saved != current:
+        print(f"Panel store at {path} does not match the database (panel: {saved}, database: {current}). "
+              f"Run panel_store.py to rebuild it; reading the database instead.")
+        return False
+    return True
+
+def build_panel(data, path=PANEL_STORE_PATH, fields=PANEL_FIELDS, dtype=PANEL_DTYPE, watermark=None):
+    """
+    Builds the on-disk panel from a long (Symbol, Date, ...) DataFrame.
+
+    Every symbol is aligned on one trading-day calendar (the union of all dates). Days on which a
+    symbol has no row are NaN. The array is written with np.lib.format.open_memmap, so it is never
+    held in memory twice, and both files are swapped in atomically once complete.
+
+    Parameters:
+        data (pd.DataFrame): Long-format rows with 'Symbol', 'Date' and the requested fields.
+        path (str): Folder of the panel store.
+        fields (list): Numeric columns to store. Missing columns are skipped.
+        dtype (str): Element type of the array.
+        watermark (dict): db_watermark of the table the data was read from, checked by panel_exists.
+
+    Returns:
+        tuple: Shape of the panel (symbols, dates, fields).
+    """
+    fields = [field for field in fields if field in data.columns]
+    data = data.drop_duplicates(subset=['Symbol', 'Date'], keep='last')
+
+    symbol_codes, symbols = pd.factorize(data['Symbol'].astype(str), sort=True)
+    date_codes, dates = pd.factorize(pd.to_datetime(data['Date']), sort=True)
+
+    os.makedirs(path, exist_ok=True)
+    panel_path = os.path.join(path, PANEL_FILE_NAME)
+    temp_path = os.path.join(path, f"tmp_{PANEL_FILE_NAME}")
+
+    panel = np.lib.format.open_memmap(temp_path, mode='w+', dtype=dtype,
+                                      shape=(len(symbols), len(dates), len(fields)))
+    panel[:] = np.nan
+    panel[symbol_codes, date_codes, :] = data[fields].to_numpy(dtype=dtype, na_value=np.nan)
+    panel.flush()
+    del panel
+
+    # Company names are kept with the symbol index since they are not numeric
+    companies = {}
+    if 'Company' in data.columns:
+        companies = data.drop_duplicates('Symbol', keep='last').set_index('Symbol')['Company'].to_dict()
+
+    index = {
+        'symbols': list(symbols),
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'fields': fields,
+        'companies': {str(symbol): company for symbol, company in companies.items()},
+        'watermark': watermark,
+    }
+    index_path = os.path.join(path, INDEX_FILE_NAME)
+    with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+    os.replace(temp_path, panel_path)
+    os.replace(f"{index_path}.tmp", index_path)
+    print(f"Panel of {len(symbols)} symbols x {len(dates)} days x {len(fields)} fields saved to {path}")
+    return len(symbols), len(dates), len(fields)
+
+class PanelStore:
+    """
+    Read-only view of the panel built by build_panel.
+
+    The array is memory-mapped, so processes reading the same panel share one page-cached copy and
+    only the slices that are actually used are read from disk. Slicing one symbol, a date range or
+    a single field returns a view without copying.
+    """
+    def __init__(self, path=PANEL_STORE_PATH):
+        with open(os.path.join(path, INDEX_FILE_NAME), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.path = path
+        self.values = np.load(os.path.join(path, PANEL_FILE_NAME), mmap_mode='r')
+        self.symbols = index['symbols']
+        self.dates = pd.DatetimeIndex(pd.to_datetime(index['dates']))
+        self.fields = index['fields']
+        self.companies = index.get('companies', {})
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+
+    def __repr__(self):
+        return f"PanelStore({len(self.symbols)} symbols x {len(self.dates)} days x {len(self.fields)} fields)"
+
+    def date_slice(self, start=None, end=None):
+        """Returns the slice of the calendar between two inclusive dates."""
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        last = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return slice(first, last)
+
+    def field_positions(self, fields):
+        """Returns the field positions, as a slice (no copy) when they are contiguous."""
+        if fields is None:
+            return slice(None)
+        if isinstance(fields, str):
+            return self.field_index[fields]
+        positions = [self.field_index[field] for field in fields]
+        if positions == list(range(positions[0], positions[-1] + 1)):
+            return slice(positions[0], positions[-1] + 1)
+        return positions
+
+    def symbol_positions(self, symbols):
+        """Returns the symbol positions, as a slice (no copy) when they are contiguous."""
+        if symbols is None:
+            return slice(None)
+        if isinstance(symbols, str):
+            return self.symbol_index[symbols]
+        positions = [self.symbol_index[symbol] for symbol in symbols]
+        if positions and positions == list(range(positions[0], positions[-1] + 1)):
+            return slice(positions[0], positions[-1] + 1)
+        return positions
+
+    def get(self, symbols=None, start=None, end=None, fields=None):
+        """
+        Returns the raw array for a selection of symbols, dates and fields.
+
+        A single symbol or field drops that axis. Contiguous selections are views into the memory map;
+        a scattered list of symbols or fields is copied.
+        """
+        symbol_positions = self.symbol_positions(symbols)
+        field_positions = self.field_positions(fields)
+        # Symbols and dates are selected first, so that two position lists are never broadcast together
+        return self.values[symbol_positions, self.date_slice(start, end)][..., field_positions]
+
+    def field_frame(self, field, symbols=None, start=None, end=None):
+        """
+        Returns one field as a wide DataFrame (dates x symbols), the layout of
+        data.pivot(index='Date', columns='Symbol', values=field).
+        """
+        symbol_list = self.symbols if symbols is None else list(symbols)
+        values = self.get(symbols, start, end, field)
+        frame = pd.DataFrame(values.T, index=self.dates[self.date_slice(start, end)], columns=symbol_list)
+        frame.index.name = 'Date'
+        frame.columns.name = 'Symbol'
+        return frame
+
+    def frame(self, symbol, fields=None, start=None, end=None, dropna=True):
+        """
+        Returns the rows of one symbol as a DataFrame indexed by Date.
+
+        Parameters:
+            symbol (str): The stock symbol.
+            fields (list): Fields to include. Defaults to all fields.
+            start, end (str or datetime): Inclusive date bounds.
+            dropna (bool): Drop the calendar days on which the symbol has no data at all.
+        """
+        field_list = self.fields if fields is None else list(fields)
+        values = self.get(symbol, start, end, None if fields is None else field_list)
+        frame = pd.DataFrame(values, index=self.dates[self.date_slice(start, end)], columns=field_list)
+        frame.index.name = 'Date'
+        if dropna:
+            frame = frame.dropna(how='all')
+        return frame
+
+    def to_long(self, symbols=None, fields=None, start=None, end=None):
+        """Returns the selection in the long (Date, fields..., Symbol) layout of the database tables."""
+        symbol_list = self.symbols if symbols is None else list(symbols)
+        frames = []
+        for symbol in symbol_list:
+            frame = self.frame(symbol, fields, start, end).reset_index()
+            frame['Symbol'] = symbol
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+def load_panel(path=PANEL_STORE_PATH):
+    """Opens the panel store, or returns None (with a message) when it has not been built yet or is out of date."""
+    if not panel_exists(path):
+        print(f"Panel store not found or out of date at {path}. Run panel_store.py to build it.")
+        return None
+    return PanelStore(path)
+
+def build_panel_from_db(table="full_stock_data", db_path=DATABASE_PATH, path=PANEL_STORE_PATH):
+    """Builds the panel from a long-format table of the SQLite database, saving the table's watermark with it."""
+    conn = connect(db_path)
+    # Read the rows and the watermark in one transaction so that a concurrent load cannot slip in between
+    with transaction(conn):
+        watermark = db_watermark(table, db_path)
+        data = pd.read_sql(f"SELECT * FROM {table}", conn)
+    print(f"Loaded {len(data)} rows from table '{table}'")
+    return build_panel(data, path, watermark=watermark)
+
+if __name__ == "__main__":
+    # Rebuild the panel from the full stock table
+    build_panel_from_db()
@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import pandas as pd
+from config import PREPROCESSED_DATA_PATH, BACKTEST_HORIZONS
+from indicators import to_panel
+from pattern_scanner import scan_patterns, scan_multi_bar_patterns
+
+processed_file_name = "processed_data.csv"
+
+def forward_returns(data, horizons=BACKTEST_HORIZONS, group_col='Symbol'):
+    """
+    Computes, for every row, the return from its close to the close `h` bars later (same symbol) and
+    the excess of that return over the equal-weighted average of all symbols on the same date.
+
+    The closes are laid out as a (bar position x symbol) array, so each horizon is one array shift;
+    returns that would run past a symbol's last bar are NaN.
+
+    Parameters:
+        data (pd.DataFrame): Rows of all symbols with Date and Close, each symbol in date order.
+        horizons (list): Holding periods in bars.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        pd.DataFrame: FWD_<h> and EXCESS_<h> columns for every horizon, aligned with data's index.
+    """
+    frames, positions, codes = to_panel(data, ['Close'], group_col)
+    close = frames['Close'].to_numpy()
+    dates = data['Date'].to_numpy()
+
+    columns = {}
+    for h in horizons:
+        future = np.full_like(close, np.nan)
+        future[:-h] = close[h:]
+        fwd = (future / close - 1)[positions, codes]
+        market = pd.Series(fwd).groupby(dates).transform('mean').to_numpy()
+        columns[f'FWD_{h}'] = fwd
+        columns[f'EXCESS_{h}'] = fwd - market
+    return pd.DataFrame(columns, index=data.index)
+
+def backtest_patterns(data, scan=None, horizons=BACKTEST_HORIZONS, group_col='Symbol'):
+    """
+    Measures how every pattern performed on every symbol over each horizon.
+
+    A signal is traded at the close of the bar it completes on: long for bullish (1) signals and
+    short for bearish (-1) ones, so returns below are signed by the signal direction.
+
+    Parameters:
+        data (pd.DataFrame): OHLC rows of all symbols, each symbol in date order.
+        scan (pd.DataFrame): Pattern signal columns aligned with data (defaults to the single-bar and
+                             multi-bar scans of data); '<pattern>_STRENGTH' columns are ignored.
+        horizons (list): Holding periods in bars.
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        pd.DataFrame: One row per (Pattern, Symbol, Horizon) with Occurrences, Hit_Rate (share of signals
+                      with a positive signed return), Avg_Return and Avg_Excess_Return.
+    """
+    if scan is None:
+        scan = pd.concat([scan_patterns(data, group_col=group_col),
+                          scan_multi_bar_patterns(data, group_col=group_col)], axis=1)
+    patterns = [col for col in scan.columns if not col.endswith('_STRENGTH')]
+    returns = forward_returns(data, horizons, group_col)
+
+    # One entry per (row, pattern) with a signal
+    signals = scan[patterns].to_numpy().astype('int64')
+    rows, pattern_idx = np.nonzero(signals)
+    direction = signals[rows, pattern_idx]
+    fwd = returns[[f'FWD_{h}' for h in horizons]].to_numpy()[rows] * direction[:, None]
+    excess = returns[[f'EXCESS_{h}' for h in horizons]].to_numpy()[rows] * direction[:, None]
+
+    # Long format over horizons, dropping trades whose horizon runs past the end of the data
+    n_trades, n_horizons = fwd.shape
+    trades = pd.DataFrame({
+        'Pattern': np.repeat(np.array(patterns, dtype=object)[pattern_idx], n_horizons),
+        'Symbol': np.repeat(data[group_col].to_numpy()[rows], n_horizons),
+        'Horizon': np.tile(np.asarray(horizons), n_trades),
+        'Return': fwd.ravel(),
+        'Excess_Return': excess.ravel(),
+    }).dropna(subset=['Return'])
+    trades['Hit'] = trades['Return'] > 0
+
+    return (trades.groupby(['Pattern', 'Symbol', 'Horizon'])
+            .agg(Occurrences=('Return', 'size'), Hit_Rate=('Hit', 'mean'),
+                 Avg_Return=('Return', 'mean'), Avg_Excess_Return=('Excess_Return', 'mean'))
+            .reset_index())
+
+def summarize_backtest(results):
+    """
+    Aggregates backtest_patterns output over symbols, weighting each symbol by its number of occurrences.
+
+    Returns:
+        pd.DataFrame: One row per (Pattern, Horizon) with Symbols, Occurrences, Hit_Rate, Avg_Return and
+                      Avg_Excess_Return, best average excess return first within each horizon.
+    """
+    weighted = results.assign(**{col: results[col] * results['Occurrences']
+                                 for col in ['Hit_Rate', 'Avg_Return', 'Avg_Excess_Return']})
+    summary = (weighted.groupby(['Pattern', 'Horizon'])
+               .agg(Symbols=('Symbol', 'nunique'), Occurrences=('Occurrences', 'sum'), Hit_Rate=('Hit_Rate', 'sum'),
+                    Avg_Return=('Avg_Return', 'sum'), Avg_Excess_Return=('Avg_Excess_Return', 'sum'))
+               .reset_index())
+    for col in ['Hit_Rate', 'Avg_Return', 'Avg_Excess_Return']:
+        summary[col] /= summary['Occurrences']
+    return summary.sort_values(['Horizon', 'Avg_Excess_Return'], ascending=[True, False], ignore_index=True)
+
+if __name__ == "__main__":
+    csv_file_path = os.path.join(PREPROCESSED_DATA_PATH, processed_file_name)
+    if not os.path.exists(csv_file_path):
+        print(f"Error: File {csv_file_path} does not exist.")
+    else:
+        data = pd.read_csv(csv_file_path)
+        summary = summarize_backtest(backtest_patterns(data))
+        print(summary.to_string(index=False))
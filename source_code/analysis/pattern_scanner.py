@@ -0,0 +1,264 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from config import PATTERN_THRESHOLDS
+
+# Single-bar pattern columns added by scan_patterns
+PATTERN_COLUMNS = ['CDLDOJI', 'CDLENGULFING', 'CDLHAMMER']
+
+def candle_parts(data):
+    """
+    Returns the body size, full range and lower wick of every candle as NumPy arrays.
+    """
+    open_, high, low, close = (data[col].to_numpy(dtype='float64') for col in ['Open', 'High', 'Low', 'Close'])
+    body = np.abs(close - open_)
+    candle_range = high - low
+    lower_wick = np.minimum(close, open_) - low
+    return body, candle_range, lower_wick
+
+def previous_bar(data, columns, group_col='Symbol'):
+    """
+    Returns the previous bar's values of the same symbol (NaN on each symbol's first bar).
+    Each symbol's rows must be in date order; symbols may be interleaved.
+    """
+    return data.groupby(group_col, sort=False, observed=True)[columns].shift(1)
+
+def detect_doji(data, thresholds=PATTERN_THRESHOLDS):
+    """
+    Doji: a candle with a very small body relative to its range.
+    """
+    body, candle_range, _ = candle_parts(data)
+    return body <= thresholds['doji_body_ratio'] * candle_range
+
+def detect_hammer(data, thresholds=PATTERN_THRESHOLDS):
+    """
+    Hammer: a candle with a small body and a long lower wick.
+    """
+    body, candle_range, lower_wick = candle_parts(data)
+    return ((body <= thresholds['hammer_body_ratio'] * candle_range)
+            & (lower_wick >= thresholds['hammer_lower_wick_ratio'] * candle_range))
+
+def detect_engulfing(data, group_col='Symbol'):
+    """
+    Engulfing: a candle whose body completely engulfs the previous candle's body of the same symbol.
+
+    Returns:
+        np.ndarray: 1 for bullish, -1 for bearish and 0 otherwise (always 0 on a symbol's first bar).
+    """
+    prev = previous_bar(data, ['Open', 'Close'], group_col)
+    prev_open, prev_close = prev['Open'].to_numpy(dtype='float64'), prev['Close'].to_numpy(dtype='float64')
+    curr_open, curr_close = data['Open'].to_numpy(dtype='float64'), data['Close'].to_numpy(dtype='float64')
+
+    bullish = (curr_close > curr_open) & (prev_close < prev_open) & (curr_open < prev_close) & (curr_close > prev_open)
+    bearish = (curr_close < curr_open) & (prev_close > prev_open) & (curr_open > prev_close) & (curr_close < prev_open)
+    return np.where(bullish, 1, np.where(bearish, -1, 0))
+
+def scan_patterns(data, thresholds=PATTERN_THRESHOLDS, group_col='Symbol'):
+    """
+    Evaluates every candlestick pattern over all symbols in one pass.
+
+    Parameters:
+        data (pd.DataFrame): OHLC rows of any number of symbols, each symbol's rows in date order.
+        thresholds (dict): Pattern thresholds (see PATTERN_THRESHOLDS in config).
+        group_col (str): Column identifying the symbol; previous-bar comparisons never cross symbols.
+
+    Returns:
+        pd.DataFrame: The CDLDOJI, CDLENGULFING and CDLHAMMER columns, aligned with data's index.
+    """
+    return pd.DataFrame({
+        'CDLDOJI': detect_doji(data, thresholds),
+        'CDLENGULFING': detect_engulfing(data, group_col),
+        'CDLHAMMER': detect_hammer(data, thresholds),
+    }, index=data.index)
+
+def add_patterns(data, thresholds=PATTERN_THRESHOLDS, group_col='Symbol'):
+    """Returns a copy of data with the pattern columns added."""
+    return pd.concat([data.drop(columns=PATTERN_COLUMNS, errors='ignore'),
+                      scan_patterns(data, thresholds, group_col)], axis=1)
+
+def pattern_rows(data):
+    """Keeps the rows on which at least one pattern was detected."""
+    return data[(data['CDLDOJI'] == 1) | (data['CDLENGULFING'] != 0) | (data['CDLHAMMER'] == 1)]
+
+# --- Multi-bar patterns ---
+#
+# Every multi-bar pattern is a function of a Windows object: (rows x bars) views of the OHLC arrays where
+# column 0 is the oldest bar and the last column is the bar the pattern is reported on. It returns
+# (bullish, bearish, strength) arrays: two boolean masks and a score that is clipped to [0, 1].
+
+class Windows:
+    """
+    Zero-copy sliding windows of `length` bars ending at every row, over symbol-contiguous OHLC arrays.
+    `valid` marks the rows whose window lies entirely inside one symbol.
+    """
+    def __init__(self, arrays, positions, length):
+        self.length = length
+        self.valid = positions >= length - 1
+        for name, values in arrays.items():
+            # Pad the front so that window i ends at row i, then view without copying
+            padded = np.concatenate([np.full(length - 1, np.nan), values])
+            setattr(self, name, sliding_window_view(padded, length))
+        self.body = self.close - self.open
+        self.abs_body = np.abs(self.body)
+        self.range = self.high - self.low
+
+    def bar(self, name, i):
+        """Column i of a windowed array (negative indices count from the newest bar)."""
+        return getattr(self, name)[:, i]
+
+def is_long(windows, i, thresholds):
+    """Bar i has a body of at least long_body_ratio of its range."""
+    return windows.abs_body[:, i] >= thresholds['long_body_ratio'] * windows.range[:, i]
+
+def harami(windows, thresholds):
+    """
+    Harami (2 bars): a long candle followed by a smaller candle of the opposite color whose body lies
+    inside the first body. Strength: how small the second body is relative to the first.
+    """
+    o0, c0, o1, c1 = windows.bar('open', 0), windows.bar('close', 0), windows.bar('open', 1), windows.bar('close', 1)
+    inside = (np.maximum(o1, c1) < np.maximum(o0, c0)) & (np.minimum(o1, c1) > np.minimum(o0, c0))
+    setup = is_long(windows, 0, thresholds) & inside
+    bullish = setup & (c0 < o0) & (c1 > o1)
+    bearish = setup & (c0 > o0) & (c1 < o1)
+    strength = 1 - windows.abs_body[:, 1] / windows.abs_body[:, 0]
+    return bullish, bearish, strength
+
+def tweezer(windows, thresholds):
+    """
+    Tweezer bottom (bullish) / top (bearish) (2 bars): a candle and a reversal candle of the opposite color
+    sharing the same low (bottom) or high (top) within tweezer_tolerance of the average range.
+    Strength: how closely the two extremes match.
+    """
+    tolerance = thresholds['tweezer_tolerance'] * windows.range.mean(axis=1)
+    low_gap = np.abs(windows.bar('low', 0) - windows.bar('low', 1))
+    high_gap = np.abs(windows.bar('high', 0) - windows.bar('high', 1))
+    bullish = (windows.body[:, 0] < 0) & (windows.body[:, 1] > 0) & (low_gap <= tolerance)
+    bearish = (windows.body[:, 0] > 0) & (windows.body[:, 1] < 0) & (high_gap <= tolerance)
+    strength = 1 - np.where(bullish, low_gap, high_gap) / tolerance
+    return bullish, bearish, strength
+
+def star(windows, thresholds):
+    """
+    Morning star (bullish) / evening star (bearish) (3 bars): a long candle, a small-bodied candle whose body
+    gaps beyond the first close, and a candle of the opposite color closing past the middle of the first body.
+    Strength: how much of the first body the third candle retraces.
+    """
+    o0, c0, o1, c1, c2 = (windows.bar('open', 0), windows.bar('close', 0), windows.bar('open', 1),
+                          windows.bar('close', 1), windows.bar('close', 2))
+    small_star = windows.abs_body[:, 1] <= thresholds['star_body_ratio'] * windows.abs_body[:, 0]
+    setup = is_long(windows, 0, thresholds) & small_star
+    midpoint = (o0 + c0) / 2
+    bullish = setup & (c0 < o0) & (np.maximum(o1, c1) < c0) & (windows.body[:, 2] > 0) & (c2 > midpoint)
+    bearish = setup & (c0 > o0) & (np.minimum(o1, c1) > c0) & (windows.body[:, 2] < 0) & (c2 < midpoint)
+    strength = (c2 - c0) / (o0 - c0)
+    return bullish, bearish, strength
+
+def three_soldiers_crows(windows, thresholds):
+    """
+    Three white soldiers (bullish) / three black crows (bearish) (3 bars): three long candles of the same color,
+    each closing beyond the previous close and opening inside the previous body.
+    Strength: the average body-to-range ratio of the three candles.
+    """
+    opens, closes = windows.open, windows.close
+    long_bodies = np.all(windows.abs_body >= thresholds['long_body_ratio'] * windows.range, axis=1)
+    opens_inside = np.all((opens[:, 1:] >= np.minimum(opens[:, :-1], closes[:, :-1]))
+                          & (opens[:, 1:] <= np.maximum(opens[:, :-1], closes[:, :-1])), axis=1)
+    bullish = long_bodies & opens_inside & np.all(windows.body > 0, axis=1) & np.all(np.diff(closes, axis=1) > 0, axis=1)
+    bearish = long_bodies & opens_inside & np.all(windows.body < 0, axis=1) & np.all(np.diff(closes, axis=1) < 0, axis=1)
+    strength = np.mean(windows.abs_body / windows.range, axis=1)
+    return bullish, bearish, strength
+
+def three_methods(windows, thresholds):
+    """
+    Rising (bullish) / falling (bearish) three methods (5 bars): a long candle, three small candles that stay
+    within its range, and a long candle of the first color closing beyond the first close.
+    Strength: the size of the last body relative to the first.
+    """
+    inner = slice(1, 4)
+    within_range = (np.all(windows.high[:, inner] <= windows.bar('high', 0)[:, None], axis=1)
+                    & np.all(windows.low[:, inner] >= windows.bar('low', 0)[:, None], axis=1))
+    small_inner = np.all(windows.abs_body[:, inner] <= thresholds['small_body_ratio'] * windows.abs_body[:, :1], axis=1)
+    setup = is_long(windows, 0, thresholds) & is_long(windows, 4, thresholds) & within_range & small_inner
+    bullish = setup & (windows.body[:, 0] > 0) & (windows.body[:, 4] > 0) & (windows.bar('close', 4) > windows.bar('close', 0))
+    bearish = setup & (windows.body[:, 0] < 0) & (windows.body[:, 4] < 0) & (windows.bar('close', 4) < windows.bar('close', 0))
+    strength = windows.abs_body[:, 4] / windows.abs_body[:, 0]
+    return bullish, bearish, strength
+
+# Pattern column -> (bars in the formation, detector)
+MULTI_BAR_PATTERNS = {
+    'CDLHARAMI': (2, harami),
+    'CDLTWEEZER': (2, tweezer),
+    'CDLSTAR': (3, star),
+    'CDL3SOLDIERSCROWS': (3, three_soldiers_crows),
+    'CDLRISEFALL3METHODS': (5, three_methods),
+}
+
+def scan_multi_bar_patterns(data, patterns=None, thresholds=PATTERN_THRESHOLDS, group_col='Symbol'):
+    """
+    Evaluates multi-bar patterns over all symbols, one vectorized pass per pattern.
+
+    Rows are put in symbol-contiguous order once; every pattern then reads sliding-window views of the
+    same arrays, so the cost grows linearly with bars x patterns and no window crosses two symbols.
+
+    Parameters:
+        data (pd.DataFrame): OHLC rows of any number of symbols, each symbol's rows in date order.
+        patterns (list): Pattern columns to scan (keys of MULTI_BAR_PATTERNS). Defaults to all.
+        thresholds (dict): Pattern thresholds (see PATTERN_THRESHOLDS in config).
+        group_col (str): Column identifying the symbol.
+
+    Returns:
+        pd.DataFrame: For every pattern, a signal column (1 bullish, -1 bearish, 0 none) and a
+                      '<pattern>_STRENGTH' column in [0, 1] (NaN where there is no signal), aligned with data's index.
+    """
+    patterns = list(MULTI_BAR_PATTERNS) if patterns is None else patterns
+    codes, _ = pd.factorize(data[group_col], sort=True)
+    order = np.argsort(codes, kind='stable')
+    positions = pd.Series(codes[order]).groupby(codes[order]).cumcount().to_numpy()
+    arrays = {col.lower(): data[col].to_numpy(dtype='float64')[order] for col in ['Open', 'High', 'Low', 'Close']}
+
+    results = {}
+    windows_by_length = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name in patterns:
+            length, detector = MULTI_BAR_PATTERNS[name]
+            if length not in windows_by_length:
+                windows_by_length[length] = Windows(arrays, positions, length)
+            windows = windows_by_length[length]
+
+            bullish, bearish, strength = detector(windows, thresholds)
+            signal = np.where(windows.valid & bullish, 1, np.where(windows.valid & bearish, -1, 0))
+            strength = np.where(signal != 0, np.clip(strength, 0, 1), np.nan)
+
+            # Scatter back from symbol-contiguous order to the input order
+            results[name] = np.empty_like(signal)
+            results[name][order] = signal
+            results[f'{name}_STRENGTH'] = np.empty_like(strength)
+            results[f'{name}_STRENGTH'][order] = strength
+
+    return pd.DataFrame(results, index=data.index)
+
+def pattern_occurrences(data, scan, group_col='Symbol'):
+    """
+    Converts a pattern scan into long format: one row per (symbol, date, pattern) with a signal.
+
+    Parameters:
+        data (pd.DataFrame): The scanned rows (for the Symbol and Date columns).
+        scan (pd.DataFrame): Output of scan_patterns or scan_multi_bar_patterns. Patterns without a
+                             '<pattern>_STRENGTH' column (the single-bar ones) get a NaN strength.
+
+    Returns:
+        pd.DataFrame: Columns Symbol, Date, Pattern, Signal, Strength.
+    """
+    frames = []
+    for name in [col for col in scan.columns if not col.endswith('_STRENGTH')]:
+        signal = scan[name].to_numpy().astype('int64')
+        hits = signal != 0
+        strength = scan[f'{name}_STRENGTH'].to_numpy() if f'{name}_STRENGTH' in scan else np.full(len(scan), np.nan)
+        frames.append(pd.DataFrame({
+            'Symbol': data[group_col].to_numpy()[hits],
+            'Date': data['Date'].to_numpy()[hits],
+            'Pattern': name,
+            'Signal': signal[hits],
+            'Strength': strength[hits],
+        }))
+    return pd.concat(frames, ignore_index=True)
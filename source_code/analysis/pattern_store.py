@@ -0,0 +1,188 @@
+import pandas as pd
+from config import DATABASE_PATH
+from data_access import connect
+from db_connection import transaction
+from schema import drop_legacy_table, ensure_schema, object_type, to_date_id  # preprocessing/schema.py, put on the path by data_access
+
+# Display names of the pattern codes
+PATTERN_LABELS = {
+    'CDLDOJI': 'Doji',
+    'CDLENGULFING': 'Engulfing',
+    'CDLHAMMER': 'Hammer',
+    'CDLHARAMI': 'Harami',
+    'CDLTWEEZER': 'Tweezer',
+    'CDLSTAR': 'Star',
+    'CDL3SOLDIERSCROWS': 'Three Soldiers / Crows',
+    'CDLRISEFALL3METHODS': 'Three Methods',
+}
+
+def from_date_id(date_ids):
+    """Converts YYYYMMDD integers back to datetimes."""
+    return pd.to_datetime(pd.Series(date_ids).astype(str), format='%Y%m%d')
+
+class PatternStore:
+    """
+    Normalized store of candlestick pattern occurrences.
+
+    One row per (symbol, date, pattern) holding only integer keys, the signal (1 bullish, -1 bearish) and the
+    strength score; symbol and pattern names live in dimension tables shared with the rest of the
+    normalized schema (preprocessing/schema.py). The primary key
+    (symbol_id, date_id, pattern_code) serves per-symbol lookups and a second index (pattern_code, date_id)
+    serves per-pattern lookups, so every query helper below is an index range scan.
+
+    Queries run on the calling thread's shared connection, so one store can serve the threads of a web server.
+    """
+    def __init__(self, db_path=DATABASE_PATH):
+        self.db_path = db_path
+
+    def exists(self):
+        """Returns True once occurrences have been saved to the database (the readers return nothing before)."""
+        return object_type(self.conn, "pattern_occurrence") == "table"
+
+    @property
+    def conn(self):
+        return connect(self.db_path)
+
+    def ids(self, table, column, id_column, names):
+        """Returns name -> id for a dimension table, inserting the names it does not have yet."""
+        self.conn.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(name,) for name in names])
+        return dict(self.conn.execute(f"SELECT {column}, {id_column} FROM {table}").fetchall())
+
+    def write(self, occurrences, scanned=None, patterns=None):
+        """
+        Stores occurrences in one transaction. Re-writing the same (symbol, date, pattern) replaces the row.
+
+        When `scanned` is given, the stored occurrences of every scanned symbol between its first and last
+        scanned date (restricted to `patterns` when given) are deleted first in the same transaction, so
+        detections that disappeared after a threshold change or a data revision do not linger.
+        A legacy 'stock_pattern' table (the old append-only layout) is dropped so that its view takes over.
+
+        Parameters:
+            occurrences (pd.DataFrame): Columns Symbol, Date, Pattern, Signal, Strength (see pattern_occurrences).
+            scanned (pd.DataFrame): Symbol and Date of the rows that were scanned.
+            patterns (list): Patterns that were scanned (None: every pattern).
+
+        Returns:
+            int: Number of rows written.
+        """
+        # One transaction, so that dropping a legacy table rolls back with a failed write
+        with transaction(self.conn):
+            # The schema is created by the first save, so that opening a store never writes
+            if not self.exists():
+                ensure_schema(self.conn)
+            drop_legacy_table(self.conn, "stock_pattern")
+            symbols = occurrences['Symbol'].unique().tolist()
+            if scanned is not None:
+                symbols = sorted(set(symbols) | set(scanned['Symbol'].astype(str)))
+            symbol_ids = self.ids("symbols", "symbol", "symbol_id", symbols)
+            pattern_codes = self.ids("patterns", "pattern", "pattern_code", occurrences['Pattern'].unique().tolist())
+            self.conn.executemany("UPDATE patterns SET label = ? WHERE pattern = ?",
+                                  [(label, name) for name, label in PATTERN_LABELS.items()])
+
+            if scanned is not None:
+                bounds = (pd.DataFrame({'symbol_id': scanned['Symbol'].astype(str).map(symbol_ids).to_numpy(),
+                                        'date_id': to_date_id(scanned['Date']).to_numpy()})
+                          .groupby('symbol_id')['date_id'].agg(['min', 'max']))
+                pattern_filter, pattern_params = "", []
+                if patterns is not None:
+                    pattern_filter = (f" AND pattern_code IN (SELECT pattern_code FROM patterns "
+                                      f"WHERE pattern IN ({', '.join('?' * len(patterns))}))")
+                    pattern_params = list(patterns)
+                self.conn.executemany(
+                    f"DELETE FROM pattern_occurrence WHERE symbol_id = ? AND date_id BETWEEN ? AND ?{pattern_filter}",
+                    [(symbol_id, start, end, *pattern_params)
+                     for symbol_id, start, end in zip(bounds.index.tolist(), bounds['min'].tolist(), bounds['max'].tolist())])
+
+            rows = zip(occurrences['Symbol'].map(symbol_ids).tolist(),
+                       to_date_id(occurrences['Date']).tolist(),
+                       occurrences['Pattern'].map(pattern_codes).tolist(),
+                       occurrences['Signal'].astype('int64').tolist(),
+                       occurrences['Strength'].astype('float64').tolist())
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO pattern_occurrence (symbol_id, date_id, pattern_code, signal, strength)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        return len(occurrences)
+
+    def query(self, where="", params=(), order="o.symbol_id, o.date_id"):
+        """Runs a select over the occurrences joined to their names and returns them in the long format."""
+        if not self.exists():
+            return pd.DataFrame({'Symbol': [], 'Date': pd.to_datetime([]), 'Pattern': [], 'Label': [],
+                                 'Signal': [], 'Strength': []})
+        df = pd.read_sql(f"""
+            SELECT s.symbol AS Symbol, o.date_id AS Date, p.pattern AS Pattern, p.label AS Label,
+                   o.signal AS Signal, o.strength AS Strength
+            FROM pattern_occurrence o
+            JOIN symbols s ON s.symbol_id = o.symbol_id
+            JOIN patterns p ON p.pattern_code = o.pattern_code
+            {where}
+            ORDER BY {order}
+        """, self.conn, params=params)
+        df['Date'] = from_date_id(df['Date'])
+        return df
+
+    def recent(self, pattern, days, as_of=None):
+        """
+        Returns the occurrences of one pattern in the `days` calendar days up to `as_of`
+        (defaults to the pattern's latest occurrence), e.g. recent('CDLHAMMER', 30).
+        """
+        if as_of is None:
+            if not self.exists():
+                return self.query()
+            as_of = self.conn.execute("""
+                SELECT MAX(o.date_id) FROM pattern_occurrence o
+                WHERE o.pattern_code = (SELECT pattern_code FROM patterns WHERE pattern = ?)
+            """, (pattern,)).fetchone()[0]
+            if as_of is None:
+                return self.query("WHERE 0")
+            as_of = from_date_id([as_of])[0]
+        as_of = pd.Timestamp(as_of)
+        start, end = to_date_id([as_of - pd.Timedelta(days=days), as_of]).tolist()
+        return self.query("WHERE o.pattern_code = (SELECT pattern_code FROM patterns WHERE pattern = ?) "
+                          "AND o.date_id BETWEEN ? AND ?", (pattern, start, end), order="o.date_id, o.symbol_id")
+
+    def symbol_occurrences(self, symbol, start=None, end=None):
+        """Returns the occurrences of one symbol, optionally between two dates (inclusive)."""
+        start_id, end_id = date_bounds(start, end)
+        return self.query("WHERE o.symbol_id = (SELECT symbol_id FROM symbols WHERE symbol = ?) "
+                          "AND o.date_id BETWEEN ? AND ?", (symbol, start_id, end_id))
+
+    def counts_per_symbol(self, pattern=None, start=None, end=None):
+        """
+        Returns the number of occurrences per symbol and pattern, for one pattern or all of them,
+        optionally between two dates (inclusive).
+
+        Returns:
+            pd.DataFrame: Columns Symbol, Pattern, Count.
+        """
+        if not self.exists():
+            return pd.DataFrame({'Symbol': [], 'Pattern': [], 'Count': []})
+        start_id, end_id = date_bounds(start, end)
+        where, params = "WHERE o.date_id BETWEEN ? AND ?", (start_id, end_id)
+        if pattern is not None:
+            where += " AND o.pattern_code = (SELECT pattern_code FROM patterns WHERE pattern = ?)"
+            params += (pattern,)
+        return pd.read_sql(f"""
+            SELECT s.symbol AS Symbol, p.pattern AS Pattern, c.n AS Count
+            FROM (SELECT o.symbol_id, o.pattern_code, COUNT(*) AS n FROM pattern_occurrence o
+                  {where} GROUP BY o.symbol_id, o.pattern_code) c
+            JOIN symbols s ON s.symbol_id = c.symbol_id
+            JOIN patterns p ON p.pattern_code = c.pattern_code
+            ORDER BY s.symbol, p.pattern
+        """, self.conn, params=params)
+
+    def stats(self):
+        """Returns the number of occurrences, symbols and patterns stored."""
+        return {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] if self.exists() else 0
+                for table in ["pattern_occurrence", "symbols", "patterns"]}
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Pattern store: {stats['pattern_occurrence']} occurrences of {stats['patterns']} patterns "
+              f"over {stats['symbols']} symbols")
+
+def date_bounds(start=None, end=None):
+    """Returns (start, end) as date ids, open ends becoming the widest possible bounds."""
+    start_id = to_date_id([start])[0] if start is not None else 0
+    end_id = to_date_id([end])[0] if end is not None else 99991231
+    return int(start_id), int(end_id)
@@ -1,44 +1,44 @@
 import os
-import sqlite3
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from config import DATABASE_PATH
+from data_access import read_stock_data
+
+# Shared preprocessing modules (metadata cache) live next to this folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'preprocessing'))
+from metadata_cache import get_sector_mapping
 
 # User-defined risk parameters
 RISK_PER_TRADE = 0.02  # 2% risk per trade
 STOP_LOSS_MULTIPLIER = 2  # Stop-loss = 2x ATR
 MAX_SECTOR_EXPOSURE = 0.25  # 25% max exposure per sector
 
-def retrieve_stock_data(table="full_stock_data"):
-    # Retrieve stock data from SQLite database
-    db_file_path = os.path.join(DATABASE_PATH, "stocks_database.db")
-    conn = sqlite3.connect(db_file_path)
-    query = f"SELECT * FROM {table}"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
-
-# Load stock data
-df = retrieve_stock_data()
+# Load the Date, Symbol and Close columns of the stock data
+df = read_stock_data(['Close'])
 
-# Convert Date column to datetime and sort data
-df['Date'] = pd.to_datetime(df['Date'])
+# Sort data by date
 df = df.sort_values(by='Date')
 
-# Manually assign sectors to stocks
-sector_mapping = {
-    'AAPL': 'Tech', 'MSFT': 'Tech', 'GOOGL': 'Tech', 'META': 'Tech', 'NVDA': 'Tech',
-    'AMZN': 'E-commerce', 'TSLA': 'Auto', 'BABA': 'E-commerce',
-    'JPM': 'Finance', 'BAC': 'Finance', 'GS': 'Finance', 'MS': 'Finance',
+# Fallback sectors for stocks that are not in the metadata cache yet. They use Yahoo Finance's sector
+# names, like the cache, so that a sector is one label (and one MAX_SECTOR_EXPOSURE limit) whichever source it comes from
+fallback_sector_mapping = {
+    'AAPL': 'Technology', 'MSFT': 'Technology', 'NVDA': 'Technology',
+    'GOOGL': 'Communication Services', 'META': 'Communication Services',
+    'AMZN': 'Consumer Cyclical', 'TSLA': 'Consumer Cyclical', 'BABA': 'Consumer Cyclical',
+    'JPM': 'Financial Services', 'BAC': 'Financial Services', 'GS': 'Financial Services', 'MS': 'Financial Services',
     'XOM': 'Energy', 'CVX': 'Energy', 'OXY': 'Energy', 'COP': 'Energy',
-    'PG': 'Consumer Goods', 'KO': 'Consumer Goods', 'PEP': 'Consumer Goods', 'WMT': 'Consumer Goods',
-    'NKE': 'Consumer Goods', 'MCD': 'Consumer Goods', 'HD': 'Retail',
+    'PG': 'Consumer Defensive', 'KO': 'Consumer Defensive', 'PEP': 'Consumer Defensive', 'WMT': 'Consumer Defensive',
+    'NKE': 'Consumer Cyclical', 'MCD': 'Consumer Cyclical', 'HD': 'Consumer Cyclical',
     'UNH': 'Healthcare', 'PFE': 'Healthcare', 'JNJ': 'Healthcare', 'MRK': 'Healthcare', 'LLY': 'Healthcare',
     'GE': 'Industrials', 'LMT': 'Industrials', 'CAT': 'Industrials',
-    'DIS': 'Entertainment', 'NFLX': 'Entertainment', 'SPOT': 'Entertainment'
+    'DIS': 'Communication Services', 'NFLX': 'Communication Services', 'SPOT': 'Communication Services'
 }
 
+# Sectors come from the company metadata cache (refreshed by preprocessing/metadata_cache.py);
+# the fallback only fills in symbols that have no cached sector
+sector_mapping = {**fallback_sector_mapping, **get_sector_mapping(df['Symbol'].unique())}
+
 # Filter out stocks without assigned sectors
 df['Sector'] = df['Symbol'].map(sector_mapping)
 df = df.dropna(subset=['Sector'])
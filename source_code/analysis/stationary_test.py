@@ -1,4 +1,3 @@
-import sqlite3
 import pandas as pd
 import os
 import numpy as np
@@ -7,48 +6,14 @@ from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 import matplotlib.pyplot as plt
 
 from config import DATABASE_PATH, PREPROCESSED_DATA_PATH
+from data_access import connect, read_stock_data
+from schema import write_stationary_close
+from panel_store import PanelStore, panel_exists
 
 # Define the folder to save ACF and PACF plots
 VISUALIZED_ACF = "visualizations/ACF-PACF"
 os.makedirs(VISUALIZED_ACF, exist_ok=True)  # Create the folder if it doesn't exist
 
-def retrieve_data(table="full_stock_data"):
-    """
-    Retrieve data from the specified table in the SQLite database.
-
-    Parameters:
-        table (str): The name of the table to retrieve data from.
-
-    Returns:
-        pd.DataFrame: A DataFrame containing the retrieved data.
-                     Returns None if an error occurs.
-    """
-    # Step 1: Connect to the Database
-    db_file_path = os.path.join(DATABASE_PATH, "stocks_database.db")
-    try:
-        conn = sqlite3.connect(db_file_path)
-        print(f"Connected to database at: {db_file_path}")
-    except sqlite3.OperationalError as e:
-        print(f"Error: {e}")
-        print("Check if the database file exists and the path is correct.")
-        return None
-
-    # Step 2: Execute a SQL Query
-    query = f"SELECT * FROM {table}"
-    try:
-        data_df = pd.read_sql(query, conn)
-        print("Data retrieved successfully:")
-        print(data_df.head())  # Display the first few rows
-    except Exception as e:
-        print(f"Error executing query: {e}")
-        return None
-    finally:
-        # Step 3: Close the Database Connection
-        conn.close()
-        print("Database connection closed.")
-
-    return data_df
-
 def test_stationarity(timeseries):
     """
     Perform the Augmented Dickey-Fuller test to check for stationarity.
@@ -116,24 +81,38 @@ def plot_acf_pacf(timeseries, symbol, lags=40):
 
 def save_stationary_data_to_db(stationary_data, db_path=DATABASE_PATH):
     """
-    Save the stationary-transformed data for all symbols to a single table in the SQLite database.
+    Save the stationary-transformed Close of all symbols to the 'stationary_close' table of the SQLite database.
 
     Parameters:
         stationary_data (pd.DataFrame): The combined stationary-transformed data for all symbols.
         db_path (str): The path to the SQLite database.
     """
-    db_file_path = os.path.join(db_path, "stocks_database.db")
-    conn = sqlite3.connect(db_file_path)
+    # Only the transformed Close is stored (stationary_close); the 'stationary_data_all' view joins the rest of the row back
+    write_stationary_close(connect(db_path), stationary_data)
+    print(f"Saved {len(stationary_data)} stationary Close values in 'stationary_close'.")
 
-    # Create a new table for the stationary data
-    table_name = "stationary_data_all"
-    stationary_data.to_sql(table_name, conn, if_exists="replace", index=False)
-    print(f"Saved all stationary data in table '{table_name}'.")
+def get_symbol_data(symbol, data_df=None, panel=None):
+    """
+    Returns the rows of one symbol in date order, sliced from the panel store when one is given.
 
-    # Close the connection
-    conn.close()
+    Parameters:
+        symbol (str): The stock symbol.
+        data_df (pd.DataFrame): Long-format stock data (used when no panel is given).
+        panel (PanelStore): The memory-mapped panel store.
 
-def process_all_symbols(data_df):
+    Returns:
+        pd.DataFrame: The symbol's rows with a 'Date' column.
+    """
+    if panel is None:
+        return data_df[data_df["Symbol"] == symbol]
+
+    symbol_data = panel.frame(symbol, fields=["Close"]).reset_index()
+    symbol_data["Date"] = symbol_data["Date"].dt.strftime("%Y-%m-%d")  # Same text dates as the database
+    symbol_data["Symbol"] = symbol
+    symbol_data["Company"] = panel.companies.get(symbol)
+    return symbol_data
+
+def process_all_symbols(data_df=None, panel=None):
     """
     Process all unique stock symbols in the dataset:
     - Test for stationarity.
@@ -143,9 +122,10 @@ def process_all_symbols(data_df):
 
     Parameters:
         data_df (pd.DataFrame): The DataFrame containing the stock data.
+        panel (PanelStore): The memory-mapped panel store, used instead of data_df when given.
     """
     # Get all unique symbols
-    unique_symbols = data_df["Symbol"].unique()
+    unique_symbols = panel.symbols if panel is not None else data_df["Symbol"].unique()
     print(f"Found {len(unique_symbols)} unique symbols: {unique_symbols}")
 
     # Initialize a list to store stationarity test results and stationary data
@@ -156,7 +136,7 @@ def process_all_symbols(data_df):
         print(f"\nProcessing symbol: {symbol}")
 
         # Filter data for the current symbol
-        symbol_data = data_df[data_df["Symbol"] == symbol]
+        symbol_data = get_symbol_data(symbol, data_df, panel)
 
         # Use the 'Close' column for time series analysis
         timeseries = symbol_data["Close"]
@@ -198,9 +178,14 @@ def process_all_symbols(data_df):
 
 # Example usage
 if __name__ == "__main__":
-    # Retrieve data from the database
-    stock_data_df = retrieve_data(table="full_stock_data")
-
-    if stock_data_df is not None:
-        # Process all unique symbols
-        process_all_symbols(stock_data_df)
\ No newline at end of file
+    # Slice symbols out of the panel store when it is built and up to date (a stale panel would be written back)
+    if panel_exists():
+        process_all_symbols(panel=PanelStore())
+    else:
+        # Retrieve the Close series from the database (full precision, as it is written back)
+        stock_data_df = read_stock_data(["Company", "Close"], float_dtype="float64")
+        if stock_data_df is not None:
+            stock_data_df["Date"] = stock_data_df["Date"].dt.strftime("%Y-%m-%d")  # Same text dates as the database
+
+            # Process all unique symbols
+            process_all_symbols(stock_data_df)
\ No newline at end of file
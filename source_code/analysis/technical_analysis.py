@@ -1,10 +1,19 @@
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 import mplfinance as mpf
 import pandas_ta as ta
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-from config import PREPROCESSED_DATA_PATH, DATABASE_PATH
+from plotly.offline import get_plotlyjs
+from config import (PREPROCESSED_DATA_PATH, DATABASE_PATH, CHART_OUTPUT_PATH, CHART_MAX_POINTS, CHART_WORKERS,
+                    CHART_MANIFEST_FILE)
+from pattern_scanner import MULTI_BAR_PATTERNS, PATTERN_COLUMNS, add_patterns, pattern_rows, scan_multi_bar_patterns, pattern_occurrences
+from pattern_store import PatternStore
+from materialize import refresh_materialized
 import sqlite3
 
 processed_file_name = "processed_data.csv"
@@ -34,11 +43,41 @@ def read_csv_to_df(clean_file_name):
     return df
 
 
+# Columns drawn on the candlestick charts
+CHART_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'SMA_7', 'EMA_30', 'BBL_20_2.0', 'BBU_20_2.0']
+
+def downsample(data, max_points):
+    """
+    Reduces a symbol's history to at most `max_points` candles by merging consecutive bars:
+    each candle is dated by its first bar and has the first Open, highest High, lowest Low, and the last
+    Close and indicator values of its bucket.
+    """
+    if not max_points or len(data) <= max_points:
+        return data
+    buckets = np.arange(len(data)) * max_points // len(data)
+    aggregations = {col: 'last' for col in data.columns}
+    aggregations.update({'Date': 'first', 'Open': 'first', 'High': 'max', 'Low': 'min'})
+    return data.groupby(buckets).agg(aggregations).reset_index(drop=True)
+
 # Function to generate and save candlestick charts
-def generate_candlestick_chart(data, symbol, save_dir="visualizations"):
+def generate_candlestick_chart(data, symbol, save_dir=CHART_OUTPUT_PATH, max_points=CHART_MAX_POINTS):
+    """
+    Writes a symbol's candlestick chart with its SMA, EMA and Bollinger Bands to <save_dir>/<symbol>_candlestick.html.
+
+    The page loads plotly.js from plotly.min.js in the same folder (written once by render_charts)
+    instead of embedding the bundle.
+
+    Parameters:
+        data (pd.DataFrame): The symbol's rows in date order.
+        symbol (str): The stock symbol.
+        save_dir (str): Output folder.
+        max_points (int): Downsample histories longer than this many candles (None keeps every bar).
+    """
+    data = downsample(data[CHART_COLUMNS], max_points)
+
     # Create candlestick chart
     fig = go.Figure(data=[go.Candlestick(
-        x=data.index,
+        x=data['Date'],
         open=data['Open'],
         high=data['High'],
         low=data['Low'],
@@ -48,28 +87,28 @@ def generate_candlestick_chart(data, symbol, save_dir="visualizations"):
     
     # Add technical indicators
     fig.add_trace(go.Scatter(
-        x=data.index,
+        x=data['Date'],
         y=data['SMA_7'],
         mode='lines',
         name='7-day SMA',
         line=dict(color='blue')
     ))
     fig.add_trace(go.Scatter(
-        x=data.index,
+        x=data['Date'],
         y=data['EMA_30'],
         mode='lines',
         name='30-day EMA',
         line=dict(color='orange')
     ))
     fig.add_trace(go.Scatter(
-        x=data.index,
+        x=data['Date'],
         y=data['BBL_20_2.0'],
         mode='lines',
         name='Bollinger Lower Band',
         line=dict(color='green', dash='dash')
     ))
     fig.add_trace(go.Scatter(
-        x=data.index,
+        x=data['Date'],
         y=data['BBU_20_2.0'],
         mode='lines',
         name='Bollinger Upper Band',
@@ -84,79 +123,138 @@ def generate_candlestick_chart(data, symbol, save_dir="visualizations"):
         template="plotly_dark"
     )
     
-    # Save as HTML and PNG
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    fig.write_html(f"{save_dir}/{symbol}_candlestick.html")
-
-def detect_doji(row):
-    """
-    Detect Doji pattern: A candle with a very small body.
-    """
-    body_size = abs(row['Close'] - row['Open'])
-    candle_range = row['High'] - row['Low']
-    # Doji condition: small body relative to the candle range
-    return body_size <= 0.01 * candle_range  # Adjust threshold as needed
-
-def detect_engulfing(data):
-    """
-    Detect Engulfing pattern: A candle that completely engulfs the previous candle.
-    """
-    engulfing = []
-    for i in range(1, len(data)):
-        prev_open, prev_close = data.iloc[i-1]['Open'], data.iloc[i-1]['Close']
-        curr_open, curr_close = data.iloc[i]['Open'], data.iloc[i]['Close']
-        # Bullish engulfing: current candle engulfs the previous candle
-        if curr_close > curr_open and prev_close < prev_open and curr_open < prev_close and curr_close > prev_open:
-            engulfing.append(1)
-        # Bearish engulfing: current candle engulfs the previous candle
-        elif curr_close < curr_open and prev_close > prev_open and curr_open > prev_close and curr_close < prev_open:
-            engulfing.append(-1)
-        else:
-            engulfing.append(0)
-    # Add a 0 for the first row (no previous candle to compare)
-    engulfing.insert(0, 0)
-    return engulfing
-
-def detect_hammer(row):
-    """
-    Detect Hammer pattern: A candle with a small body and a long lower wick.
-    """
-    body_size = abs(row['Close'] - row['Open'])
-    candle_range = row['High'] - row['Low']
-    lower_wick = min(row['Close'], row['Open']) - row['Low']
-    # Hammer condition: small body, long lower wick
-    return body_size <= 0.1 * candle_range and lower_wick >= 0.6 * candle_range
-
-def detect_patterns(data, symbol, db_path= DATABASE_PATH):
-    # Create a copy of the data to avoid SettingWithCopyWarning
-    data = data.copy()
-    
-    # Detect patterns using custom logic
-    data.loc[:, 'CDLDOJI'] = data.apply(detect_doji, axis=1)
-    data.loc[:, 'CDLENGULFING'] = detect_engulfing(data)
-    data.loc[:, 'CDLHAMMER'] = data.apply(detect_hammer, axis=1)
-    
-    # Filter rows where patterns are detected
-    patterns = data[(data['CDLDOJI'] == 1) | (data['CDLENGULFING'] != 0) | (data['CDLHAMMER'] == 1)]
-    
-    # Add symbol column
-    patterns.loc[:, 'Symbol'] = symbol
-    
-    # Store results in SQLite database
-    db_file_path = os.path.join(db_path, "stocks_database.db")
-    conn = sqlite3.connect(db_file_path)
-    patterns.to_sql("stock_pattern", conn, if_exists="append", index=False)
-    conn.close()
+    # Save as HTML referencing the shared plotly.js
+    fig.write_html(f"{save_dir}/{symbol}_candlestick.html", include_plotlyjs='directory')
+
+def chart_hashes(data, max_points=CHART_MAX_POINTS):
+    """
+    Returns a hash of every symbol's charted rows (and the downsampling setting), used to skip
+    symbols whose chart is already up to date.
+
+    Returns:
+        dict: Symbol -> hex digest.
+    """
+    row_hashes = pd.Series(pd.util.hash_pandas_object(data[CHART_COLUMNS].astype({'Date': str}), index=False).to_numpy(),
+                           index=data.index)
+    return {symbol: hashlib.sha256(f"{max_points}:".encode('utf-8') + row_hashes[group.index].to_numpy().tobytes()).hexdigest()
+            for symbol, group in data.groupby('Symbol')}
+
+def load_chart_manifest(save_dir=CHART_OUTPUT_PATH):
+    """Returns symbol -> input hash of the last render, or {} when there is none."""
+    manifest_path = os.path.join(save_dir, CHART_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def render_charts(data, save_dir=CHART_OUTPUT_PATH, max_points=CHART_MAX_POINTS, workers=CHART_WORKERS, force=False):
+    """
+    Renders the candlestick charts of all symbols whose data changed since the last render, in a process pool.
+
+    Parameters:
+        data (pd.DataFrame): Processed data of any number of symbols, each symbol's rows in date order.
+        save_dir (str): Output folder (also holds plotly.min.js and the render manifest).
+        max_points (int): Downsample histories longer than this many candles (None keeps every bar).
+        workers (int): Number of worker processes (None uses every CPU).
+        force (bool): Re-render every symbol.
+
+    Returns:
+        list: The symbols that were rendered.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    bundle_path = os.path.join(save_dir, 'plotly.min.js')
+    if not os.path.exists(bundle_path):
+        with open(bundle_path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    hashes = chart_hashes(data, max_points)
+    manifest = {} if force else load_chart_manifest(save_dir)
+    stale = [symbol for symbol, digest in hashes.items()
+             if manifest.get(symbol) != digest
+             or not os.path.exists(os.path.join(save_dir, f"{symbol}_candlestick.html"))]
+    print(f"Rendering {len(stale)} of {len(hashes)} charts ({len(hashes) - len(stale)} unchanged)")
+
+    if stale:
+        grouped = data[data['Symbol'].isin(stale)].groupby('Symbol')
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(generate_candlestick_chart, group, symbol, save_dir, max_points): symbol
+                       for symbol, group in grouped}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    future.result()
+                    manifest[symbol] = hashes[symbol]
+                except Exception as e:
+                    print(f"Error rendering the chart of {symbol}: {e}")
+
+        with open(os.path.join(save_dir, CHART_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return stale
+
+def detect_patterns(data):
+    """
+    Detects Doji, Engulfing and Hammer patterns for all symbols at once.
+
+    Parameters:
+        data (pd.DataFrame): Processed data of any number of symbols, each symbol's rows in date order.
+
+    Returns:
+        pd.DataFrame: The rows on which a pattern was detected.
+    """
+    # Evaluate the patterns as array expressions over the whole table (thresholds in PATTERN_THRESHOLDS)
+    return pattern_rows(add_patterns(data))
+
+def detect_multi_bar_patterns(data):
+    """
+    Detects the multi-bar patterns (harami, tweezers, morning/evening star, three soldiers/crows,
+    three methods) for all symbols, one row per occurrence with its strength score.
+
+    Parameters:
+        data (pd.DataFrame): Processed data of any number of symbols, each symbol's rows in date order.
+
+    Returns:
+        pd.DataFrame: The occurrences (Symbol, Date, Pattern, Signal, Strength).
+    """
+    return pattern_occurrences(data, scan_multi_bar_patterns(data))
+
+def save_patterns(patterns, occurrences, db_path= DATABASE_PATH, scanned=None):
+    """
+    Writes the single-bar and multi-bar detections to the pattern store ('pattern_occurrence',
+    unique on symbol, date and pattern) over one connection and in one transaction. The stored
+    occurrences over the scanned symbols and dates are replaced, so a rerun leaves exactly what the scan found.
+
+    Parameters:
+        patterns (pd.DataFrame): Output of detect_patterns.
+        occurrences (pd.DataFrame): Output of detect_multi_bar_patterns.
+        db_path (str): The path to the SQLite database.
+        scanned (pd.DataFrame): The data both detections ran on (defaults to the rows with a detection,
+                                which leaves the old occurrences of symbols without any detection).
+    """
+    single_bar = pattern_occurrences(patterns, patterns[PATTERN_COLUMNS])
+    detected = pd.concat([single_bar, occurrences], ignore_index=True)
+    if scanned is None:
+        scanned = detected
+    try:
+        written = PatternStore(db_path).write(detected, scanned=scanned[['Symbol', 'Date']],
+                                              patterns=PATTERN_COLUMNS + list(MULTI_BAR_PATTERNS))
+    except sqlite3.Error as e:
+        print(f"Error saving patterns to {os.path.join(db_path, 'stocks_database.db')}: {e}")
+        return
+
+    print(f"Saved {written} pattern occurrences ({len(single_bar)} single-bar, {len(occurrences)} multi-bar) "
+          f"for {patterns['Symbol'].nunique()} symbols to 'pattern_occurrence'")
 
 if __name__ == "__main__":
     # Load the cleaned data
     clean_file_name = read_csv_to_df(processed_file_name)
 
-    # Group data by 'Symbols' column
-    grouped_data = clean_file_name.groupby('Symbol')
+    # Detect patterns for every symbol in one pass
+    save_patterns(detect_patterns(clean_file_name), detect_multi_bar_patterns(clean_file_name),
+                  scanned=clean_file_name)
+
+    # Bring the statistics the dashboards read (returns, volatility, moving averages) up to date with the prices
+    refresh_materialized()
 
-# Generate charts for each stock
-    for symbol, group in grouped_data:
-        generate_candlestick_chart(group, symbol) 
-        detect_patterns(group, symbol)
\ No newline at end of file
+    # Render the charts of the symbols whose data changed since the last run
+    render_charts(clean_file_name)
@@ -1,4 +1,3 @@
-import os
 import dash
 import dash_bootstrap_components as dbc
 from dash import dcc, html, dash_table
@@ -6,46 +5,26 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
-import sqlite3
 from config import DATABASE_PATH
-
-# Step 1: Retrieve Data from SQLite
-def retrieve_data(table="stock_pattern"):
-    """Retrieve stock pattern data from SQLite database"""
-    db_file_path = os.path.join(DATABASE_PATH, "stocks_database.db")
-    try:
-        conn = sqlite3.connect(db_file_path)
-        data_df = pd.read_sql(f"SELECT * FROM {table}", conn)
-    except sqlite3.OperationalError as e:
-        print(f"Error: {e}")
-        return None
-    finally:
-        conn.close()
-    
-    return data_df
-
-# Load dataset
-df = retrieve_data("stock_pattern")
-
-# Convert Date to datetime format
-df['Date'] = pd.to_datetime(df['Date'])
-
-# Compute additional KPIs
-df['Daily_Return'] = df.groupby('Symbol')['Close'].pct_change()
-df['Cumulative_Return'] = df.groupby('Symbol')['Daily_Return'].transform(lambda x: (1 + x).cumprod() - 1)
-df['Volatility'] = df.groupby('Symbol')['Daily_Return'].rolling(30).std().reset_index(0, drop=True)
-
-# Calculate Moving Averages
-df['SMA_50'] = df.groupby('Symbol')['Close'].transform(lambda x: x.rolling(50).mean())
-df['EMA_20'] = df.groupby('Symbol')['Close'].transform(lambda x: x.ewm(span=20, adjust=False).mean())
-
-# Identify Pattern Occurrences
-df['Pattern'] = np.where(df['CDLDOJI'] == 1, 'Doji',
-                np.where(df['CDLENGULFING'] == 1, 'Engulfing',
-                np.where(df['CDLHAMMER'] == 1, 'Hammer', 'None')))
-
-# Filter non-pattern data
-pattern_df = df[df['Pattern'] != 'None']
+from data_access import read_stock_data
+from materialize import stat_columns
+from pattern_store import PatternStore
+
+# Step 1: Retrieve the price columns from SQLite (Date is returned as datetime)
+df = read_stock_data(['Open', 'High', 'Low', 'Close', 'Volume'])
+
+# Daily returns, 30-day volatility and moving averages (SMA_50, EMA_20) are materialized in the database
+# by the loaders (materialize.py); the dashboard only reads them
+stats = read_stock_data(['Daily_Return'] + stat_columns(), table="stock_stats")
+if stats is None or stats.empty:
+    print("No materialized statistics in the database. Run materialize.py after loading prices.")
+    stats = df[['Date', 'Symbol']].assign(**{col: np.nan for col in ['Daily_Return'] + stat_columns()})
+df = df.merge(stats, on=['Date', 'Symbol'], how='left')
+df.insert(df.columns.get_loc('Daily_Return') + 1, 'Cumulative_Return',
+          df.groupby('Symbol')['Daily_Return'].transform(lambda x: (1 + x).cumprod() - 1))
+
+# Pattern occurrences are looked up per selected stock from the indexed pattern store
+pattern_store = PatternStore(DATABASE_PATH)
 
 # Create Dash app with Bootstrap theme
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
@@ -107,7 +86,8 @@ app.layout = dbc.Container([
 )
 def update_charts(selected_stock):
     filtered_df = df[df['Symbol'] == selected_stock]
-    filtered_patterns = pattern_df[pattern_df['Symbol'] == selected_stock]
+    filtered_patterns = pattern_store.symbol_occurrences(selected_stock).merge(
+        filtered_df[['Date', 'Close']], on='Date', how='inner')
 
     # **1️⃣ Stock Price Trend with Moving Averages**
     price_fig = px.line(filtered_df, x='Date', y='Close', title=f'{selected_stock} Stock Price')
@@ -115,8 +95,8 @@ def update_charts(selected_stock):
     price_fig.add_scatter(x=filtered_df['Date'], y=filtered_df['EMA_20'], mode='lines', name='EMA 20', line=dict(dash='dash'))
 
     # Add markers for patterns
-    for pattern in filtered_patterns['Pattern'].unique():
-        pattern_data = filtered_patterns[filtered_patterns['Pattern'] == pattern]
+    for pattern in filtered_patterns['Label'].unique():
+        pattern_data = filtered_patterns[filtered_patterns['Label'] == pattern]
         price_fig.add_scatter(x=pattern_data['Date'], y=pattern_data['Close'], 
                               mode='markers', name=pattern, marker=dict(size=10, symbol='circle-open'))
 
@@ -138,7 +118,7 @@ def update_charts(selected_stock):
     return_fig = px.line(filtered_df, x='Date', y='Cumulative_Return', title=f'{selected_stock} Cumulative Returns')
 
     # **4️⃣ Pattern Frequency Pie Chart**
-    pattern_counts = filtered_patterns['Pattern'].value_counts()
+    pattern_counts = filtered_patterns['Label'].value_counts()
     pattern_pie_fig = px.pie(values=pattern_counts.values, names=pattern_counts.index,
                              title="Pattern Occurrence Frequency", color_discrete_sequence=px.colors.qualitative.Set3)
 
@@ -1,5 +1,3 @@
-import os
-import sqlite3
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,23 +6,10 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
-from config import DATABASE_PATH  # Ensure DATABASE_PATH is correctly set
-
-# Step 1: Retrieve Data from SQLite
-def retrieve_data(table="full_stock_data"):
-    """Retrieve stock data from SQLite database"""
-    db_file_path = os.path.join(DATABASE_PATH, "stocks_database.db")
-    try:
-        conn = sqlite3.connect(db_file_path)
-        print(f"Connected to database at: {db_file_path}")
-        data_df = pd.read_sql(f"SELECT * FROM {table}", conn)
-    except sqlite3.OperationalError as e:
-        print(f"Error: {e}")
-        return None
-    finally:
-        conn.close()
+from data_access import read_stock_data
 
-    return data_df
+# Features used for training
+FEATURES = ['Close', 'Volume', 'RSI_14', 'MACD_12_26_9']
 
 # Step 2: Preprocess Data for Multiple Stocks
 def preprocess_data(df, seq_length=90):
@@ -34,7 +19,7 @@ def preprocess_data(df, seq_length=90):
     df = df.sort_values(by=['Symbol', 'Date'])  # Ensure correct order
 
     # Features to use
-    features = ['Close', 'Volume', 'RSI_14', 'MACD_12_26_9']
+    features = FEATURES
     
     # Encode stock symbols with handle_unknown="ignore" to prevent unseen issues
     stock_encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore")
@@ -176,7 +161,8 @@ def train_lstm(X_train, y_train, X_test, y_test, scalers, date_index, feature_co
 
 # Main execution
 if __name__ == "__main__":
-    df = retrieve_data()
+    # Step 1: Read only the training features from SQLite
+    df = read_stock_data(FEATURES)
     if df is not None:
         X_train, y_train, X_test, y_test, scalers, date_index, feature_cols, stock_encoder = preprocess_data(df, seq_length=90)
         model = train_lstm(X_train, y_train, X_test, y_test, scalers, date_index, feature_cols, stock_encoder)
@@ -40,4 +40,54 @@ CLEANED_DATA_PATH = 'data/cleaned_data'
 
 PREPROCESSED_DATA_PATH = 'data/processed_data/merged'
 
-DATABASE_PATH = 'data/database'
\ No newline at end of file
+DATABASE_PATH = 'data/database'
+
+# Concurrent collection settings (used by data_collect.fetch_stock_data)
+COLLECT_MAX_WORKERS = 8       # Number of download requests running in parallel
+COLLECT_BATCH_SIZE = 25       # Number of symbols per yf.download request
+COLLECT_MAX_RETRIES = 3       # Attempts per request before the batch is reported as failed
+COLLECT_BACKOFF_SECONDS = 2   # Base retry delay, doubled after each failed attempt
+COLLECT_RATE_LIMIT = 2        # Maximum requests per second across all workers
+
+# Company metadata cache (see metadata_cache.py)
+METADATA_CACHE_PATH = 'data/metadata/company_metadata.json'
+METADATA_TTL_DAYS = 30        # Entries older than this are refetched from yfinance
+METADATA_FIELDS = ['longName', 'shortName', 'sector', 'industry', 'country', 'exchange', 'currency']
+
+# Async scraper settings (see web_scraper.py)
+SCRAPE_MAX_CONCURRENCY = 4    # Pages downloaded at the same time (also the connection pool size)
+SCRAPE_TIMEOUT_SECONDS = 20   # Total time allowed for one page request
+SCRAPE_RATE_PER_HOST = 0.5    # Sustained requests per second to any single host
+SCRAPE_BURST_PER_HOST = 2     # Requests a host may receive back to back before the rate applies
+
+# Local HTTP response cache (see http_cache.py)
+HTTP_CACHE_PATH = 'data/http_cache/http_cache.db'
+HTTP_CACHE_FRESHNESS_SECONDS = 3600   # Cached responses younger than this are used without a request
+
+# Rows per chunk when streaming the raw file through data_cleaning.py
+CLEANING_CHUNK_SIZE = 100000
+
+# Column order of the collected price files
+RAW_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume', 'Symbol', 'Company']
+
+# Schema of the collected price files (see data_wrangling.read_raw_typed)
+RAW_DTYPES = {
+    'Open': 'float32', 'High': 'float32', 'Low': 'float32', 'Close': 'float32', 'Adj Close': 'float32',
+    'Volume': 'Int64', 'Symbol': 'category', 'Company': 'category'
+}
+WRANGLING_CHUNK_SIZE = 100000   # Rows per chunk when streaming the raw file through data_wrangling.py
+
+# Columnar storage (see storage.py): 'parquet' writes symbol/year partitioned datasets under
+# PARQUET_DATA_PATH, 'csv' keeps the single CSV file per stage
+STORAGE_FORMAT = 'parquet'
+PARQUET_DATA_PATH = 'data/parquet'
+
+# Rows per prepared-statement batch when databases.py upserts into full_stock_data
+LOAD_CHUNK_SIZE = 50000
+
+# SQLite connection settings applied by preprocessing/db_connection.py
+SQLITE_JOURNAL_MODE = 'WAL'          # Readers keep working while a loader writes
+SQLITE_SYNCHRONOUS = 'NORMAL'        # No fsync per transaction (safe with WAL)
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024 # Bytes of the database file read through a memory map
+SQLITE_CACHE_SIZE_KB = 64 * 1024     # Page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = 30000       # Wait this long for a competing writer before "database is locked"
@@ -1,43 +1,92 @@
 import os
+import numpy as np
 import pandas as pd
-from config import RAW_DATA_PATH
+from config import RAW_DATA_PATH, CLEANING_CHUNK_SIZE, RAW_COLUMNS, STORAGE_FORMAT
+from storage import dataset_exists, iter_dataset
 
-# Define the raw data file path
-raw_file_name = "raw_collected_1year_data.csv"
-raw_file_path = os.path.join(RAW_DATA_PATH, raw_file_name)
-print(f"Loading raw data from: {raw_file_path}")
+# Layout of the raw file: columns B-F (indices 1-5) hold the five price/volume values, and
+# columns from I (index 8) onward are where the values of shifted rows ended up
+TARGET_COLUMNS = slice(1, 6)
+OVERFLOW_START = 8
+VALUES_PER_ROW = 5
 
-# Load the raw data into a DataFrame
-df = pd.read_csv(raw_file_path)
+def repair_misaligned_rows(chunk):
+    """
+    Moves the values of misaligned rows back into columns B-F.
 
-# Step 1: Filter rows starting from row 253 (index 252, zero-based)
-rows_to_process = df.iloc[283:]  # Rows from index 252 onward
+    A row is misaligned when columns B-F are empty and the overflow columns (from column I onward)
+    hold at least five values. The first five non-null overflow values are copied, in column order.
 
-# Step 2: Collect values from columns after column 8 (index 8)
-# Each row has exactly 5 values in this range
-column_values = rows_to_process.iloc[:, 8:]  # All columns starting from column 8
+    Parameters:
+        chunk (pd.DataFrame): A block of rows from the raw file.
 
-# Step 3: Copy the 5 values to columns B-F (indices 1-5) for the filtered rows
-for i, row_index in enumerate(rows_to_process.index):
-    # Extract the 5 non-null values from the row (starting from column 8)
-    values = column_values.iloc[i].dropna().values[:5]  # Take the first 5 non-null values
-    if len(values) == 5:  # Ensure there are exactly 5 values
-        df.loc[row_index, df.columns[1:6]] = values  # Copy to columns B-F
+    Returns:
+        pd.DataFrame: The chunk with misaligned rows repaired and the overflow columns dropped.
+    """
+    overflow = chunk.iloc[:, OVERFLOW_START:]
+    if overflow.shape[1] >= VALUES_PER_ROW:
+        present = overflow.notna().to_numpy()
+        targets_empty = chunk.iloc[:, TARGET_COLUMNS].isna().to_numpy().all(axis=1)
+        misaligned = targets_empty & (present.sum(axis=1) >= VALUES_PER_ROW)
 
-# Step 1: Drop the second row (index 1, zero-based)
-df = df.drop(index = 0)
+        if misaligned.any():
+            # A stable sort on "is missing" puts each row's non-null values first, in column order
+            order = np.argsort(~present[misaligned], axis=1, kind='stable')[:, :VALUES_PER_ROW]
+            values = np.take_along_axis(overflow.to_numpy()[misaligned], order, axis=1)
+            chunk.iloc[np.flatnonzero(misaligned), TARGET_COLUMNS] = values
 
-# Step 2: Drop columns starting from column I (index 8)
-df = df.drop(df.columns[8:], axis=1)
+    # Drop columns starting from column I (index 8)
+    return chunk.iloc[:, :OVERFLOW_START]
 
-# Step 4: Save the updated DataFrame to a new CSV file
-output_file_name = "updated_collected_data.csv"
-output_file_path = os.path.join(RAW_DATA_PATH, output_file_name)
+def drop_header_rows(chunk):
+    """
+    Drops the extra header rows (e.g. 'Ticker') that multi-level CSV headers leave in the data,
+    recognised by a first column that is not a date.
+    """
+    dates = pd.to_datetime(chunk.iloc[:, 0], errors='coerce', format='ISO8601')
+    return chunk[dates.notna().to_numpy()]
 
-# Ensure the output directory exists
-os.makedirs(RAW_DATA_PATH, exist_ok=True)
+def clean_raw_data(raw_file_name="raw_collected_1year_data.csv", output_file_name="updated_collected_data.csv",
+                   chunksize=CLEANING_CHUNK_SIZE):
+    """
+    Streams the raw file in chunks, repairs misaligned rows and writes the cleaned file.
+    With STORAGE_FORMAT 'parquet', data_collect.py only writes the partitioned 'raw' dataset, so that is
+    streamed instead (its typed rows cannot be misaligned).
 
-# Save the DataFrame to a CSV file
-df.to_csv(output_file_path, index=False)
+    Parameters:
+        raw_file_name (str): Name of the raw CSV file inside RAW_DATA_PATH.
+        output_file_name (str): Name of the output CSV file inside RAW_DATA_PATH.
+        chunksize (int): Number of rows held in memory at a time.
 
-print(f"Updated data saved to {output_file_path}")
\ No newline at end of file
+    Returns:
+        int: Number of rows written.
+    """
+    # Define the raw data file path
+    raw_file_path = os.path.join(RAW_DATA_PATH, raw_file_name)
+
+    # Define the output file path
+    output_file_path = os.path.join(RAW_DATA_PATH, output_file_name)
+
+    # Ensure the output directory exists
+    os.makedirs(RAW_DATA_PATH, exist_ok=True)
+
+    if STORAGE_FORMAT == 'parquet' and dataset_exists('raw'):
+        print("Loading raw data from the 'raw' dataset")
+        chunks = (chunk[[col for col in RAW_COLUMNS if col in chunk.columns]]
+                  for chunk in iter_dataset('raw', chunksize=chunksize))
+    else:
+        print(f"Loading raw data from: {raw_file_path}")
+        # Values are kept as text so that they are written back exactly as they were read
+        chunks = (repair_misaligned_rows(drop_header_rows(chunk))
+                  for chunk in pd.read_csv(raw_file_path, dtype=str, chunksize=chunksize))
+
+    rows_written = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(output_file_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows_written += len(chunk)
+
+    print(f"Updated data saved to {output_file_path} ({rows_written} rows)")
+    return rows_written
+
+if __name__ == "__main__":
+    clean_raw_data()
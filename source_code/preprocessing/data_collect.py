@@ -1,72 +1,443 @@
 import os
+import sqlite3
+import time
+import threading
 import yfinance as yf
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from config import RAW_DATA_PATH, STOCKS
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+                                    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday)
+from pandas.tseries.offsets import CustomBusinessDay
+from config import (RAW_DATA_PATH, DATABASE_PATH, STOCKS, COLLECT_MAX_WORKERS, COLLECT_BATCH_SIZE,
+                    COLLECT_MAX_RETRIES, COLLECT_BACKOFF_SECONDS, COLLECT_RATE_LIMIT, STORAGE_FORMAT, RAW_COLUMNS)
+from metadata_cache import fetch_ticker_info, get_company_metadata
+from http_cache import HttpCache
+from storage import append_dataset, dataset_exists, read_dataset, write_dataset
+from db_connection import get_connection
 
-def fetch_stock_data(stocks):
-    # Get today's date and calculate the date one year ago
-    end_date = datetime.today().strftime('%Y-%m-%d')
-    start_date = (datetime.today() - timedelta(days=410)).strftime('%Y-%m-%d')  # Strictly 1 year
+# Raw output file (its columns are RAW_COLUMNS)
+RAW_FILE_NAME = "raw_collected_1year_data.csv"
 
-    # Initialize an empty list to store the data
+class MarketHolidayCalendar(AbstractHolidayCalendar):
+    """Full-day closures of the US stock exchanges (NYSE / Nasdaq)."""
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=nearest_workday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas Day', month=12, day=25, observance=nearest_workday),
+    ]
+
+# One trading day: skips weekends and market holidays
+TRADING_DAY = CustomBusinessDay(calendar=MarketHolidayCalendar())
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces requests so that at most `rate` start per second,
+    no matter how many workers share it.
+    """
+    def __init__(self, rate=COLLECT_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # Reserve the next free slot under the lock, then sleep outside of it
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def call_with_retry(func, *args, rate_limiter=None, max_retries=COLLECT_MAX_RETRIES,
+                    backoff=COLLECT_BACKOFF_SECONDS, **kwargs):
+    """
+    Calls func(*args, **kwargs), retrying with exponential backoff when it raises.
+
+    Parameters:
+        func (callable): The request to perform.
+        rate_limiter (RateLimiter): Optional limiter consulted before every attempt.
+        max_retries (int): Number of attempts before the last error is re-raised.
+        backoff (float): Delay in seconds after the first failure, doubled after each retry.
+
+    Returns:
+        The return value of func.
+    """
+    for attempt in range(1, max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"Attempt {attempt}/{max_retries} failed ({e}). Retrying in {delay}s...")
+            time.sleep(delay)
+
+def get_company_names(stocks, info_fetcher=fetch_ticker_info, rate_limiter=None):
+    """
+    Looks up full company names through the metadata cache, falling back to 'N/A'.
+    Only symbols that are missing from the cache or expired trigger a yfinance call.
+
+    Returns:
+        dict: Symbol -> company name.
+    """
+    def fetch_with_retry(stock):
+        return call_with_retry(info_fetcher, stock, rate_limiter=rate_limiter)
+
+    metadata = get_company_metadata(stocks, info_fetcher=fetch_with_retry)
+    # Use 'longName' for the full company name
+    return {stock: metadata.get(stock, {}).get('longName') or 'N/A' for stock in stocks}
+
+def download_cache_key(tickers, **kwargs):
+    """Builds the response cache key of a yf.download request from its arguments."""
+    tickers = ','.join(tickers) if isinstance(tickers, list) else tickers
+    arguments = '&'.join(f"{name}={value}" for name, value in sorted(kwargs.items()))
+    return f"yfinance:download?tickers={tickers}&{arguments}"
+
+def cached_download(downloader, tickers, cache=None, rate_limiter=None, **kwargs):
+    """
+    Calls the downloader with retries, reusing a cached result while it is fresh.
+    yfinance does not expose response headers, so cached downloads are not revalidated.
+    Empty results (how yf.download reports a failed request) are not cached.
+    """
+    def download():
+        return call_with_retry(downloader, tickers, rate_limiter=rate_limiter, **kwargs)
+
+    if cache is None:
+        return download()
+    return cache.memoize(download_cache_key(tickers, **kwargs), download,
+                         cacheable=lambda data: data is not None and not data.empty)
+
+def split_batch(batch_data, symbols):
+    """
+    Splits the result of a multi-symbol yf.download call into one DataFrame per symbol.
+
+    Parameters:
+        batch_data (pd.DataFrame): Downloaded data, with (Ticker, Price) or (Price, Ticker) columns.
+        symbols (list): The symbols that were requested.
+
+    Returns:
+        dict: Symbol -> DataFrame with flat OHLCV columns. Symbols without rows are left out.
+    """
+    frames = {}
+    columns = batch_data.columns
+    for symbol in symbols:
+        if not isinstance(columns, pd.MultiIndex):
+            # Plain columns can only come from a single-symbol request
+            stock_data = batch_data if len(symbols) == 1 else None
+        elif symbol in columns.get_level_values(0):
+            stock_data = batch_data[symbol]
+        elif symbol in columns.get_level_values(1):
+            stock_data = batch_data.xs(symbol, axis=1, level=1)
+        else:
+            stock_data = None
+
+        if stock_data is None:
+            continue
+        # Symbols that failed inside a batch come back as all-NaN rows
+        stock_data = stock_data.dropna(how='all')
+        if not stock_data.empty:
+            frames[symbol] = stock_data
+    return frames
+
+def prepare_stock_frame(stock_data, stock, company_name):
+    """
+    Adds the Symbol and Company columns and moves 'Date' from the index into a column.
+    """
+    stock_data = stock_data.copy()
+    if isinstance(stock_data.columns, pd.MultiIndex):
+        # Single-symbol downloads carry a (Price, Ticker) header; keep the price level only
+        stock_data.columns = stock_data.columns.get_level_values(0)
+    stock_data.columns.name = None
+
+    stock_data['Symbol'] = stock
+    stock_data['Company'] = company_name
+
+    # Reset the index to ensure 'Date' becomes a column
+    stock_data.reset_index(inplace=True)
+    return stock_data
+
+def fetch_batch(symbols, start_date, end_date, downloader=yf.download, company_names=None, rate_limiter=None,
+                cache=None):
+    """
+    Downloads one batch of symbols with a single request.
+
+    Returns:
+        tuple: (list of per-symbol DataFrames, list of (symbol, error) failures).
+    """
+    print(f"Fetching data for {len(symbols)} symbols: {', '.join(symbols)}...")
+    try:
+        batch_data = cached_download(downloader, symbols, cache, rate_limiter, start=start_date, end=end_date,
+                                     group_by='ticker', progress=False, threads=False)
+    except Exception as e:
+        print(f"Error fetching data for batch {symbols}: {e}")
+        return [], [(symbol, str(e)) for symbol in symbols]
+
+    frames = split_batch(batch_data, symbols)
     all_data = []
-    failed_stocks = []  # To keep track of stocks that failed to fetch
+    failed_stocks = []
+    for symbol in symbols:
+        if symbol not in frames:
+            print(f"No data found for {symbol}. Skipping...")
+            failed_stocks.append((symbol, "No data found"))
+            continue
+        company_name = (company_names or {}).get(symbol, 'N/A')
+        all_data.append(prepare_stock_frame(frames[symbol], symbol, company_name))
+    return all_data, failed_stocks
+
+def fetch_concurrently(stocks, start_date, end_date, max_workers=COLLECT_MAX_WORKERS,
+                       batch_size=COLLECT_BATCH_SIZE, rate_limit=COLLECT_RATE_LIMIT,
+                       downloader=yf.download, company_names=None, cache=None):
+    """
+    Downloads the symbols in batches on a thread pool that shares one global rate limit.
+
+    Parameters:
+        stocks (list): Symbols to download.
+        start_date (str): First date to fetch (YYYY-MM-DD).
+        end_date (str): Day after the last date to fetch (YYYY-MM-DD).
+        max_workers (int): Number of batches in flight at once.
+        batch_size (int): Number of symbols per download request.
+        rate_limit (float): Maximum requests per second across all workers.
+        downloader (callable): yf.download or a compatible stub.
+        company_names (dict): Symbol -> company name (see get_company_names).
+        cache (HttpCache): Optional response cache for the downloads.
+
+    Returns:
+        tuple: (list of per-symbol DataFrames, list of (symbol, error) failures).
+    """
+    rate_limiter = RateLimiter(rate_limit)
+    batches = [stocks[i:i + batch_size] for i in range(0, len(stocks), batch_size)]
+
+    all_data = []
+    failed_stocks = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_batch, batch, start_date, end_date, downloader, company_names,
+                                   rate_limiter, cache) for batch in batches]
+        for future in as_completed(futures):
+            batch_data, batch_failures = future.result()
+            all_data.extend(batch_data)
+            failed_stocks.extend(batch_failures)
+
+    # Keep the output in the requested symbol order regardless of completion order
+    order = {stock: i for i, stock in enumerate(stocks)}
+    all_data.sort(key=lambda df: order[df['Symbol'].iloc[0]])
+    return all_data, failed_stocks
+
+def fetch_serially(stocks, start_date, end_date, downloader=yf.download, company_names=None, cache=None):
+    """
+    Downloads the symbols one at a time.
+
+    Returns:
+        tuple: (list of per-symbol DataFrames, list of (symbol, error) failures).
+    """
+    all_data = []
+    failed_stocks = []
 
     # Loop through the stock symbols and fetch the data
     for stock in stocks:
         print(f"Fetching data for {stock}...")
-        
+
         try:
             # Download historical stock data
-            stock_data = yf.download(stock, start=start_date, end=end_date)
-            
+            stock_data = cached_download(downloader, stock, cache, start=start_date, end=end_date)
+
             # Check if data was returned (some symbols might fail to fetch)
             if stock_data.empty:
                 print(f"No data found for {stock}. Skipping...")
                 failed_stocks.append((stock, "No data found"))
                 continue
-            
+
             # Add the stock symbol and company name as new columns
-            try:
-                stock_info = yf.Ticker(stock).info
-                company_name = stock_info.get('longName', 'N/A')  # Use 'longName' for the full company name
-            except Exception as e:
-                print(f"Error fetching company info for {stock}: {e}")
-                company_name = 'N/A'
-            
-            stock_data['Symbol'] = stock
-            stock_data['Company'] = company_name
-            
-            # Reset the index to ensure 'Date' becomes a column
-            stock_data.reset_index(inplace=True)
-            
+            company_name = (company_names or {}).get(stock, 'N/A')
+            stock_data = prepare_stock_frame(stock_data, stock, company_name)
+
             # Append the data to the list
             all_data.append(stock_data)
-        
+
         except Exception as e:
             print(f"Error fetching data for {stock}: {e}")
             failed_stocks.append((stock, str(e)))
             continue
 
+    return all_data, failed_stocks
+
+def get_last_stored_dates(source="raw", raw_file_name=RAW_FILE_NAME, db_path=DATABASE_PATH):
+    """
+    Reads the last stored date (watermark) of every symbol.
+
+    Parameters:
+        source (str): 'raw' to scan the raw store (Parquet dataset or CSV file),
+                      'db' to query the 'full_stock_data' table.
+        raw_file_name (str): Name of the raw CSV file inside RAW_DATA_PATH.
+        db_path (str): Folder holding stocks_database.db.
+
+    Returns:
+        dict: Symbol -> last stored date (pd.Timestamp). Empty when nothing is stored yet.
+    """
+    if source == "raw" and STORAGE_FORMAT == 'parquet':
+        if not dataset_exists('raw'):
+            print("Raw dataset does not exist yet. Fetching the full history.")
+            return {}
+        # Only the key columns are needed to find the watermark
+        stored = read_dataset('raw', columns=['Symbol', 'Date'])
+    elif source == "raw":
+        raw_file_path = os.path.join(RAW_DATA_PATH, raw_file_name)
+        if not os.path.exists(raw_file_path):
+            print(f"File {raw_file_path} does not exist. Fetching the full history.")
+            return {}
+        # Only the key columns are needed to find the watermark
+        stored = pd.read_csv(raw_file_path, usecols=['Date', 'Symbol'])
+    elif source == "db":
+        db_file_path = os.path.join(db_path, "stocks_database.db")
+        try:
+            stored = pd.read_sql("SELECT Symbol, MAX(Date) AS Date FROM full_stock_data GROUP BY Symbol",
+                                 get_connection(db_path))
+        except (sqlite3.OperationalError, pd.errors.DatabaseError) as e:
+            print(f"Error reading watermarks from {db_file_path}: {e}")
+            return {}
+    else:
+        raise ValueError(f"Unknown watermark source '{source}'. Use 'raw' or 'db'.")
+
+    # Header rows of legacy raw files do not parse as dates and are dropped here
+    stored['Date'] = pd.to_datetime(stored['Date'], errors='coerce')
+    stored = stored.dropna(subset=['Date', 'Symbol'])
+    return stored.groupby('Symbol')['Date'].max().to_dict()
+
+def plan_fetch_windows(stocks, start_date, end_date, last_dates):
+    """
+    Groups symbols by the first date they still need, so that each group can be fetched together.
+    A stored symbol resumes on the trading day after its last bar, and is up to date when that day is
+    not before end_date (weekends and market holidays are never requested).
+
+    Returns:
+        dict: Start date (YYYY-MM-DD) -> list of symbols. Symbols that are up to date are left out.
+    """
+    windows = {}
+    for stock in stocks:
+        window_start = start_date
+        if stock in last_dates:
+            window_start = (pd.Timestamp(last_dates[stock]) + TRADING_DAY).strftime('%Y-%m-%d')
+        if window_start >= end_date:
+            continue
+        windows.setdefault(window_start, []).append(stock)
+    return windows
+
+def append_raw_data(new_data, output_file_path):
+    """
+    Appends rows to the raw CSV file, skipping (Symbol, Date) pairs that are already stored.
+
+    Parameters:
+        new_data (pd.DataFrame): Newly downloaded rows.
+        output_file_path (str): The raw CSV file to append to (created if missing).
+
+    Returns:
+        int: Number of rows written.
+    """
+    new_data = new_data.copy()
+    new_data['Date'] = pd.to_datetime(new_data['Date'])
+    new_data = new_data.drop_duplicates(subset=['Symbol', 'Date'], keep='last')
+
+    if not os.path.exists(output_file_path):
+        new_data.to_csv(output_file_path, index=False)
+        return len(new_data)
+
+    # Read only the key columns of the stored file to de-duplicate against it
+    header = pd.read_csv(output_file_path, nrows=0).columns
+    stored_keys = pd.read_csv(output_file_path, usecols=['Symbol', 'Date'])
+    stored_keys['Date'] = pd.to_datetime(stored_keys['Date'], errors='coerce')
+    stored_index = pd.MultiIndex.from_frame(stored_keys.dropna()[['Symbol', 'Date']])
+    new_index = pd.MultiIndex.from_frame(new_data[['Symbol', 'Date']])
+    new_data = new_data[~new_index.isin(stored_index)]
+
+    # Match the column order of the stored file before appending
+    new_data.reindex(columns=header).to_csv(output_file_path, mode='a', header=False, index=False)
+    return len(new_data)
+
+def fetch_stock_data(stocks, concurrent=False, max_workers=COLLECT_MAX_WORKERS, batch_size=COLLECT_BATCH_SIZE,
+                     rate_limit=COLLECT_RATE_LIMIT, downloader=yf.download, info_fetcher=fetch_ticker_info,
+                     incremental=False, watermark_source="raw", cache=None):
+    """
+    Fetches about one year of daily prices for the given symbols and saves them to the raw data folder.
+
+    Parameters:
+        stocks (list): Symbols to download.
+        concurrent (bool): Use batched requests on a worker pool instead of the one-by-one loop.
+        max_workers, batch_size, rate_limit: Concurrent mode settings (see fetch_concurrently).
+        downloader (callable): yf.download or a compatible stub.
+        info_fetcher (callable): Returns the info dictionary for a symbol; only called for symbols
+                                 missing from the metadata cache or expired.
+        incremental (bool): Only fetch the days after each symbol's last stored date and append them
+                            to the raw file instead of rewriting it.
+        watermark_source (str): Where the last stored dates are read from: 'raw' or 'db'.
+        cache (HttpCache): Optional response cache; repeated runs inside its freshness window skip the downloads.
+
+    Returns:
+        tuple: (DataFrame of the fetched rows or None, list of (symbol, error) failures).
+    """
+    # Get today's date and calculate the date one year ago
+    end_date = datetime.today().strftime('%Y-%m-%d')
+    start_date = (datetime.today() - timedelta(days=410)).strftime('%Y-%m-%d')  # Strictly 1 year
+
+    # Define the output file path
+    output_file_path = os.path.join(RAW_DATA_PATH, RAW_FILE_NAME)
+
+    # In incremental mode each symbol starts the day after its last stored bar
+    last_dates = get_last_stored_dates(watermark_source) if incremental else {}
+    windows = plan_fetch_windows(stocks, start_date, end_date, last_dates)
+    if incremental:
+        print(f"{len(stocks) - sum(len(group) for group in windows.values())} symbols are already up to date.")
+
+    # Company names come from the metadata cache instead of one info request per symbol
+    pending = [stock for group in windows.values() for stock in group]
+    company_names = get_company_names(pending, info_fetcher, RateLimiter(rate_limit)) if pending else {}
+
+    # Initialize an empty list to store the data
+    all_data = []
+    failed_stocks = []  # To keep track of stocks that failed to fetch
+
+    for window_start, group in windows.items():
+        if concurrent:
+            group_data, group_failures = fetch_concurrently(group, window_start, end_date, max_workers, batch_size,
+                                                            rate_limit, downloader, company_names, cache)
+        else:
+            group_data, group_failures = fetch_serially(group, window_start, end_date, downloader, company_names,
+                                                        cache)
+        all_data.extend(group_data)
+        failed_stocks.extend(group_failures)
+
     # Combine the data for all stocks into one DataFrame
+    combined_data = None
     if all_data:
         # Ensure all data frames have the same columns
-        columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume', 'Symbol', 'Company']
-        all_data = [df[columns] for df in all_data]
-        
+        all_data = [df[[col for col in RAW_COLUMNS if col in df.columns]] for df in all_data]
+
         combined_data = pd.concat(all_data, ignore_index=True)
 
         # Ensure the output directory exists
         os.makedirs(RAW_DATA_PATH, exist_ok=True)
 
-        # Define the output file path
-        output_file_path = os.path.join(RAW_DATA_PATH, "raw_collected_1year_data.csv")
-
-        # Save the data to a CSV file
-        combined_data.to_csv(output_file_path, index=False)
-        
-        print(f"Data collection and saving to CSV completed at {output_file_path}")
+        if STORAGE_FORMAT == 'parquet':
+            # Only the symbol/year partitions present in the new rows are rewritten
+            if incremental:
+                append_dataset(combined_data, 'raw')
+            else:
+                write_dataset(combined_data, 'raw')
+        elif incremental:
+            rows_written = append_raw_data(combined_data, output_file_path)
+            print(f"Appended {rows_written} new rows to {output_file_path}")
+        else:
+            # Save the data to a CSV file
+            combined_data.to_csv(output_file_path, index=False)
+            print(f"Data collection and saving to CSV completed at {output_file_path}")
     else:
         print("No data was collected for any stock.")
 
@@ -75,6 +446,12 @@ def fetch_stock_data(stocks):
         print("\nFailed to fetch data for the following stocks:")
         for stock, error in failed_stocks:
             print(f"- {stock}: {error}")
-    
-# Call the function to fetch data for the given stocks
-fetch_stock_data(STOCKS)
\ No newline at end of file
+
+    if cache is not None:
+        cache.print_stats()
+
+    return combined_data, failed_stocks
+
+if __name__ == "__main__":
+    # Call the function to fetch data for the given stocks
+    fetch_stock_data(STOCKS, concurrent=True, incremental=True, cache=HttpCache())
@@ -2,62 +2,176 @@ import os
 import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
-from config import CLEANED_DATA_PATH, RAW_DATA_PATH
-from sklearn.impute import KNNImputer
+from config import CLEANED_DATA_PATH, RAW_DATA_PATH, RAW_DTYPES, WRANGLING_CHUNK_SIZE, STORAGE_FORMAT
+from storage import dataset_exists, iter_dataset, write_dataset
 import numpy as np
 
-def impute_missing_data(data, imputation_config=None, n_neighbors=5):
+def impute_time(values, dates, group_keys):
     """
-    Handles missing data in a DataFrame using specified imputation techniques.
+    Linear interpolation in time between each symbol's neighbouring observations.
+    Gaps at the start or end of a symbol take the nearest observed value.
+    """
+    observed_time = dates.where(values.notna())
+    grouped_values = values.groupby(group_keys)
+    grouped_time = observed_time.groupby(group_keys)
+    prev_value, next_value = grouped_values.ffill(), grouped_values.bfill()
+    prev_time, next_time = grouped_time.ffill(), grouped_time.bfill()
+
+    span = (next_time - prev_time).dt.total_seconds()
+    weight = ((dates - prev_time).dt.total_seconds() / span.where(span > 0)).fillna(0)
+    interpolated = prev_value + (next_value - prev_value) * weight
+    return values.fillna(interpolated.fillna(prev_value).fillna(next_value))
+
+def impute_cross_sectional(values, dates, group_keys):
+    """
+    Rolls each symbol's last observed value forward with the median change of all symbols
+    on the same dates (neighbour information across the cross-section).
+    Gaps before a symbol's first observation are left missing.
+    """
+    changes = values / values.groupby(group_keys).shift(1) - 1
+    market_change = changes.groupby(dates).transform('median')
+    growth = (1 + market_change.fillna(0)).groupby(group_keys).cumprod()
+    # value / growth is constant across a gap, so a forward fill followed by * growth applies the market path
+    rolled = (values / growth).groupby(group_keys).ffill() * growth
+    return values.fillna(rolled)
+
+def impute_group_statistic(values, group_keys, statistic):
+    """Fills gaps with the symbol's own mean, median or mode."""
+    if statistic == 'mode':
+        counts = values.groupby([group_keys, values]).size()
+        modes = counts.groupby(level=0).idxmax().str[1]
+        return values.fillna(group_keys.map(modes))
+    return values.fillna(values.groupby(group_keys).transform(statistic))
+
+def impute_missing_data(data, imputation_config=None, group_col='Symbol', date_col='Date'):
+    """
+    Handles missing data per symbol using time-aware imputation techniques.
 
     Args:
         data (pd.DataFrame): The input DataFrame with potential missing values.
         imputation_config (dict): A dictionary specifying the imputation method for each column.
-                                  Example: {'Close': 'mean', 'Adj Close': 'knn'}
+                                  Example: {'Close': 'time', 'Volume': 'median'}
+                                  Methods: 'ffill', 'bfill', 'time', 'cross_sectional', 'mean', 'median', 'mode'
+                                  ('knn' is accepted as an alias of 'cross_sectional').
                                   If None, applies 'mean' for all columns with missing values.
-        n_neighbors (int): Number of neighbors for KNN imputation (only used if method='knn').
+        group_col (str): Column identifying the series; every statistic is computed within it.
+        date_col (str): Column used to order each series in time.
 
     Returns:
-        pd.DataFrame: The DataFrame with missing values imputed.
+        tuple: (The DataFrame with missing values imputed, dict of column -> number of values filled).
     """
     if imputation_config is None:
         imputation_config = {col: 'mean' for col in data.columns if data[col].isna().sum() > 0}
 
+    # Work in (symbol, date) order so that fills and changes follow each series in time
+    data = data.sort_values([group_col, date_col], kind='stable')
+    group_keys = data[group_col]
+    dates = pd.to_datetime(data[date_col])
+
+    fill_counts = {}
     for column, method in imputation_config.items():
         if column not in data.columns:
             print(f"Warning: Column '{column}' not found in data. Skipping imputation.")
             continue
 
-        if data[column].isna().sum() == 0:
+        missing_before = data[column].isna().sum()
+        if missing_before == 0:
             print(f"Column '{column}' has no missing values. Skipping imputation.")
             continue
 
         print(f"Imputing column '{column}' using method: {method}")
+        values = data[column]
+
+        if method == 'ffill':
+            imputed = values.groupby(group_keys).ffill()
+        elif method == 'bfill':
+            imputed = values.groupby(group_keys).bfill()
+        elif method == 'time':
+            imputed = impute_time(values, dates, group_keys)
+        elif method in ('cross_sectional', 'knn'):
+            imputed = impute_cross_sectional(values, dates, group_keys)
+        elif method in ('mean', 'median', 'mode'):
+            imputed = impute_group_statistic(values, group_keys, method)
+        else:
+            print(f"Error: Invalid imputation method '{method}' for column '{column}'. Skipping.")
+            continue
 
-        if method == 'mean':
-            # Replace missing values with the mean of the column
-            mean_value = data[column].mean()
-            data[column].fillna(mean_value, inplace=True)
+        data[column] = imputed
+        fill_counts[column] = int(missing_before - imputed.isna().sum())
 
-        elif method == 'median':
-            # Replace missing values with the median of the column
-            median_value = data[column].median()
-            data[column].fillna(median_value, inplace=True)
+    return data, fill_counts
 
-        elif method == 'mode':
-            # Replace missing values with the mode of the column
-            mode_value = data[column].mode()[0]
-            data[column].fillna(mode_value, inplace=True)
+def apply_raw_schema(data):
+    """
+    Casts the columns of a price DataFrame to the compact dtypes in RAW_DTYPES
+    (float32 prices, nullable integer volume, categorical Symbol/Company) and parses 'Date'.
+    """
+    data['Date'] = pd.to_datetime(data['Date'])
+    dtypes = {col: dtype for col, dtype in RAW_DTYPES.items() if col in data.columns}
+    return data.astype(dtypes)
 
-        elif method == 'knn':
-            # Perform KNN imputation
-            imputer = KNNImputer(n_neighbors=n_neighbors)
-            data[[column]] = imputer.fit_transform(data[[column]])
+def wrangle_chunk(data, carry=None):
+    """
+    Sorts, filters and de-duplicates one block of price rows and adds the per-symbol percentage changes.
 
-        else:
-            print(f"Error: Invalid imputation method '{method}' for column '{column}'. Skipping.")
+    The previous Close/Volume of each symbol is taken from `carry` for the first row of the symbol
+    in this block, so changes are continuous across chunk boundaries. This requires every symbol's rows
+    to arrive in date order across chunks, which holds for the files written by data_collect.py.
 
-    return data
+    Parameters:
+        data (pd.DataFrame): Rows already cast with apply_raw_schema.
+        carry (pd.DataFrame): Last row per symbol from the previous chunks (indexed by Symbol), or None.
+
+    Returns:
+        tuple: (wrangled DataFrame, updated carry).
+    """
+    # Remove rows where 'Close' is negative, then sort in one step
+    if 'Close' in data.columns:
+        data = data[data['Close'] >= 0]
+    data = data.sort_values(['Symbol', 'Date'], kind='stable')
+
+    if data.empty:
+        return data.reset_index(drop=True), carry
+
+    # Ensure stock symbols are uppercase (mapped per category, not per row)
+    data['Symbol'] = data['Symbol'].map(str.upper).astype('category')
+
+    # Drop any duplicate rows (if any): repeated (Symbol, Date) pairs sit next to each other after sorting
+    symbols = data['Symbol'].astype(str).to_numpy()
+    dates = data['Date'].to_numpy()
+    first_of_symbol = np.ones(len(data), dtype=bool)
+    first_of_symbol[1:] = symbols[1:] != symbols[:-1]
+    duplicate = np.zeros(len(data), dtype=bool)
+    duplicate[1:] = ~first_of_symbol[1:] & (dates[1:] == dates[:-1])
+    if carry is not None and len(data):
+        carried_dates = pd.Series(symbols[first_of_symbol]).map(carry['Date']).to_numpy()
+        duplicate[first_of_symbol] |= dates[first_of_symbol] == carried_dates
+    data = data[~duplicate]
+    first_of_symbol = first_of_symbol[~duplicate]
+    symbols = symbols[~duplicate]
+
+    # Group by 'Symbol' to ensure calculations are done per stock
+    for col in ['Close', 'Volume']:
+        if col not in data.columns:
+            continue
+        values = data[col].to_numpy(dtype='float64', na_value=np.nan)
+        previous = np.empty_like(values)
+        previous[0:1] = np.nan
+        previous[1:] = values[:-1]
+        # The first row of each symbol continues from the previous chunk (or starts the series)
+        previous[first_of_symbol] = (pd.Series(symbols[first_of_symbol]).map(carry[col]).to_numpy(dtype='float64')
+                                     if carry is not None else np.nan)
+        # Calculate the daily percentage change
+        data[f'{col}_pct_change'] = (values / previous - 1).astype('float32')
+
+    # Remember the last row of every symbol for the next chunk
+    last_of_symbol = np.append(first_of_symbol[1:], True)
+    last_rows = data.loc[last_of_symbol, [col for col in ['Date', 'Close', 'Volume'] if col in data.columns]]
+    last_rows.index = symbols[last_of_symbol]
+    carry = last_rows if carry is None else pd.concat([carry[~carry.index.isin(last_rows.index)], last_rows])
+
+    # Reset index for cleaner output (optional)
+    return data.reset_index(drop=True), carry
 
 def wrangle_data(data):
     # Data Wrangling Steps:
@@ -66,45 +180,52 @@ def wrangle_data(data):
     if missing_columns:
         print(f"Warning: Missing columns {missing_columns}. Wrangling may fail.")
         imputation_config = {
-            'Close': 'knn',       # Use KNN for the 'Close' column
-            'Volume': 'median'    # Use median for the 'Volume' column
+            'Close': 'time',      # Interpolate 'Close' in time within each symbol
+            'Volume': 'median'    # Use each symbol's median for the 'Volume' column
         }
-        data = impute_missing_data(data, imputation_config)
+        data, fill_counts = impute_missing_data(data, imputation_config)
+        print(f"Imputed values per column: {fill_counts}")
 
-    # Convert data types (e.g., Ensure 'Date' column is datetime)
-    data['Date'] = pd.to_datetime(data['Date'])
-    data = data.sort_values(['Symbol', 'Date'])
+    # Convert data types to the compact schema (e.g., Ensure 'Date' column is datetime)
+    data = apply_raw_schema(data)
 
-    # Convert numeric columns to float if needed
-    numeric_cols = data.select_dtypes(include=[np.number]).columns
-    data[numeric_cols] = data[numeric_cols].astype(float)
+    data, _ = wrangle_chunk(data)
+    return data
 
-    # Remove rows where 'Close' is negative
-    if 'Close' in data.columns:
-        data = data[data['Close'] >= 0]
-    
-    # Ensure stock symbols are uppercase
-    if 'Symbol' in data.columns:
-        data['Symbol'] = data['Symbol'].str.upper()
+def read_raw_typed(raw_file_path, chunksize=WRANGLING_CHUNK_SIZE):
+    """
+    Reads the raw price file with explicit dtypes, in chunks.
 
-    # Group by 'Ticker' to ensure calculations are done per stock
-    grouped = data.groupby('Symbol')
+    Parameters:
+        raw_file_path (str): Path of the raw CSV file.
+        chunksize (int): Number of rows per chunk.
 
-    # Calculate daily percentage change in Close price (percentage change)
-    if 'Close' in data.columns:
-        data['Close_pct_change'] = grouped['Close'].pct_change()
-    # Calculate the percentage change in volume
-    data['Volume_pct_change'] = grouped['Volume'].pct_change()
+    Returns:
+        Iterator of pd.DataFrame chunks using the RAW_DTYPES schema.
+    """
+    return pd.read_csv(raw_file_path, usecols=lambda col: col == 'Date' or col in RAW_DTYPES,
+                       dtype=RAW_DTYPES, parse_dates=['Date'], chunksize=chunksize)
 
-    # Drop any duplicate rows (if any)
-    data = data.drop_duplicates()
+def fetch_clean_data_from_dataset(chunksize=WRANGLING_CHUNK_SIZE):
+    """
+    Wrangles the partitioned 'raw' dataset into the 'cleaned' dataset, one group of partitions at a time.
+    """
+    print(f"Loading raw dataset in chunks of about {chunksize} rows")
 
-    # Reset index for cleaner output (optional)
-    data.reset_index(drop=True, inplace=True)
+    carry = None
+    rows_written = 0
+    for chunk in iter_dataset('raw', chunksize=chunksize):
+        cleaned_chunk, carry = wrangle_chunk(apply_raw_schema(chunk), carry)
+        write_dataset(cleaned_chunk, 'cleaned')
+        rows_written += len(cleaned_chunk)
 
-    return data
+    print(f"Data cleaning and wrangling completed: {rows_written} rows saved to the 'cleaned' dataset")
+
+def fetch_clean_data_from_raw(raw_file_name, chunksize=WRANGLING_CHUNK_SIZE):
+    # The partitioned raw dataset written by data_collect.py takes precedence over the CSV file
+    if STORAGE_FORMAT == 'parquet' and dataset_exists('raw'):
+        return fetch_clean_data_from_dataset(chunksize)
 
-def fetch_clean_data_from_raw(raw_file_name):
     # Construct the full file path
     raw_file_path = os.path.join(RAW_DATA_PATH, raw_file_name)
     print(f"Attempting to load file from: {raw_file_path}")
@@ -114,11 +235,7 @@ def fetch_clean_data_from_raw(raw_file_name):
         print(f"File {raw_file_path} does not exist.")
         return
 
-    print(f"Loading raw data from: {raw_file_path}")
-    df = pd.read_csv(raw_file_path)
-    print(f"Columns available in raw data: {df.columns.tolist()}")
-
-    cleaned_data = wrangle_data(df)
+    print(f"Loading raw data from: {raw_file_path} in chunks of {chunksize} rows")
 
      # Ensure the output directory exists
     os.makedirs(CLEANED_DATA_PATH, exist_ok=True)
@@ -126,10 +243,15 @@ def fetch_clean_data_from_raw(raw_file_name):
     # Define the output file path
     output_file_path = os.path.join(CLEANED_DATA_PATH, "cleaned_collected_data.csv")
 
-    # Save the cleaned data to a CSV file
-    cleaned_data.to_csv(output_file_path, index=False)
+    # Stream the raw data through the wrangling steps; only one chunk and the per-symbol carry are in memory
+    carry = None
+    rows_written = 0
+    for i, chunk in enumerate(read_raw_typed(raw_file_path, chunksize)):
+        cleaned_chunk, carry = wrangle_chunk(chunk, carry)
+        cleaned_chunk.to_csv(output_file_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows_written += len(cleaned_chunk)
 
-    print(f"Data cleaning and wrangling is saved as CSV completed at {output_file_path}")
+    print(f"Data cleaning and wrangling is saved as CSV completed at {output_file_path} ({rows_written} rows)")
 
 
 # List of stock symbols to fetch
@@ -144,7 +266,7 @@ stocks = ['AAPL', 'MSFT', 'AMZN', 'GOOGL', 'TSLA', 'NVDA', 'META', 'UNH', 'MA',
     'TJX', 'DG', 'DLTR', 'ROST', 'SNAP', 'TIXT', 'CNQ', 'MNSO', 'D']
 
 
-# Call the function to fetch data for the given stocks
-raw_file_name = "updated_collected_data.csv"
-fetch_clean_data_from_raw(raw_file_name)
-
+if __name__ == "__main__":
+    # Call the function to clean the collected data
+    raw_file_name = "updated_collected_data.csv"
+    fetch_clean_data_from_raw(raw_file_name)
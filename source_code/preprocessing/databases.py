@@ -1,7 +1,13 @@
 import os
+import numpy as np
 import pandas as pd
 import sqlite3
-from config import PREPROCESSED_DATA_PATH, DATABASE_PATH
+from config import PREPROCESSED_DATA_PATH, DATABASE_PATH, STORAGE_FORMAT, LOAD_CHUNK_SIZE
+from storage import dataset_exists, read_dataset
+from db_connection import get_connection, transaction
+from metadata_cache import get_sector_mapping
+from schema import (bump_load_version, ensure_schema, split_columns, sql_type, take_legacy_table, to_date_id,
+                    upsert_dates, upsert_symbols)
 
 def read_csv_to_df(clean_file_name):
     """
@@ -27,29 +33,189 @@ def read_csv_to_df(clean_file_name):
 
     return df
 
-def import_full_stock_data(clean_file_name, db_path=DATABASE_PATH):
+def sql_values(series):
     """
-    Imports the full stock data into the SQLite database.
+    Returns a column as Python values sqlite3 can bind: numpy scalars become Python numbers, and
+    missing values of nullable or text columns become None (float NaN is already stored as NULL).
+    """
+    values = series.tolist()
+    if series.hasnans and not pd.api.types.is_float_dtype(series):
+        values = [None if pd.isna(value) else value for value in values]
+    return values
+
+def differs(columns, new, old):
+    """SQL condition that is true when any of the columns differs between two row aliases (NULL-safe)."""
+    return " OR ".join(f'{new}."{col}" IS NOT {old}."{col}"' for col in columns) or "0"
+
+def revised_symbols(conn, older, prices, indicators):
+    """
+    Finds the symbols whose rows before their watermark differ from the stored ones without staging them:
+    per symbol, the number of rows and the count and total of every numeric column over the incoming
+    dates are compared with the same aggregates of the stored rows (one grouped query).
+
+    Parameters:
+        conn (sqlite3.Connection): Open connection.
+        older (pd.DataFrame): Incoming rows dated before their symbol's watermark, with symbol_id and date_id.
+        prices (list): Columns stored in price_fact.
+        indicators (list): Columns stored in indicator_fact.
+
+    Returns:
+        list: symbol_ids of the symbols with revised rows.
+    """
+    if older.empty:
+        return []
+    columns = [col for col in prices + indicators if pd.api.types.is_numeric_dtype(older[col])]
+    values = older[columns].astype('float64')
+    grouped = pd.concat([older[['symbol_id', 'date_id']], values], axis=1).groupby('symbol_id')
+    incoming = pd.concat([grouped['date_id'].agg(['min', 'max', 'size']),
+                          grouped[columns].count().add_prefix('count '), grouped[columns].sum().add_prefix('total ')], axis=1)
+
+    conn.execute("DROP TABLE IF EXISTS temp.checked")
+    conn.execute("CREATE TEMP TABLE checked (symbol_id INTEGER PRIMARY KEY, first_id INTEGER, last_id INTEGER)")
+    conn.executemany("INSERT INTO temp.checked VALUES (?, ?, ?)",
+                     zip(incoming.index.tolist(), incoming['min'].tolist(), incoming['max'].tolist()))
+    aliases = {col: 'p' if col in prices else 'i' for col in columns}
+    aggregates = ", ".join([f'COUNT({aliases[col]}."{col}") AS "count {col}"' for col in columns]
+                           + [f'TOTAL({aliases[col]}."{col}") AS "total {col}"' for col in columns])
+    stored = pd.read_sql(f"""
+        SELECT c.symbol_id, COUNT(p.date_id) AS size{", " + aggregates if aggregates else ""}
+        FROM temp.checked c
+        LEFT JOIN price_fact p ON p.symbol_id = c.symbol_id AND p.date_id BETWEEN c.first_id AND c.last_id
+        LEFT JOIN indicator_fact i ON i.symbol_id = p.symbol_id AND i.date_id = p.date_id
+        GROUP BY c.symbol_id
+    """, conn, index_col='symbol_id').reindex(incoming.index)
+    conn.execute("DROP TABLE temp.checked")
+
+    compared = ['size'] + [f"count {col}" for col in columns] + [f"total {col}" for col in columns]
+    same = np.isclose(incoming[compared].to_numpy(dtype='float64'), stored[compared].to_numpy(dtype='float64'),
+                      rtol=1e-9, atol=1e-9).all(axis=1)
+    return incoming.index[~same].tolist()
+
+def upsert_fact(conn, table, columns):
+    """Copies the staged rows into a fact table, inserting new keys and overwriting changed rows only."""
+    column_list = ", ".join(["symbol_id", "date_id"] + [f'"{col}"' for col in columns])
+    assignments = ", ".join(f'"{col}" = excluded."{col}"' for col in columns)
+    conflict = f"DO UPDATE SET {assignments} WHERE {differs(columns, 'excluded', table)}" if columns else "DO NOTHING"
+    conn.execute(f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM temp.staging WHERE true '
+                 f'ON CONFLICT (symbol_id, date_id) {conflict}')
+
+def upsert_stock_data(df, conn, full_compare=False, chunk_size=LOAD_CHUNK_SIZE, sectors=None):
+    """
+    Loads processed rows into the normalized schema (see schema.py): prices into price_fact, the other
+    derived columns into indicator_fact, symbols and dates into their dimension tables. New
+    (symbol, date) keys are inserted and rows whose values changed are updated.
+
+    Rows dated before a symbol's watermark (its last stored date) are only compared per symbol by
+    checksum (see revised_symbols): the older rows of the symbols whose checksum differs are staged and
+    compared row by row, the others are skipped, so a daily load stages the new days plus the last stored
+    one unless history was revised. The rows go through a temporary
+    staging table filled in chunks by a prepared statement, and the whole load is one transaction.
+    A legacy 'full_stock_data' table is migrated in the same transaction.
+
+    Parameters:
+        df (pd.DataFrame): Stock rows with 'YYYY-MM-DD' text dates.
+        conn (sqlite3.Connection): Open connection.
+        full_compare (bool): Stage and compare every row instead of starting at the watermarks.
+        chunk_size (int): Rows per executemany call.
+        sectors (dict): Symbol -> sector for the symbols dimension.
+
+    Returns:
+        dict: Numbers of rows 'inserted', 'updated' and 'skipped'.
+    """
+    # One transaction, so that the schema changes and the legacy migration roll back with the load
+    with transaction(conn):
+        legacy = take_legacy_table(conn, "full_stock_data")
+        if legacy is not None:
+            df = pd.concat([legacy, df], ignore_index=True).drop_duplicates(subset=['Symbol', 'Date'], keep='last')
+
+        prices, indicators = split_columns(df.columns)
+        ensure_schema(conn, {col: sql_type(df[col].dtype) for col in prices},
+                      {col: sql_type(df[col].dtype) for col in indicators})
+
+        symbols = df['Symbol'].astype(str)
+        companies = dict(zip(symbols, df['Company'])) if 'Company' in df.columns else None
+        symbol_ids = upsert_symbols(conn, symbols.unique().tolist(), companies, sectors)
+        keys = pd.DataFrame({'symbol_id': symbols.map(symbol_ids).to_numpy(), 'date_id': to_date_id(df['Date']).to_numpy()})
+        df = pd.concat([keys, df[prices + indicators].reset_index(drop=True)], axis=1)
+
+        skipped = 0
+        if not full_compare:
+            watermarks = dict(conn.execute("SELECT symbol_id, MAX(date_id) FROM price_fact GROUP BY symbol_id").fetchall())
+            older = df['date_id'] < df['symbol_id'].map(watermarks).fillna(0)
+            revised = revised_symbols(conn, df[older], prices, indicators)
+            if revised:
+                print(f"Rows before the last stored date changed for {len(revised)} symbols; comparing them row by row.")
+            keep = ~older | df['symbol_id'].isin(revised)
+            skipped = int((~keep).sum())
+            df = df[keep]
+        upsert_dates(conn, df['date_id'].unique().tolist())
+
+        columns = list(df.columns)
+        staged = ", ".join(["p.symbol_id", "p.date_id"] + [f'p."{col}"' for col in prices] + [f'i."{col}"' for col in indicators])
+        conn.execute("DROP TABLE IF EXISTS temp.staging")
+        conn.execute(f"CREATE TEMP TABLE staging AS SELECT {staged} FROM price_fact p, indicator_fact i WHERE 0")
+        column_list = ", ".join(f'"{col}"' for col in columns)
+        insert = f'INSERT INTO temp.staging ({column_list}) VALUES ({", ".join("?" * len(columns))})'
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            conn.executemany(insert, zip(*(sql_values(chunk[col]) for col in columns)))
+
+        join = ("FROM temp.staging s "
+                "LEFT JOIN price_fact p ON p.symbol_id = s.symbol_id AND p.date_id = s.date_id "
+                "LEFT JOIN indicator_fact i ON i.symbol_id = s.symbol_id AND i.date_id = s.date_id")
+        inserted = conn.execute(f"SELECT COUNT(*) {join} WHERE p.symbol_id IS NULL").fetchone()[0]
+        updated = conn.execute(f"SELECT COUNT(*) {join} WHERE p.symbol_id IS NOT NULL "
+                               f"AND ({differs(prices, 's', 'p')} OR {differs(indicators, 's', 'i')})").fetchone()[0]
+        skipped += len(df) - inserted - updated
+
+        upsert_fact(conn, "price_fact", prices)
+        upsert_fact(conn, "indicator_fact", indicators)
+        conn.execute("DROP TABLE temp.staging")
+        if inserted or updated:
+            bump_load_version(conn, "full_stock_data")
+
+    return {'inserted': inserted, 'updated': updated, 'skipped': skipped}
+
+def import_full_stock_data(clean_file_name, db_path=DATABASE_PATH, full_compare=False):
+    """
+    Loads the processed stock data into the normalized tables of the SQLite database (read back through
+    the 'full_stock_data' view), inserting new rows and updating changed ones (see upsert_stock_data).
 
     Parameters:
         clean_file_name (str): The name of the CSV file containing the processed stock data.
         db_path (str): The path to the SQLite database.
+        full_compare (bool): Compare every row instead of starting at each symbol's last stored date.
+
+    Returns:
+        dict: Numbers of rows 'inserted', 'updated' and 'skipped' (None if nothing was loaded).
     """
-    # Load the cleaned data
-    df = read_csv_to_df(clean_file_name)
+    # Load the processed data, from the partitioned dataset when it exists
+    if STORAGE_FORMAT == 'parquet' and dataset_exists('processed'):
+        df = read_dataset('processed')
+        print(f"Loaded {len(df)} rows from the 'processed' dataset")
+    else:
+        df = read_csv_to_df(clean_file_name)
     if df is None:
         return  # Exit if the file doesn't exist
+
+    # Store dates as plain YYYY-MM-DD text whatever the source
+    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    df = df.drop_duplicates(subset=['Symbol', 'Date'], keep='last')
     
-    # Store results in SQLite database
+    # Upsert into the SQLite database
     db_file_path = os.path.join(db_path, "stocks_database.db")
-    conn = sqlite3.connect(db_file_path)
-    
-    # Write the full stock data to the 'full_stock_data' table
-    df.to_sql("full_stock_data", conn, if_exists="replace", index=False)
-    print("Full stock data imported successfully into 'full_stock_data' table.")
-    
-    # Close the connection
-    conn.close()
+    try:
+        sectors = get_sector_mapping(df['Symbol'].astype(str).unique())
+        counts = upsert_stock_data(df, get_connection(db_path), full_compare=full_compare, sectors=sectors)
+    except sqlite3.Error as e:
+        print(f"Error loading stock data into {db_file_path}: {e}")
+        return
+
+    print(f"Loaded 'full_stock_data': {counts['inserted']} rows inserted, {counts['updated']} updated, "
+          f"{counts['skipped']} skipped.")
+    if counts['inserted'] or counts['updated']:
+        print("Run analysis/materialize.py (or analysis/technical_analysis.py) to refresh the materialized statistics.")
+    return counts
 
 if __name__ == "__main__":
     # Import full stock data
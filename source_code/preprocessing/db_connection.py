@@ -0,0 +1,99 @@
+import os
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import (DATABASE_PATH, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_JOURNAL_MODE,
+                    SQLITE_MMAP_SIZE, SQLITE_SYNCHRONOUS)
+
+# Open connections: (process id, thread id, database file) -> sqlite3.Connection
+_connections = {}
+_lock = threading.Lock()
+
+def apply_pragmas(conn):
+    """
+    Applies the performance settings to a connection.
+
+    WAL lets readers run while a writer commits, synchronous=NORMAL is safe with WAL and avoids an fsync
+    per transaction, and reads go through a memory map and a larger page cache. busy_timeout makes a
+    connection wait for a competing writer instead of failing with "database is locked".
+    """
+    conn.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+def get_connection(db_path=DATABASE_PATH, db_name="stocks_database.db"):
+    """
+    Returns this thread's connection to a database, opening and tuning it on first use.
+
+    Connections are reused for the life of the process, so callers should not close them
+    (use close_connection to drop one). Each thread gets its own connection, which is what sqlite3
+    requires and lets the threads of a web server read concurrently.
+
+    Parameters:
+        db_path (str): Folder holding the database.
+        db_name (str): Database file name.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    db_file_path = os.path.abspath(os.path.join(db_path, db_name))
+    key = (os.getpid(), threading.get_ident(), db_file_path)
+    with _lock:
+        conn = _connections.get(key)
+        if conn is None:
+            os.makedirs(os.path.dirname(db_file_path), exist_ok=True)
+            conn = sqlite3.connect(db_file_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            apply_pragmas(conn)
+            _connections[key] = conn
+    return conn
+
+def close_connection(db_path=DATABASE_PATH, db_name="stocks_database.db"):
+    """Closes this thread's connection to a database, if it has one. The next get_connection reopens it."""
+    db_file_path = os.path.abspath(os.path.join(db_path, db_name))
+    with _lock:
+        conn = _connections.pop((os.getpid(), threading.get_ident(), db_file_path), None)
+    if conn is not None:
+        conn.close()
+
+def close_connections():
+    """Closes every connection this process opened."""
+    with _lock:
+        own = [key for key in _connections if key[0] == os.getpid()]
+        conns = [_connections.pop(key) for key in own]
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # Opened by another thread that has already exited
+
+@contextmanager
+def transaction(conn):
+    """
+    Runs a block in one transaction on a shared connection: committed when the block completes and rolled
+    back if it raises. If the connection is already inside a transaction (left open by an earlier caller
+    of the same cached connection), the block runs in a savepoint of it instead of failing on a nested BEGIN.
+    """
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT block")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO block")
+            conn.execute("RELEASE block")
+            raise
+        conn.execute("RELEASE block")
+        return
+
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+atexit.register(close_connections)
@@ -0,0 +1,118 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from config import HTTP_CACHE_PATH, HTTP_CACHE_FRESHNESS_SECONDS
+
+class HttpCache:
+    """
+    On-disk cache of HTTP response bodies with their ETag / Last-Modified validators.
+
+    Entries younger than `freshness_seconds` are served without any request. Older entries are
+    revalidated with a conditional request, and a 304 answer reuses the stored body.
+    The cache is safe to share between threads.
+    """
+    def __init__(self, cache_path=HTTP_CACHE_PATH, freshness_seconds=HTTP_CACHE_FRESHNESS_SECONDS):
+        self.cache_path = cache_path
+        self.freshness_seconds = freshness_seconds
+        self.hits = 0         # Served from cache without a request
+        self.revalidated = 0  # Server answered 304 Not Modified
+        self.misses = 0       # Full body downloaded
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL
+            )
+        """)
+        self.conn.commit()
+
+    def lookup(self, key):
+        """Returns the stored entry for a key as a dict, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'body': row[0], 'etag': row[1], 'last_modified': row[2], 'stored_at': row[3]}
+
+    def is_fresh(self, entry):
+        """Returns True when an entry is inside the freshness window."""
+        return time.time() - entry['stored_at'] < self.freshness_seconds
+
+    def conditional_headers(self, entry):
+        """Builds If-None-Match / If-Modified-Since headers for revalidating an entry."""
+        headers = {}
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key, body, etag=None, last_modified=None):
+        """Stores a full response body (bytes) and its validators."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, time.time())
+            )
+            self.conn.commit()
+            self.misses += 1
+
+    def mark_revalidated(self, key):
+        """Restarts the freshness window of an entry after a 304 response."""
+        with self.lock:
+            self.conn.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.revalidated += 1
+
+    def mark_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def memoize(self, key, fetch, cacheable=None):
+        """
+        Returns the cached Python object for `key`, or calls `fetch()` and caches its result.
+        Used for clients such as yfinance that do not expose response headers, so entries are
+        reused inside the freshness window but cannot be revalidated.
+
+        `cacheable(result)` can reject results that must not be reused, such as the empty
+        DataFrame yfinance returns for a failed or throttled request; those are returned but not stored.
+        """
+        entry = self.lookup(key)
+        if entry is not None and self.is_fresh(entry):
+            self.mark_hit()
+            return pickle.loads(entry['body'])
+        result = fetch()
+        if cacheable is None or cacheable(result):
+            self.store(key, pickle.dumps(result))
+        else:
+            with self.lock:
+                self.misses += 1
+        return result
+
+    def stats(self):
+        """Returns the hit / revalidated / miss counters and the share of requests that skipped a download."""
+        total = self.hits + self.revalidated + self.misses
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.revalidated) / total if total else 0.0,
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+              f"{stats['misses']} misses ({stats['hit_rate']:.0%} served from cache)")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,130 @@
+import os
+import json
+import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from config import METADATA_CACHE_PATH, METADATA_TTL_DAYS, METADATA_FIELDS
+
+def fetch_ticker_info(stock):
+    """Returns the yfinance info dictionary for a single symbol."""
+    return yf.Ticker(stock).info
+
+def load_metadata_cache(cache_path=METADATA_CACHE_PATH):
+    """
+    Loads the company metadata cache from disk.
+
+    Parameters:
+        cache_path (str): Path of the JSON cache file.
+
+    Returns:
+        dict: Symbol -> metadata entry. Empty if the file does not exist or cannot be read.
+    """
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading metadata cache {cache_path}: {e}. Starting with an empty cache.")
+        return {}
+
+def save_metadata_cache(cache, cache_path=METADATA_CACHE_PATH):
+    """
+    Writes the metadata cache to disk. The file is replaced atomically so readers never see a partial file.
+    """
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(temp_path, cache_path)
+
+def is_stale(entry, ttl_days=METADATA_TTL_DAYS):
+    """Returns True when a cache entry is missing or older than ttl_days."""
+    if not entry or 'fetched_at' not in entry:
+        return True
+    fetched_at = datetime.fromisoformat(entry['fetched_at'])
+    return datetime.now() - fetched_at > timedelta(days=ttl_days)
+
+def fetch_metadata(stock, info_fetcher=fetch_ticker_info):
+    """
+    Fetches the cached metadata fields for one symbol.
+
+    Returns:
+        dict: The fields in METADATA_FIELDS plus a 'fetched_at' timestamp.
+    """
+    stock_info = info_fetcher(stock)
+    entry = {field: stock_info.get(field) for field in METADATA_FIELDS}
+    entry['fetched_at'] = datetime.now().isoformat(timespec='seconds')
+    return entry
+
+def get_company_metadata(stocks, ttl_days=METADATA_TTL_DAYS, info_fetcher=fetch_ticker_info,
+                         cache_path=METADATA_CACHE_PATH, max_workers=4, force=False):
+    """
+    Returns metadata for the given symbols, only calling yfinance for entries that are missing or expired.
+
+    Parameters:
+        stocks (list): Symbols to look up.
+        ttl_days (float): Maximum age of a cache entry before it is refetched.
+        info_fetcher (callable): Returns the yfinance info dictionary for a symbol.
+        cache_path (str): Path of the JSON cache file.
+        max_workers (int): Number of lookups running in parallel when refreshing.
+        force (bool): Refetch every symbol regardless of its age.
+
+    Returns:
+        dict: Symbol -> metadata entry. A symbol whose refresh fails keeps its expired entry,
+              and is left out if it was never cached.
+    """
+    cache = load_metadata_cache(cache_path)
+    to_refresh = [stock for stock in stocks if force or is_stale(cache.get(stock), ttl_days)]
+
+    if to_refresh:
+        print(f"Refreshing company metadata for {len(to_refresh)} of {len(stocks)} symbols...")
+
+        def refresh(stock):
+            try:
+                return stock, fetch_metadata(stock, info_fetcher)
+            except Exception as e:
+                print(f"Error fetching company info for {stock}: {e}")
+                return stock, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for stock, entry in executor.map(refresh, to_refresh):
+                if entry is not None:
+                    cache[stock] = entry
+
+        save_metadata_cache(cache, cache_path)
+
+    return {stock: cache[stock] for stock in stocks if stock in cache}
+
+def get_sector_mapping(stocks=None, cache_path=METADATA_CACHE_PATH):
+    """
+    Reads symbol -> sector from the cache without any network calls.
+
+    Parameters:
+        stocks (list): Symbols to include. Defaults to every cached symbol.
+        cache_path (str): Path of the JSON cache file.
+
+    Returns:
+        dict: Symbol -> sector, for symbols that have a cached sector.
+    """
+    cache = load_metadata_cache(cache_path)
+    if stocks is None:
+        stocks = cache.keys()
+    return {stock: cache[stock]['sector'] for stock in stocks
+            if stock in cache and cache[stock].get('sector')}
+
+def refresh_metadata(stocks, info_fetcher=fetch_ticker_info, cache_path=METADATA_CACHE_PATH):
+    """
+    Bulk refresh: refetches metadata for every given symbol and rewrites the cache.
+    """
+    metadata = get_company_metadata(stocks, info_fetcher=info_fetcher, cache_path=cache_path, force=True)
+    missing = [stock for stock in stocks if stock not in metadata]
+    print(f"Company metadata cached for {len(metadata)} symbols at {cache_path}")
+    if missing:
+        print(f"No metadata available for: {', '.join(missing)}")
+
+if __name__ == "__main__":
+    from config import STOCKS
+
+    # Refresh the metadata cache for all configured stocks
+    refresh_metadata(STOCKS)
@@ -0,0 +1,287 @@
+import pandas as pd
+from db_connection import transaction
+
+# Normalized layout of stocks_database.db:
+#   symbols            one row per ticker (symbol_id, symbol, company, sector)
+#   dates              one row per trading day (date_id YYYYMMDD, date 'YYYY-MM-DD')
+#   price_fact         OHLCV keyed by (symbol_id, date_id)
+#   indicator_fact     derived columns (returns, indicators) keyed by (symbol_id, date_id)
+#   stationary_close   the stationary-transformed Close, keyed by (symbol_id, date_id)
+#   pattern_occurrence candlestick patterns keyed by (symbol_id, date_id, pattern_code), see pattern_store.py
+#   daily_stats        returns and rolling statistics keyed by (symbol_id, date_id), see analysis/materialize.py
+#   market_returns     the equal-weighted market return per date_id
+#   load_versions      a counter per view, bumped by every load that changes its rows (see bump_load_version)
+# The views full_stock_data, stationary_data_all and stock_pattern return the old table shapes (stationary_data_all
+# being the full row of each transformed bar with the stationary Close, stock_pattern 1 / -1 / 0 per pattern column);
+# stock_stats and market_return_series return the materialized statistics with Date / Symbol columns.
+
+# Columns of the processed data stored in price_fact; every other non-key column goes to indicator_fact
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+KEY_COLUMNS = ['Date', 'Symbol', 'Company']
+
+# Single-bar pattern columns of the stock_pattern view
+SINGLE_BAR_PATTERNS = ['CDLDOJI', 'CDLENGULFING', 'CDLHAMMER']
+
+def to_date_id(dates):
+    """Converts dates (strings or datetimes) to YYYYMMDD integers."""
+    dates = pd.to_datetime(pd.Series(dates))
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int64')
+
+def sql_type(dtype):
+    """SQLite column type for a pandas dtype."""
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def object_type(conn, name):
+    """Returns 'table', 'view' or None for a name in the database."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+def columns_of(conn, table):
+    """Returns the column names of a table or view ([] when it does not exist)."""
+    return [row[0] for row in conn.execute("SELECT name FROM pragma_table_info(?)", (table,))]
+
+def split_columns(columns):
+    """Splits processed-data columns into (price columns, indicator columns), keeping their order."""
+    prices = [col for col in columns if col in PRICE_COLUMNS]
+    indicators = [col for col in columns if col not in PRICE_COLUMNS and col not in KEY_COLUMNS]
+    return prices, indicators
+
+def ensure_fact_table(conn, table, columns):
+    """Creates a fact table keyed by (symbol_id, date_id) and adds the columns it is missing."""
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (symbol_id INTEGER NOT NULL, date_id INTEGER NOT NULL, '
+                 f'PRIMARY KEY (symbol_id, date_id)) WITHOUT ROWID')
+    existing = columns_of(conn, table)
+    for col, col_type in columns.items():
+        if col not in existing:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}" {col_type}')
+
+def ensure_pattern_tables(conn):
+    """Creates the pattern dimension and occurrence tables (see pattern_store.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patterns (
+            pattern_code INTEGER PRIMARY KEY,
+            pattern TEXT UNIQUE NOT NULL,
+            label TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pattern_occurrence (
+            symbol_id INTEGER NOT NULL,
+            date_id INTEGER NOT NULL,
+            pattern_code INTEGER NOT NULL,
+            signal INTEGER NOT NULL,
+            strength REAL,
+            PRIMARY KEY (symbol_id, date_id, pattern_code)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pattern_occurrence_pattern_date "
+                 "ON pattern_occurrence (pattern_code, date_id)")
+
+def ensure_dimensions(conn):
+    """Creates the symbols and dates dimension tables (adding company / sector to an older symbols table)."""
+    # Statements run one by one (executescript would commit the caller's transaction)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbols (
+            symbol_id INTEGER PRIMARY KEY,
+            symbol TEXT UNIQUE NOT NULL,
+            company TEXT,
+            sector TEXT
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS dates (date_id INTEGER PRIMARY KEY, date TEXT UNIQUE NOT NULL)")
+    existing = columns_of(conn, "symbols")
+    for col in ["company", "sector"]:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE symbols ADD COLUMN {col} TEXT")
+
+def ensure_schema(conn, price_columns=None, indicator_columns=None, stat_columns=None):
+    """
+    Creates every table of the normalized schema, adds new price / indicator / statistics columns, and
+    rebuilds the views. Legacy tables that carry a view's name are left alone (see take_legacy_table and drop_legacy_table).
+
+    Parameters:
+        conn (sqlite3.Connection): Open connection.
+        price_columns (dict): Price column -> SQLite type to make sure price_fact has.
+        indicator_columns (dict): Indicator column -> SQLite type to make sure indicator_fact has.
+        stat_columns (dict): Statistics column -> SQLite type to make sure daily_stats has.
+    """
+    ensure_dimensions(conn)
+    ensure_fact_table(conn, "price_fact", price_columns or {})
+    ensure_fact_table(conn, "indicator_fact", indicator_columns or {})
+    # Date-range reads across every symbol (panel builds, the views filtered on Date)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_price_fact_date ON price_fact (date_id, symbol_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_indicator_fact_date ON indicator_fact (date_id, symbol_id)")
+    ensure_fact_table(conn, "stationary_close", {"Close": "REAL"})
+    # daily_stats keeps the Close each row was computed from, so that revised prices can be detected
+    ensure_fact_table(conn, "daily_stats", {"Close": "REAL", "Daily_Return": "REAL", **(stat_columns or {})})
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_daily_stats_date ON daily_stats (date_id, "Daily_Return")')
+    conn.execute('CREATE TABLE IF NOT EXISTS market_returns '
+                 '(date_id INTEGER PRIMARY KEY, "Market_Return" REAL, "Symbols" INTEGER)')
+    conn.execute("CREATE TABLE IF NOT EXISTS load_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL, loaded_at TEXT)")
+    ensure_pattern_tables(conn)
+    create_views(conn)
+
+def create_views(conn):
+    """
+    (Re)creates the full_stock_data, stationary_data_all and stock_pattern views over the fact tables,
+    and the stock_stats and market_return_series views over the materialized statistics.
+    """
+    prices = [col for col in columns_of(conn, "price_fact") if col not in ("symbol_id", "date_id")]
+    indicators = [col for col in columns_of(conn, "indicator_fact") if col not in ("symbol_id", "date_id")]
+    full_columns = (['d.date AS "Date"'] + [f'p."{col}"' for col in prices]
+                    + ['s.symbol AS "Symbol"', 's.company AS "Company"'] + [f'i."{col}"' for col in indicators])
+    full_select = f"""
+        SELECT {", ".join(full_columns)}
+        FROM price_fact p
+        JOIN symbols s ON s.symbol_id = p.symbol_id
+        JOIN dates d ON d.date_id = p.date_id
+        LEFT JOIN indicator_fact i ON i.symbol_id = p.symbol_id AND i.date_id = p.date_id
+    """
+
+    if object_type(conn, "full_stock_data") != "table":
+        conn.execute("DROP VIEW IF EXISTS full_stock_data")
+        conn.execute(f"CREATE VIEW full_stock_data AS {full_select}")
+
+    if object_type(conn, "stationary_data_all") != "table":
+        conn.execute("DROP VIEW IF EXISTS stationary_data_all")
+        # The full row of every transformed bar, its Close replaced by the stationary Close
+        stationary_columns = [col if col != 'p."Close"' else 'c."Close"' for col in full_columns]
+        conn.execute(f"""
+            CREATE VIEW stationary_data_all AS
+            SELECT {", ".join(stationary_columns)}
+            FROM stationary_close c
+            JOIN symbols s ON s.symbol_id = c.symbol_id
+            JOIN dates d ON d.date_id = c.date_id
+            LEFT JOIN price_fact p ON p.symbol_id = c.symbol_id AND p.date_id = c.date_id
+            LEFT JOIN indicator_fact i ON i.symbol_id = c.symbol_id AND i.date_id = c.date_id
+        """)
+
+    if object_type(conn, "stock_pattern") != "table":
+        # The old wide layout: the full row of every bar with a single-bar pattern, plus one column per pattern
+        pattern_columns = ", ".join(f"COALESCE(MAX(CASE WHEN pt.pattern = '{name}' THEN o.signal END), 0) AS \"{name}\""
+                                    for name in SINGLE_BAR_PATTERNS)
+        names = ", ".join(f"'{name}'" for name in SINGLE_BAR_PATTERNS)
+        conn.execute("DROP VIEW IF EXISTS stock_pattern")
+        conn.execute(f"""
+            CREATE VIEW stock_pattern AS
+            SELECT {", ".join(full_columns)}, {", ".join(f'hits."{name}"' for name in SINGLE_BAR_PATTERNS)}
+            FROM (SELECT o.symbol_id AS symbol_id, o.date_id AS date_id, {pattern_columns}
+                  FROM pattern_occurrence o JOIN patterns pt ON pt.pattern_code = o.pattern_code
+                  WHERE pt.pattern IN ({names})
+                  GROUP BY o.symbol_id, o.date_id) hits
+            JOIN price_fact p ON p.symbol_id = hits.symbol_id AND p.date_id = hits.date_id
+            JOIN symbols s ON s.symbol_id = p.symbol_id
+            JOIN dates d ON d.date_id = p.date_id
+            LEFT JOIN indicator_fact i ON i.symbol_id = p.symbol_id AND i.date_id = p.date_id
+        """)
+
+    stats = [col for col in columns_of(conn, "daily_stats") if col not in ("symbol_id", "date_id", "Close")]
+    conn.execute("DROP VIEW IF EXISTS stock_stats")
+    conn.execute(f"""
+        CREATE VIEW stock_stats AS
+        SELECT d.date AS "Date", s.symbol AS "Symbol", s.company AS "Company", {", ".join(f't."{col}"' for col in stats)}
+        FROM daily_stats t
+        JOIN symbols s ON s.symbol_id = t.symbol_id
+        JOIN dates d ON d.date_id = t.date_id
+    """)
+    conn.execute("DROP VIEW IF EXISTS market_return_series")
+    conn.execute("""
+        CREATE VIEW market_return_series AS
+        SELECT d.date AS "Date", m."Market_Return", m."Symbols"
+        FROM market_returns m
+        JOIN dates d ON d.date_id = m.date_id
+    """)
+
+def take_legacy_table(conn, name):
+    """
+    Reads and drops a table written by the old un-normalized layout, so that its rows can be loaded
+    into the fact tables and its name reused by the compatibility view.
+
+    Returns:
+        pd.DataFrame: The table's rows, or None when there is no such table.
+    """
+    if object_type(conn, name) != "table":
+        return None
+    data = pd.read_sql(f'SELECT * FROM "{name}"', conn)
+    conn.execute(f'DROP TABLE "{name}"')
+    print(f"Migrating {len(data)} rows of the legacy '{name}' table to the normalized schema.")
+    return data
+
+def drop_legacy_table(conn, name):
+    """
+    Drops a derived table of the old un-normalized layout (stock_pattern, stationary_data_all) that is being
+    rewritten into the normalized tables, and creates the compatibility view in its place.
+    """
+    if object_type(conn, name) == "table":
+        conn.execute(f'DROP TABLE "{name}"')
+        create_views(conn)
+        print(f"Replaced the legacy '{name}' table with a view over the normalized schema.")
+
+def upsert_symbols(conn, symbols, companies=None, sectors=None):
+    """
+    Adds symbols to the dimension table and updates their company / sector when given.
+
+    Parameters:
+        conn (sqlite3.Connection): Open connection.
+        symbols (list): Tickers.
+        companies (dict): Ticker -> company name.
+        sectors (dict): Ticker -> sector.
+
+    Returns:
+        dict: Ticker -> symbol_id for every symbol in the table.
+    """
+    companies, sectors = companies or {}, sectors or {}
+    conn.executemany("""
+        INSERT INTO symbols (symbol, company, sector) VALUES (?, ?, ?)
+        ON CONFLICT (symbol) DO UPDATE SET company = COALESCE(excluded.company, company),
+                                           sector = COALESCE(excluded.sector, sector)
+    """, [(symbol, companies.get(symbol), sectors.get(symbol)) for symbol in symbols])
+    return dict(conn.execute("SELECT symbol, symbol_id FROM symbols").fetchall())
+
+def upsert_dates(conn, date_ids):
+    """Adds trading days to the dates dimension table."""
+    conn.executemany("INSERT OR IGNORE INTO dates (date_id, date) VALUES (?, ?)",
+                     [(date_id, f"{date_id // 10000:04d}-{date_id // 100 % 100:02d}-{date_id % 100:02d}")
+                      for date_id in date_ids])
+
+def bump_load_version(conn, name):
+    """Records that a load changed the rows of a view (e.g. full_stock_data), so that copies of it can be told apart as stale."""
+    conn.execute("INSERT INTO load_versions (name, version, loaded_at) VALUES (?, 1, datetime('now')) "
+                 "ON CONFLICT (name) DO UPDATE SET version = version + 1, loaded_at = excluded.loaded_at", (name,))
+
+def load_version(conn, name):
+    """
+    Returns the load counter of a view in one primary-key lookup.
+
+    Returns:
+        dict: 'version' and 'loaded_at', or None when nothing has been loaded through the normalized schema.
+    """
+    if object_type(conn, "load_versions") != "table":
+        return None
+    row = conn.execute("SELECT version, loaded_at FROM load_versions WHERE name = ?", (name,)).fetchone()
+    return {'version': row[0], 'loaded_at': row[1]} if row else None
+
+def write_stationary_close(conn, data):
+    """
+    Replaces the stationary-transformed Close series with the given rows.
+
+    Parameters:
+        conn (sqlite3.Connection): Open connection.
+        data (pd.DataFrame): Columns Date, Symbol, Close (Company is used when present).
+    """
+    with transaction(conn):
+        ensure_schema(conn)
+        drop_legacy_table(conn, "stationary_data_all")
+        companies = dict(zip(data['Symbol'], data['Company'])) if 'Company' in data else None
+        symbol_ids = upsert_symbols(conn, data['Symbol'].unique().tolist(), companies)
+        date_ids = to_date_id(data['Date'])
+        upsert_dates(conn, date_ids.unique().tolist())
+        conn.execute("DELETE FROM stationary_close")
+        conn.executemany('INSERT INTO stationary_close (symbol_id, date_id, "Close") VALUES (?, ?, ?)',
+                         zip(data['Symbol'].map(symbol_ids).tolist(), date_ids.tolist(),
+                             data['Close'].astype('float64').tolist()))
+        bump_load_version(conn, "stationary_data_all")
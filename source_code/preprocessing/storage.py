@@ -0,0 +1,134 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from config import PARQUET_DATA_PATH
+
+# Datasets are laid out as <base>/<name>/Symbol=<ticker>/Year=<yyyy>/part-0.parquet
+PARTITION_COLUMNS = ['Symbol', 'Year']
+
+def dataset_path(name, base_path=PARQUET_DATA_PATH):
+    """Returns the folder of a dataset (e.g. 'raw', 'cleaned', 'processed')."""
+    return os.path.join(base_path, name)
+
+def dataset_exists(name, base_path=PARQUET_DATA_PATH):
+    """Returns True when the dataset folder exists and is not empty."""
+    path = dataset_path(name, base_path)
+    return os.path.isdir(path) and len(os.listdir(path)) > 0
+
+def write_dataset(data, name, base_path=PARQUET_DATA_PATH):
+    """
+    Writes a long (Symbol, Date, ...) DataFrame as Parquet, partitioned by symbol and year.
+
+    Only the partitions present in `data` are replaced; every other symbol/year is left untouched.
+
+    Parameters:
+        data (pd.DataFrame): Rows to write. Must contain 'Symbol' and 'Date'.
+        name (str): Dataset name.
+        base_path (str): Root folder of all datasets.
+    """
+    path = dataset_path(name, base_path)
+    data = data.assign(Date=pd.to_datetime(data['Date']), Symbol=data['Symbol'].astype(str))
+    data = data.assign(Year=data['Date'].dt.year).sort_values(['Symbol', 'Date'], kind='stable')
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    ds.write_dataset(table, path, format='parquet', partitioning=PARTITION_COLUMNS, partitioning_flavor='hive',
+                     existing_data_behavior='delete_matching', basename_template='part-{i}.parquet')
+    print(f"Saved {len(data)} rows to dataset '{name}' at {path}")
+
+def build_filter(symbols=None, start=None, end=None):
+    """
+    Builds the pyarrow filter expression for a symbol set and an inclusive date range.
+    Year bounds are added so that whole partitions are skipped without being opened.
+    """
+    expression = None
+
+    def combine(condition):
+        return condition if expression is None else expression & condition
+
+    if symbols is not None:
+        expression = combine(ds.field('Symbol').isin([str(symbol) for symbol in symbols]))
+    if start is not None:
+        start = pd.Timestamp(start)
+        expression = combine((ds.field('Year') >= start.year) & (ds.field('Date') >= start.to_pydatetime()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        expression = combine((ds.field('Year') <= end.year) & (ds.field('Date') <= end.to_pydatetime()))
+    return expression
+
+def open_dataset(name, base_path=PARQUET_DATA_PATH):
+    """Opens a dataset with its hive partition columns (Symbol as string, Year as integer)."""
+    partitioning = ds.partitioning(pa.schema([('Symbol', pa.string()), ('Year', pa.int32())]), flavor='hive')
+    return ds.dataset(dataset_path(name, base_path), format='parquet', partitioning=partitioning)
+
+def to_frame(table):
+    """Converts an Arrow table to pandas, with Symbol as a category and rows in (Symbol, Date) order."""
+    data = table.to_pandas()
+    if 'Symbol' in data.columns:
+        data['Symbol'] = data['Symbol'].astype('category')
+    sort_columns = [col for col in ['Symbol', 'Date'] if col in data.columns]
+    if sort_columns:
+        data = data.sort_values(sort_columns, kind='stable').reset_index(drop=True)
+    return data
+
+def read_dataset(name, columns=None, symbols=None, start=None, end=None, base_path=PARQUET_DATA_PATH):
+    """
+    Reads a slice of a dataset: only the requested columns, symbols and dates are loaded from disk.
+
+    Parameters:
+        name (str): Dataset name.
+        columns (list): Columns to load. Defaults to all columns except the 'Year' partition key.
+        symbols (list): Symbols to load. Defaults to all symbols.
+        start, end (str or datetime): Inclusive date bounds.
+        base_path (str): Root folder of all datasets.
+
+    Returns:
+        pd.DataFrame: The selected rows, sorted by Symbol and Date.
+    """
+    dataset = open_dataset(name, base_path)
+    if columns is None:
+        columns = [field for field in dataset.schema.names if field != 'Year']
+    table = dataset.to_table(columns=list(columns), filter=build_filter(symbols, start, end))
+    return to_frame(table)
+
+def iter_dataset(name, columns=None, chunksize=100000, base_path=PARQUET_DATA_PATH):
+    """
+    Streams a dataset in (Symbol, Year) partition order, grouping whole partitions into chunks
+    of roughly `chunksize` rows. Each symbol's rows arrive in date order across chunks.
+
+    Yields:
+        pd.DataFrame: One chunk of rows.
+    """
+    dataset = open_dataset(name, base_path)
+    if columns is None:
+        columns = [field for field in dataset.schema.names if field != 'Year']
+
+    # Hive partition folders sort naturally by symbol, then year
+    fragments = sorted(dataset.get_fragments(), key=lambda fragment: fragment.path)
+    pending, pending_rows = [], 0
+    for fragment in fragments:
+        expression = ds.get_partition_keys(fragment.partition_expression)
+        table = fragment.to_table(columns=[col for col in columns if col not in expression])
+        for key, value in expression.items():
+            if key in columns:
+                table = table.append_column(key, pa.array([value] * len(table)))
+        pending.append(table.select(columns))
+        pending_rows += len(table)
+        if pending_rows >= chunksize:
+            yield to_frame(pa.concat_tables(pending))
+            pending, pending_rows = [], 0
+    if pending:
+        yield to_frame(pa.concat_tables(pending))
+
+def append_dataset(data, name, base_path=PARQUET_DATA_PATH):
+    """
+    Adds rows to a dataset, de-duplicated on (Symbol, Date) with new rows winning.
+    Only the symbol/year partitions touched by `data` are read and rewritten.
+    """
+    data = data.assign(Date=pd.to_datetime(data['Date']))
+    if dataset_exists(name, base_path):
+        existing = read_dataset(name, symbols=data['Symbol'].astype(str).unique(),
+                                start=f"{data['Date'].dt.year.min()}-01-01", base_path=base_path)
+        data = pd.concat([existing.astype({'Symbol': str}), data.astype({'Symbol': str})], ignore_index=True)
+        data = data.drop_duplicates(subset=['Symbol', 'Date'], keep='last')
+    write_dataset(data, name, base_path)
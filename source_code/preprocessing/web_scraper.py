@@ -1,65 +1,201 @@
 import os
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import time
 import re
-import random
-from datetime import datetime
-from config import URLS, HEADERS, RAW_DATA_PATH  # Import configurations
-
-# Define regex patterns
-pattern = r"^(.*?)-"
-price_pattern = r"Close([\d\.]+)"
-change_pattern = r"([+-][\d\.]+)"
-percentage_pattern = r"\(([+-][\d\.%]+)\)"
-volume_pattern = r"Volume([\d,]+)"
-
-def scrape_and_save():
-    all_data = []  # Initialize the list to store the scraped data
-
-    # Scraping Loop
-    for i, url in enumerate(URLS):
-        print(f"Scraping {i+1}/{len(URLS)}: {url}")
-        page = requests.get(url, headers=HEADERS)
-        
-        # Check if the response status code is 200
-        if page.status_code != 200:
-            print(f"Failed to fetch {url}, status code: {page.status_code}.")
-            continue
+import html
+import time
+import asyncio
+import aiohttp
+import pandas as pd
+from urllib.parse import urlsplit
+from config import (URLS, HEADERS, RAW_DATA_PATH, SCRAPE_MAX_CONCURRENCY, SCRAPE_TIMEOUT_SECONDS,
+                    SCRAPE_RATE_PER_HOST, SCRAPE_BURST_PER_HOST)  # Import configurations
+from http_cache import HttpCache
+
+# Define regex patterns (compiled once, applied to the QuoteStrip text only)
+pattern = re.compile(r"^(.*?)-")
+price_pattern = re.compile(r"Close([\d\.]+)")
+change_pattern = re.compile(r"([+-][\d\.]+)")
+percentage_pattern = re.compile(r"\(([+-][\d\.%]+)\)")
+volume_pattern = re.compile(r"Volume([\d,]+)")
+
+# Patterns used to cut the page down to the parts we need
+title_pattern = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+quote_strip_pattern = re.compile(r'<div[^>]*class="QuoteStrip-dataContainer QuoteStrip-extendedHours"[^>]*>')
+div_tag_pattern = re.compile(r"<(/?)div\b[^>]*>", re.IGNORECASE)
+tag_pattern = re.compile(r"<[^>]+>")
+
+class TokenBucket:
+    """
+    Async token bucket: allows `capacity` requests back to back, then refills at `rate` tokens per second.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostRateLimiter:
+    """
+    Keeps one token bucket per host, so a slow site does not hold back requests to other hosts.
+    """
+    def __init__(self, rate=SCRAPE_RATE_PER_HOST, capacity=SCRAPE_BURST_PER_HOST):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+
+    async def acquire(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        await self.buckets[host].acquire()
+
+def extract_quote_strip(page_html):
+    """
+    Returns the text of the QuoteStrip data container, or None if the page has no such element.
+    Only the container's fragment is scanned, instead of parsing the whole page.
+    """
+    start = quote_strip_pattern.search(page_html)
+    if start is None:
+        return None
+
+    # Walk the nested <div> tags until the container is closed
+    depth = 1
+    end = len(page_html)
+    for tag in div_tag_pattern.finditer(page_html, start.end()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = tag.start()
+            break
+
+    fragment = page_html[start.end():end]
+    return html.unescape(tag_pattern.sub('', fragment))
 
+def parse_quote_page(page_html):
+    """
+    Extracts [company, price, change, percentage, volume] from a CNBC quote page.
+
+    Raises:
+        AttributeError: If the page does not contain the expected fields.
+    """
+    data = extract_quote_strip(page_html)
+    if data is None:
+        raise AttributeError("QuoteStrip data container not found")
+    title = html.unescape(title_pattern.search(page_html).group(1))
+
+    # Extract fields
+    company = pattern.search(title).group(1).strip()
+    price = price_pattern.search(data).group(1)
+    change = change_pattern.search(data).group(1)
+    percentage = percentage_pattern.search(data).group(1)
+    volume = volume_pattern.search(data)
+    volume = volume.group(1).replace(',', '') if volume else "N/A"
+
+    return [company, price, change, percentage, volume]
+
+async def fetch_page(session, url, rate_limiter, semaphore, cache=None):
+    """
+    Downloads one page, waiting for a concurrency slot and the host's rate limit first.
+    With a cache, fresh pages are served locally and stale ones are revalidated with a conditional request.
+
+    Returns:
+        str: The page HTML, or None if the request failed.
+    """
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None and cache.is_fresh(entry):
+        cache.mark_hit()
+        return entry['body'].decode('utf-8')
+
+    async with semaphore:
+        await rate_limiter.acquire(url)
         try:
-            soup = BeautifulSoup(page.text, 'html.parser')
-            data = soup.find('div', {'class': 'QuoteStrip-dataContainer QuoteStrip-extendedHours'}).text
-            title = soup.title.text
+            headers = cache.conditional_headers(entry) if cache is not None else {}
+            async with session.get(url, headers=headers) as page:
+                if page.status == 304 and entry is not None:
+                    cache.mark_revalidated(url)
+                    return entry['body'].decode('utf-8')
+
+                # Check if the response status code is 200
+                if page.status != 200:
+                    print(f"Failed to fetch {url}, status code: {page.status}.")
+                    return None
+                page_html = await page.text()
+                if cache is not None:
+                    cache.store(url, page_html.encode('utf-8'), page.headers.get('ETag'),
+                                page.headers.get('Last-Modified'))
+                return page_html
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to fetch {url}: {e!r}")
+            return None
 
-            # Extract fields
-            company = re.search(pattern, title).group(1).strip()
-            price = re.search(price_pattern, data).group(1)
-            change = re.search(change_pattern, data).group(1)
-            percentage = re.search(percentage_pattern, data).group(1)
-            volume = re.search(volume_pattern, data)
-            volume = volume.group(1).replace(',', '') if volume else "N/A"
+async def scrape_urls(urls, max_concurrency=SCRAPE_MAX_CONCURRENCY, timeout=SCRAPE_TIMEOUT_SECONDS,
+                      rate_per_host=SCRAPE_RATE_PER_HOST, burst_per_host=SCRAPE_BURST_PER_HOST, cache=None):
+    """
+    Scrapes all URLs concurrently over one shared connection pool.
+    An optional HttpCache avoids downloading pages that have not changed.
 
-            all_data.append([company, price, change, percentage, volume])
+    Returns:
+        list: One [company, price, change, percentage, volume] row per page that was parsed, in URL order.
+    """
+    rate_limiter = HostRateLimiter(rate_per_host, burst_per_host)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
 
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=client_timeout) as session:
+        pages = await asyncio.gather(*(fetch_page(session, url, rate_limiter, semaphore, cache) for url in urls))
+
+    all_data = []
+    for i, (url, page_html) in enumerate(zip(urls, pages)):
+        print(f"Scraped {i+1}/{len(urls)}: {url}")
+        if page_html is None:
+            continue
+        try:
+            all_data.append(parse_quote_page(page_html))
         except AttributeError as e:
             print(f"Failed to scrape data for {url}: {e}")
-        
-        # Wait for a random time between 5 to 15 seconds
-        time.sleep(random.randint(5, 15))
+    return all_data
+
+def scrape_and_save(urls=URLS, output_dir=RAW_DATA_PATH, cache=None, **scrape_options):
+    """
+    Scrapes the quote pages and saves the results to raw_scraped_stocks_data.csv.
+
+    Parameters:
+        urls (list): Quote page URLs to scrape.
+        output_dir (str): Folder where the CSV file is written.
+        cache (HttpCache): Optional response cache shared across runs.
+        scrape_options: Overrides for scrape_urls (max_concurrency, timeout, rate_per_host, burst_per_host).
+
+    Returns:
+        pd.DataFrame: The scraped data.
+    """
+    all_data = asyncio.run(scrape_urls(urls, cache=cache, **scrape_options))
+    if cache is not None:
+        cache.print_stats()
 
     # Create the DataFrame
     column_names = ["Company", "Price", "Change", "Percentage", "Volume"]
     df = pd.DataFrame(all_data, columns=column_names)
 
     # Ensure the output directory exists
-    os.makedirs(RAW_DATA_PATH, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
 
     # Save to CSV in the raw data directory
-    filename = f"{RAW_DATA_PATH}/raw_scraped_stocks_data.csv"
+    filename = f"{output_dir}/raw_scraped_stocks_data.csv"
     df.to_csv(filename, index=False)
     print(f"Data scraping and saving completed successfully. File saved as {filename}.")
+    return df
 
-
-scrape_and_save()
\ No newline at end of file
+if __name__ == "__main__":
+    scrape_and_save(cache=HttpCache())
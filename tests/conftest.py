@@ -0,0 +1,41 @@
+import os
+import sys
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "source_code")
+SOURCE_FOLDERS = ["analysis", "preprocessing"]
+
+def use_source_folder(folder):
+    """
+    Makes the scripts of source_code/<folder> importable the way they run (`python <script>.py` from
+    that folder). Both folders have their own config.py, so the folder goes first on sys.path and the
+    modules already loaded from source_code are forgotten (the test modules that imported them keep them).
+
+    Parameters:
+        folder (str): 'analysis' or 'preprocessing'.
+    """
+    paths = [os.path.normpath(os.path.join(SOURCE_PATH, name)) for name in SOURCE_FOLDERS]
+    sys.path[:] = [path for path in sys.path if os.path.normpath(path) not in paths]
+    sys.path.insert(0, os.path.join(SOURCE_PATH, folder))
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None) or ""
+        if os.path.abspath(module_file).startswith(SOURCE_PATH + os.sep):
+            del sys.modules[name]
+
+def make_prices(n_symbols=3, n_days=120, seed=0):
+    """Random-walk OHLCV rows in the long (Date, Open, High, Low, Close, Volume, Symbol) layout of the cleaned data."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-02", periods=n_days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_symbols, n_days)), axis=1))
+    spread = np.abs(rng.normal(0, 0.01, size=close.shape)) * close
+    return pd.DataFrame({
+        'Date': np.tile(dates.strftime('%Y-%m-%d'), n_symbols),
+        'Open': (close * (1 + rng.normal(0, 0.005, size=close.shape))).ravel(),
+        'High': (close + spread).ravel(),
+        'Low': (close - spread).ravel(),
+        'Close': close.ravel(),
+        'Volume': rng.integers(1_000_000, 50_000_000, size=close.shape).ravel().astype(float),
+        'Symbol': np.repeat([f"S{i}" for i in range(n_symbols)], n_days),
+    })
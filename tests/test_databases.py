@@ -0,0 +1,71 @@
+import pytest
+from conftest import make_prices, use_source_folder
+
+use_source_folder("preprocessing")
+pytest.importorskip("yfinance")  # databases.py reads sectors through metadata_cache
+from databases import upsert_stock_data
+from db_connection import get_connection
+
+def processed_rows(n_days=10):
+    data = make_prices(n_symbols=2, n_days=n_days)
+    return data.assign(Company=data['Symbol'] + " Inc.", RSI_14=data['Close'] / 2)
+
+def test_first_load_inserts_every_row(tmp_path):
+    data = processed_rows()
+    counts = upsert_stock_data(data, get_connection(str(tmp_path)))
+    assert counts == {'inserted': len(data), 'updated': 0, 'skipped': 0}
+
+def test_reload_skips_unchanged_rows(tmp_path):
+    conn = get_connection(str(tmp_path))
+    data = processed_rows()
+    upsert_stock_data(data, conn)
+    assert upsert_stock_data(data, conn) == {'inserted': 0, 'updated': 0, 'skipped': len(data)}
+    assert upsert_stock_data(data, conn, full_compare=True) == {'inserted': 0, 'updated': 0, 'skipped': len(data)}
+
+def test_new_days_are_inserted_and_changed_rows_updated(tmp_path):
+    conn = get_connection(str(tmp_path))
+    data = processed_rows(n_days=12)
+    dates = sorted(data['Date'].unique())
+    upsert_stock_data(data[data['Date'] <= dates[9]], conn)
+
+    # Two new days per symbol, and the last stored day of S0 revised
+    revised = data.copy()
+    revised.loc[(revised['Symbol'] == 'S0') & (revised['Date'] == dates[9]), 'RSI_14'] += 1
+    counts = upsert_stock_data(revised, conn)
+    assert counts == {'inserted': 4, 'updated': 1, 'skipped': len(data) - 5}
+
+    stored = conn.execute('SELECT COUNT(*), TOTAL("RSI_14") FROM full_stock_data').fetchone()
+    assert stored == (len(data), pytest.approx(revised['RSI_14'].sum()))
+
+def test_full_compare_updates_older_rows(tmp_path):
+    conn = get_connection(str(tmp_path))
+    data = processed_rows()
+    upsert_stock_data(data, conn)
+
+    revised = data.copy()
+    revised.loc[0, 'Close'] += 1
+    counts = upsert_stock_data(revised, conn, full_compare=True)
+    assert counts == {'inserted': 0, 'updated': 1, 'skipped': len(data) - 1}
+    stored = conn.execute('SELECT "Close" FROM full_stock_data WHERE Symbol = ? AND Date = ?',
+                          (revised.loc[0, 'Symbol'], revised.loc[0, 'Date'])).fetchone()[0]
+    assert stored == pytest.approx(revised.loc[0, 'Close'])
+
+def test_default_load_updates_revised_older_rows(tmp_path):
+    conn = get_connection(str(tmp_path))
+    data = processed_rows()
+    upsert_stock_data(data, conn)
+
+    # A revised Close far before the watermark is found by the per-symbol checksum
+    revised = data.copy()
+    revised.loc[2, 'Close'] += 1
+    assert upsert_stock_data(revised, conn) == {'inserted': 0, 'updated': 1, 'skipped': len(data) - 1}
+    stored = conn.execute('SELECT "Close" FROM full_stock_data WHERE Symbol = ? AND Date = ?',
+                          (revised.loc[2, 'Symbol'], revised.loc[2, 'Date'])).fetchone()[0]
+    assert stored == pytest.approx(revised.loc[2, 'Close'])
+
+def test_float32_reload_is_not_a_revision(tmp_path, capsys):
+    conn = get_connection(str(tmp_path))
+    data = processed_rows().astype({'Open': 'float32', 'High': 'float32', 'Low': 'float32', 'Close': 'float32'})
+    upsert_stock_data(data, conn)
+    assert upsert_stock_data(data, conn) == {'inserted': 0, 'updated': 0, 'skipped': len(data)}
+    assert "row by row" not in capsys.readouterr().out
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from conftest import make_prices, use_source_folder
+
+use_source_folder("analysis")
+from indicators import INDICATOR_COLUMNS, compute_indicators
+from incremental_indicators import (load_indicator_state, save_indicator_state, unchanged_prefix_symbols,
+                                    update_indicators)
+
+def assert_same_indicators(result, expected):
+    merged = expected.merge(result, on=['Symbol', 'Date'], suffixes=('', '_incremental'))
+    assert len(merged) == len(expected)
+    for col in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(merged[f"{col}_incremental"].to_numpy(dtype='float64'),
+                                   merged[col].to_numpy(dtype='float64'), rtol=1e-9, atol=1e-9, err_msg=col)
+
+def split_by_date(data, fraction):
+    cutoff = sorted(data['Date'].unique())[int(data['Date'].nunique() * fraction)]
+    return data[data['Date'] < cutoff], data[data['Date'] >= cutoff]
+
+def test_split_update_matches_full_history():
+    data = make_prices()
+    head, tail = split_by_date(data, 0.7)
+    states = {}
+    result = pd.concat([update_indicators(head, states), update_indicators(tail, states)], ignore_index=True)
+    assert_same_indicators(result, compute_indicators(data))
+
+def test_overlapping_bars_are_skipped():
+    data = make_prices()
+    head, tail = split_by_date(data, 0.5)
+    states = {}
+    update_indicators(head, states)
+    # The overlap repeats the last 5 days already fed through the state
+    overlap = data[data['Date'] >= sorted(head['Date'].unique())[-5]]
+    result = update_indicators(overlap, states)
+    assert len(result) == len(tail)
+    assert_same_indicators(pd.concat([update_indicators(head, {}), result], ignore_index=True), compute_indicators(data))
+
+def test_saved_state_resumes(tmp_path):
+    data = make_prices()
+    head, tail = split_by_date(data, 0.6)
+    state_path = str(tmp_path / "indicator_state.json")
+    states = {}
+    first = update_indicators(head, states)
+    save_indicator_state(states, state_path)
+    second = update_indicators(tail, load_indicator_state(state_path))
+    assert_same_indicators(pd.concat([first, second], ignore_index=True), compute_indicators(data))
+
+def test_unchanged_prefix_symbols():
+    data = make_prices()
+    head, _ = split_by_date(data, 0.5)
+    states = {}
+    update_indicators(head, states)
+    assert sorted(unchanged_prefix_symbols(data, states)) == ['S0', 'S1', 'S2']
+
+    # A revised bar before S1's last processed date means its state cannot be continued
+    revised = data.copy()
+    revised.loc[(revised['Symbol'] == 'S1') & (revised['Date'] == head['Date'].iloc[3]), 'Close'] *= 1.01
+    assert sorted(unchanged_prefix_symbols(revised, states)) == ['S0', 'S2']
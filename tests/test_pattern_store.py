@@ -0,0 +1,50 @@
+import pandas as pd
+from conftest import use_source_folder
+
+use_source_folder("analysis")
+from pattern_store import PatternStore
+
+OCCURRENCES = pd.DataFrame({
+    'Symbol': ['AAA', 'AAA', 'BBB', 'BBB'],
+    'Date': ['2024-01-02', '2024-01-03', '2024-01-02', '2024-01-04'],
+    'Pattern': ['CDLHAMMER', 'CDLENGULFING', 'CDLENGULFING', 'CDLHARAMI'],
+    'Signal': [1, -1, 1, -1],
+    'Strength': [0.5, 1.5, 2.0, 0.75],
+})
+
+def test_empty_store_reads_nothing(tmp_path):
+    store = PatternStore(str(tmp_path))
+    assert store.query().empty
+    assert store.recent('CDLHAMMER', 30).empty
+    assert store.counts_per_symbol().empty
+    assert store.stats() == {'pattern_occurrence': 0, 'symbols': 0, 'patterns': 0}
+
+def test_round_trip(tmp_path):
+    store = PatternStore(str(tmp_path))
+    assert store.write(OCCURRENCES) == len(OCCURRENCES)
+
+    stored = store.query()
+    expected = OCCURRENCES.assign(Date=pd.to_datetime(OCCURRENCES['Date']))
+    pd.testing.assert_frame_equal(stored[['Symbol', 'Date', 'Pattern', 'Signal', 'Strength']], expected,
+                                  check_dtype=False)
+    assert stored.loc[stored['Pattern'] == 'CDLHAMMER', 'Label'].tolist() == ['Hammer']
+    assert store.stats() == {'pattern_occurrence': 4, 'symbols': 2, 'patterns': 3}
+
+    assert store.symbol_occurrences('BBB', start='2024-01-03')['Pattern'].tolist() == ['CDLHARAMI']
+    assert store.recent('CDLENGULFING', 1)['Symbol'].tolist() == ['BBB', 'AAA']
+    counts = store.counts_per_symbol('CDLENGULFING')
+    assert counts.to_dict('records') == [{'Symbol': 'AAA', 'Pattern': 'CDLENGULFING', 'Count': 1},
+                                         {'Symbol': 'BBB', 'Pattern': 'CDLENGULFING', 'Count': 1}]
+
+def test_rewrite_replaces_scanned_range(tmp_path):
+    store = PatternStore(str(tmp_path))
+    store.write(OCCURRENCES)
+
+    # A rescan of AAA finds only a stronger engulfing: the hammer disappears, BBB is left alone
+    rescan = OCCURRENCES.iloc[[1]].assign(Strength=3.0)
+    scanned = pd.DataFrame({'Symbol': ['AAA', 'AAA'], 'Date': ['2024-01-02', '2024-01-03']})
+    store.write(rescan, scanned=scanned)
+
+    stored = store.query()
+    assert stored.loc[stored['Symbol'] == 'AAA', ['Pattern', 'Strength']].values.tolist() == [['CDLENGULFING', 3.0]]
+    assert (stored['Symbol'] == 'BBB').sum() == 2